@@ -1,5 +1,6 @@
 """Debug module which primarily contains the loggers used in the code and any helpful functions for debugging"""
 import logging
+import tracemalloc
 
 # A top level logger with the module name
 addon_name = __package__
@@ -28,3 +29,33 @@ class ObjectNameAdapter(logging.LoggerAdapter):
     def process(self, msg, kwargs):
         object_name = kwargs.pop('object_name', self.extra['object_name'])
         return f"[{object_name}] {msg}", kwargs
+
+
+class MemoryReport:
+    """Measures the peak memory use of each phase of an export with tracemalloc.
+
+    Only memory allocated through python is traced, which includes numpy arrays, but not data owned by blender such
+    as the temporary meshes created for export.
+    """
+    def __init__(self):
+        self.phases = []
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    def end_phase(self, name: str) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        self.phases.append((name, current, peak))
+        tracemalloc.reset_peak()
+
+    def log(self, logger: logging.Logger) -> None:
+        """Logs the report and stops tracing"""
+        if self._started_tracing:
+            tracemalloc.stop()
+        if not self.phases:
+            return
+        mebibyte = 1024 * 1024
+        logger.info(f"Peak traced memory: {max(peak for _, _, peak in self.phases) / mebibyte:.1f} MiB")
+        for name, current, peak in self.phases:
+            logger.info(f"  {name}: peak {peak / mebibyte:.1f} MiB, {current / mebibyte:.1f} MiB at the end")
@@ -15,7 +15,7 @@ from . import (
     xml_i3d
 )
 
-from .utility import (BlenderObject, sort_blender_objects_by_outliner_ordering)
+from .utility import BlenderObject
 from .i3d import I3D
 from .node_classes.node import SceneGraphNode
 from .node_classes.skinned_mesh import SkinnedMeshRootNode
@@ -53,7 +53,9 @@ def export_blend_to_i3d(operator, filepath: str, axis_forward, axis_up, settings
         debugging.addon_console_handler.setLevel(debugging.addon_console_handler_default_level)
 
     time_start = time.time()
+    memory_report = debugging.MemoryReport() if operator.memory_report else None
 
+    i3d = None
     # Wrap everything in a try/catch to handle addon breaking exceptions and also get them in the log file
     try:
 
@@ -92,7 +94,11 @@ def export_blend_to_i3d(operator, filepath: str, axis_forward, axis_up, settings
                 case 'SELECTED_OBJECTS':
                     _export_selected_objects(i3d)
 
+        if memory_report is not None:
+            memory_report.end_phase("Processing scene")
         i3d.export_to_i3d_file()
+        if memory_report is not None:
+            memory_report.end_phase("Writing i3d file")
 
         if operator.binarize_i3d:
             logger.info(f'Starting binarization of "{filepath}"')
@@ -130,9 +136,16 @@ def export_blend_to_i3d(operator, filepath: str, axis_forward, axis_up, settings
         export_data['success'] = False
     else:
         export_data['success'] = True
+    finally:
+        # Don't leave the scratch files of an export that failed halfway behind
+        if i3d is not None and i3d.scratch is not None:
+            i3d.scratch.close()
 
     export_data['time'] = time.time() - time_start
 
+    if memory_report is not None:
+        memory_report.log(logger)
+
     print(f"Export took {export_data['time']:.3f} seconds")
 
     # EAFP
@@ -182,11 +195,9 @@ def _export_selected_objects(i3d: I3D):
 
 
 def _export(i3d: I3D, objects: List[BlenderObject], sort_alphabetical: bool = True):
-    objects_to_export = sort_blender_objects_by_outliner_ordering(objects) if sort_alphabetical else objects
+    objects_to_export = i3d.hierarchy.sort(objects) if sort_alphabetical else objects
 
-    _all_objects = [obj for root_obj in objects for obj in traverse_hierarchy(root_obj)]
-    existing_objects = set(i3d.all_objects_to_export)
-    i3d.all_objects_to_export.extend([obj for obj in _all_objects if obj not in existing_objects])
+    i3d.all_objects_to_export.update(obj for root_obj in objects for obj in traverse_hierarchy(i3d, root_obj))
 
     for blender_object in objects_to_export:
         _add_object_to_i3d(i3d, blender_object)
@@ -231,7 +242,7 @@ def _add_object_to_i3d(i3d: I3D, obj: BlenderObject, parent: SceneGraphNode = No
         case 'MESH':
             # MergeChildren objects take precedence over any other Shape type
             if 'MERGE_CHILDREN' in i3d.settings['features_to_export'] and obj.i3d_merge_children.enabled:
-                if obj.children and any(child.type == 'MESH' for child in obj.children):
+                if any(child.type == 'MESH' for child in i3d.hierarchy.children(obj)):
                     logger.debug(f"Processing MergeChildren for: {obj.name}")
                     node = i3d.add_merge_children_node(obj, _parent)
                     return  # Return to prevent children from being processed the "normal" way
@@ -269,6 +280,9 @@ def _add_object_to_i3d(i3d: I3D, obj: BlenderObject, parent: SceneGraphNode = No
                 )
                 node = i3d.add_merge_group_node(obj, _parent, blender_merge_group.root is obj)
 
+            elif 'AUTO_LODS' in i3d.settings['features_to_export'] and obj.i3d_auto_lod.enabled:
+                node = i3d.add_auto_lod_node(obj, _parent)
+
             # Default to a regular Shape if none of the special types applied
             else:
                 node = i3d.add_shape_node(obj, _parent)
@@ -292,10 +306,10 @@ def _add_object_to_i3d(i3d: I3D, obj: BlenderObject, parent: SceneGraphNode = No
             raise NotImplementedError(f"Object type: {obj.type!r} is not supported yet")
 
     # Process children of objects (other objects) and children of collections (other collections)
-    # WARNING: Might be slow due to searching through the entire object list in the blend file:
-    # https://docs.blender.org/api/current/bpy.types.Object.html#bpy.types.Object.children
+    # The children come from the hierarchy index, since `obj.children` searches through the entire object list in the
+    # blend file: https://docs.blender.org/api/current/bpy.types.Object.html#bpy.types.Object.children
     logger.debug(f"[{obj.name}] processing objects children")
-    for child in sort_blender_objects_by_outliner_ordering(obj.children):
+    for child in i3d.hierarchy.sorted_children(obj):
         _add_object_to_i3d(i3d, child, node)
     logger.debug(f"[{obj.name}] no more children to process in object")
 
@@ -305,9 +319,8 @@ def _process_collection_objects(i3d: I3D, collection: bpy.types.Collection, pare
     instead of the 'children' list, which only contains child collections. And they need to be iterated slightly
     different"""
 
-    _all_objects = [obj for root_obj in collection.objects for obj in traverse_hierarchy(root_obj)]
-    existing_objects = set(i3d.all_objects_to_export)
-    i3d.all_objects_to_export.extend([obj for obj in _all_objects if obj not in existing_objects])
+    i3d.all_objects_to_export.update(obj for root_obj in collection.objects
+                                     for obj in traverse_hierarchy(i3d, root_obj))
 
     # Iterate child collections first, since they appear at the top in the blender outliner
     logger.debug(f"[{collection.name}] processing collections children")
@@ -317,7 +330,7 @@ def _process_collection_objects(i3d: I3D, collection: bpy.types.Collection, pare
 
     # Then iterate over the objects contained in the collection
     logger.debug(f"[{collection.name}] processing collection objects")
-    for child in sort_blender_objects_by_outliner_ordering(collection.objects):
+    for child in i3d.hierarchy.sort(collection.objects):
         # If a collection consists of an object, which has it's own children objects. These children will also be a
         # a part of the collections objects. Which means that they would be added twice without this check. One for the
         # object itself and one for the collection.
@@ -326,9 +339,9 @@ def _process_collection_objects(i3d: I3D, collection: bpy.types.Collection, pare
     logger.debug(f"[{collection.name}] no more objects to process in collection")
 
 
-def traverse_hierarchy(obj: BlenderObject) -> List[BlenderObject]:
-    """Recursively traverses an object hierarchy and returns all objects."""
-    return [obj] + [child for child in obj.children for child in traverse_hierarchy(child)]
+def traverse_hierarchy(i3d: I3D, obj: BlenderObject) -> List[BlenderObject]:
+    """Traverses an object hierarchy and returns all objects."""
+    return list(i3d.hierarchy.descendants(obj))
 
 
 def _process_deferred_constraints(i3d: I3D):
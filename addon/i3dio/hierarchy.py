@@ -0,0 +1,65 @@
+"""The object hierarchy of the blend file, indexed once per export so the exporter can traverse it in linear time"""
+from __future__ import annotations
+import re
+from typing import (Any, Dict, Iterable, Iterator, List, Tuple, Type, Union)
+
+# Splits the numbers out of a name, for the "natural" ordering of the blender outliner, see
+# `utility.sort_blender_objects_by_outliner_ordering`
+NATURAL_SORT_PATTERN = re.compile(r'(\d+)')
+
+
+def natural_sort_key(name: str) -> list:
+    return [int(t) if t.isdigit() else t.lower() for t in NATURAL_SORT_PATTERN.split(name)]
+
+
+class SceneHierarchy:
+    """An index of the object hierarchy of the blend file, built once per export.
+
+    `Object.children` searches through every object in the blend file on each access, so the children of all objects
+    are collected in a single pass instead. The natural sort keys of the names are cached as well, since every object
+    is sorted among its siblings."""
+    def __init__(self, objects: Iterable[Any], collection_type: Union[Type, Tuple[Type, ...]] = ()):
+        """
+        Args:
+            objects: Every object of the blend file, which are indexed by their parent
+            collection_type: The type of collections, whose child collections are read from the collection itself
+        """
+        self.collection_type = collection_type
+        self._children: Dict[Any, List[Any]] = {}
+        for obj in objects:
+            if obj.parent is not None:
+                self._children.setdefault(obj.parent, []).append(obj)
+        self._sort_keys: Dict[str, list] = {}
+        self._sorted_children: Dict[Any, List[Any]] = {}
+
+    def children(self, obj) -> List[Any]:
+        """The children of an object, or the child collections of a collection, in blend file order"""
+        if isinstance(obj, self.collection_type):
+            # Collections store their children directly, so those don't need to be searched for
+            return list(obj.children)
+        return self._children.get(obj, [])
+
+    def sorted_children(self, obj) -> List[Any]:
+        """The children of an object, in the ordering of the blender outliner"""
+        children = self._sorted_children.get(obj)
+        if children is None:
+            children = self._sorted_children[obj] = self.sort(self.children(obj))
+        return children
+
+    def sort(self, objects: Iterable[Any]) -> List[Any]:
+        """The objects in the ordering of the blender outliner, with the sort keys only computed once per name"""
+        return sorted(objects, key=self._sort_key)
+
+    def _sort_key(self, obj) -> list:
+        key = self._sort_keys.get(obj.name)
+        if key is None:
+            key = self._sort_keys[obj.name] = natural_sort_key(obj.name)
+        return key
+
+    def descendants(self, obj) -> Iterator[Any]:
+        """Yields the object itself and everything below it, parents before their children"""
+        stack = [obj]
+        while stack:
+            current = stack.pop()
+            yield current
+            stack.extend(reversed(self.children(current)))
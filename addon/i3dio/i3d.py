@@ -2,7 +2,13 @@
 from __future__ import annotations  # Enables python 4.0 annotation typehints fx. class self-referencing
 from typing import (Union, Dict, List, Type, OrderedDict, Optional, Tuple)
 import logging
+import os
 from . import xml_i3d
+from .shape_cache import (ShapeCache, CACHE_DIRECTORY_NAME)
+from .scratch import ScratchSpace
+from .i3d_mapping import (i3d_mappings_patch, index_paths)
+from .hierarchy import SceneHierarchy
+from .user_attributes import UserAttributes
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +48,28 @@ class I3D:
         self.conversion_matrix_inv = conversion_matrix.inverted_safe()
 
         self.shapes: Dict[Union[str, int], Union[IndexedTriangleSet, NurbsCurve]] = {}
+        # Shapes by the key of their content, for sharing identical geometry between mesh datablocks
+        self.shapes_by_content: Dict[str, IndexedTriangleSet] = {}
+        # The number of times each shape was reused for a mesh with identical content
+        self.shape_reuses: Dict[IndexedTriangleSet, int] = {}
+        # Meshes that were never evaluated, since their shape had already been exported by another object
+        self.avoided_evaluations = 0
+        self.split_shapes = 0
+        self.split_index_bytes = 0
+        self.bounding_spheres_computed = 0
+        self.bounding_spheres_written = 0
+        self.bounding_sphere_radius_ratio = 0.0
+        self.welded_corners = 0
+        self.welded_vertices = 0
+        self.culled_degenerate_triangles = 0
+        self.culled_duplicate_triangles = 0
+        # Arrays and materials extracted from meshes that are merged into a shape several times, see `InstancedMesh`
+        # Entries are dropped once the shape using them is written
+        self.mesh_sources: dict[tuple, tuple] = {}
+        self.extracted_mesh_sources = 0
+        self.reused_mesh_sources = 0
+        self.curve_vertices_before = 0
+        self.curve_vertices_after = 0
         self.materials: Dict[Union[str, int], Material] = {}
         self.files: Dict[Union[str, int], File] = {}
         self.merge_groups: Dict[int, MergeGroup] = {}
@@ -51,9 +79,26 @@ class I3D:
 
         self.settings = settings
 
-        self.depsgraph = depsgraph
+        self.shape_cache: Optional[ShapeCache] = None
+        # The cache lives next to the .blend file, so it is only used once the file has been saved
+        if settings['use_shape_cache'] and bpy.data.filepath:
+            self.shape_cache = ShapeCache(os.path.join(os.path.dirname(bpy.data.filepath), CACHE_DIRECTORY_NAME),
+                                          settings['shape_cache_size'] * 1024 * 1024)
+
+        # Working arrays of very large meshes are memory mapped, instead of held in memory
+        self.scratch: Optional[ScratchSpace] = None
+        if settings['use_scratch_files']:
+            self.scratch = ScratchSpace(settings['scratch_threshold'] * 1024 * 1024)
 
-        self.all_objects_to_export: List[bpy.types.Object] = []
+        self.depsgraph = depsgraph
+        # Mesh attributes that are exported in uv layers or as the generic value
+        self.attribute_channels = parse_attribute_channels(settings['attribute_channels'], self.logger)
+
+        # Built once up front, since looking up the children of an object through blender is slow
+        self.hierarchy = SceneHierarchy(bpy.data.objects, bpy.types.Collection)
+        self.all_objects_to_export: set[bpy.types.Object] = set()
+        # Only collected while the nodes are added, see `add_user_attributes`
+        self.user_attributes = UserAttributes()
         self.anim_links: dict[bpy.types.Action, list[tuple[SceneGraphNode, bpy.types.ActionSlot]]] = {}
 
     # Private Methods ##################################################################################################
@@ -105,6 +150,19 @@ class I3D:
 
         return node_to_return
 
+    def add_auto_lod_node(self, mesh_object: bpy.types.Object, parent: SceneGraphNode = None) -> SceneGraphNode:
+        """Add a mesh as a LOD group with generated levels. The LOD group is returned, so the children of the mesh are
+        placed after the levels instead of under the full detail level, where they would be hidden at a distance"""
+        return self._add_node(AutoLodRoot, mesh_object, parent)
+
+    def add_auto_lod_level(self, mesh_object: bpy.types.Object, parent: AutoLodRoot, level: int) -> AutoLodLevel:
+        # The levels aren't registered as the node of the object, the LOD group is
+        return AutoLodLevel(self._next_available_id('node'), mesh_object, self, parent, level)
+
+    def add_split_shape_part_node(self, mesh_object: bpy.types.Object, parent: ShapeNode, shape: IndexedTriangleSet,
+                                  index: int) -> SplitShapePartNode:
+        return SplitShapePartNode(self._next_available_id('node'), mesh_object, self, parent, shape, index)
+
     def add_merge_children_node(self, merge_children_object: bpy.types.Object,
                                 parent: SceneGraphNode | None = None) -> SceneGraphNode:
         return self._add_node(MergeChildrenRoot, merge_children_object, parent)
@@ -146,18 +204,53 @@ class I3D:
         return self._add_node(CameraNode, camera_object, parent)
 
     def add_shape(self, evaluated_mesh: EvaluatedMesh, shape_name: Optional[str] = None, is_merge_group=False,
-                  is_generic=False, bone_mapping: ChainMap = None) -> int:
+                  is_generic=False, bone_mapping: ChainMap = None, lod_ratio: Optional[float] = None) -> int:
         name = shape_name or evaluated_mesh.name
         if name not in self.shapes:
+            content_key = None
+            # Merged and skinned shapes depend on the objects using them, so they are never shared
+            if self.settings['deduplicate_shapes'] and not (is_merge_group or is_generic or bone_mapping is not None):
+                content_key = mesh_content_key(evaluated_mesh, lod_ratio)
+                if (duplicate_of := self._find_identical_shape(content_key)) is not None:
+                    self.logger.debug(f"Shape '{name}' has the same content as '{duplicate_of.name}', reusing it")
+                    evaluated_mesh.release()
+                    self.shapes[name] = duplicate_of
+                    return duplicate_of.id
             shape_id = self._next_available_id('shape')
-            indexed_triangle_set = IndexedTriangleSet(shape_id, self, evaluated_mesh, shape_name, is_merge_group,
-                                                      is_generic, bone_mapping)
+            if lod_ratio is not None:
+                indexed_triangle_set = DecimatedTriangleSet(shape_id, self, evaluated_mesh, shape_name, lod_ratio)
+            else:
+                indexed_triangle_set = IndexedTriangleSet(shape_id, self, evaluated_mesh, shape_name, is_merge_group,
+                                                          is_generic, bone_mapping)
+            if content_key is not None:
+                self.shapes_by_content[content_key] = indexed_triangle_set
             # Store a reference to the shape from both it's name and its shape id
             self.shapes.update(dict.fromkeys([shape_id, name], indexed_triangle_set))
             self.xml_elements['Shapes'].append(indexed_triangle_set.element)
+            self.xml_elements['Shapes'].extend(part.element for part in indexed_triangle_set.parts)
             return shape_id
+        # The mesh was already exported, so it doesn't need to be evaluated
+        if not evaluated_mesh.is_evaluated:
+            self.avoided_evaluations += 1
+        evaluated_mesh.release()
         return self.shapes[name].id
 
+    def add_shape_part(self, shape: IndexedTriangleSet, geometry: dict,
+                       material_ids: List[int]) -> IndexedTriangleSetPart:
+        """Add a part of a shape that was split. It is added to the file along with the shape itself"""
+        shape_id = self._next_available_id('shape')
+        name = f"{shape.name}_part{len(shape.parts) + 1}"
+        part = IndexedTriangleSetPart(shape_id, self, shape, name, geometry, material_ids)
+        self.shapes.update(dict.fromkeys([shape_id, name], part))
+        return part
+
+    def _find_identical_shape(self, content_key: Optional[str]) -> Optional[IndexedTriangleSet]:
+        """Returns an earlier shape built from the same content, see `mesh_content_key`"""
+        if content_key is None or (shape := self.shapes_by_content.get(content_key)) is None:
+            return None
+        self.shape_reuses[shape] = self.shape_reuses.get(shape, 0) + 1
+        return shape
+
     def add_curve(self, evaluated_curve: EvaluatedNurbsCurve, curve_name: Optional[str] = None) -> int:
         name = curve_name or evaluated_curve.name
         if name not in self.shapes:
@@ -166,22 +259,32 @@ class I3D:
             # Store a reference to the curve from both its name and its curve id
             self.shapes.update(dict.fromkeys([curve_id, name], nurbs_curve))
             self.xml_elements['Shapes'].append(nurbs_curve.element)
+            if self.settings['export_all_splines']:
+                for spline_index in range(1, len(evaluated_curve.curve_data.splines)):
+                    part = self.add_curve_part(nurbs_curve, spline_index)
+                    self.xml_elements['Shapes'].append(part.element)
             return curve_id
         return self.shapes[name].id
 
+    def add_curve_part(self, curve: NurbsCurve, spline_index: int) -> NurbsCurve:
+        """Add a curve for one of the other splines of a curve, which is exported as a part of it"""
+        curve_id = self._next_available_id('shape')
+        name = f"{curve.name}_part{spline_index}"
+        part = NurbsCurve(curve_id, self, curve.evaluated_curve_data, name, spline_index)
+        self.shapes.update(dict.fromkeys([curve_id, name], part))
+        curve.parts.append(part)
+        return part
+
     def get_shape_by_id(self, shape_id: int):
         return self.shapes[shape_id]
 
     def add_user_attributes(self, user_attributes, node_id):
-        node_attribute_element = self.xml_elements['UserAttributes'].find(f"UserAttribute[@nodeId='{node_id:d}']")
-        if node_attribute_element is None:
-            node_attribute_element = xml_i3d.SubElement(self.xml_elements['UserAttributes'], 'UserAttribute',
-                                                        attrib={'nodeId': str(node_id)})
+        # Written in one go by `_write_user_attributes`, in the order of the node ids
+        self.user_attributes.add(node_id, ((attribute.name, attribute.type.replace('data_', ''),
+                                            getattr(attribute, attribute.type)) for attribute in user_attributes))
 
-        for attribute in user_attributes:
-            attrib = {'name': attribute.name, 'type': attribute.type.replace('data_', '')}
-            attribute_element = xml_i3d.SubElement(node_attribute_element, 'Attribute', attrib=attrib)
-            xml_i3d.write_attribute(attribute_element, 'value', getattr(attribute, attribute.type))
+    def _write_user_attributes(self) -> None:
+        self.user_attributes.write(self.xml_elements['UserAttributes'], xml_i3d.write_attribute)
 
     def collect_animation_link(self, node: SceneGraphNode) -> None:
         if not (animation_data := node.blender_object.animation_data) or not animation_data.action:
@@ -261,8 +364,53 @@ class I3D:
 
         return f"{longest_string * '-'}\n" + tree_string
 
+    def finalize_shapes(self) -> None:
+        """Writes the geometry of shapes that are assembled from several meshes, such as merge groups. This can first
+        be done once the whole scene has been processed, since children can be added at any point."""
+        for shape_id, shape in self.shapes.items():
+            # Shapes are stored by both name and id, so only go through the ids
+            if isinstance(shape_id, int) and isinstance(shape, IndexedTriangleSet):
+                shape.finalize()
+
     def export_to_i3d_file(self) -> None:
-        xml_i3d.export_to_i3d_file(self.xml_elements['Root'], self.paths['i3d_file_path'])
+        self.finalize_shapes()
+        self._write_user_attributes()
+        streamed_children = {}
+        for shape_id, shape in self.shapes.items():
+            if isinstance(shape_id, int) and isinstance(shape, IndexedTriangleSet):
+                streamed_children.update(shape.streamed_children())
+        xml_i3d.export_to_i3d_file(self.xml_elements['Root'], self.paths['i3d_file_path'], streamed_children)
+        if self.shape_cache is not None:
+            self.shape_cache.close()
+        if self.scratch is not None:
+            self.scratch.close()
+        if self.settings['deduplicate_shapes']:
+            saved_bytes = sum(reuses * shape.written_geometry_size() for shape, reuses in self.shape_reuses.items())
+            self.logger.info(f"Reused identical geometry for {sum(self.shape_reuses.values())} shapes, "
+                             f"saving about {saved_bytes} bytes")
+        self.logger.info(f"Skipped evaluating {self.avoided_evaluations} meshes that were already exported")
+        if self.settings['curve_tolerance'] > 0:
+            self.logger.info(f"Resampled curves from {self.curve_vertices_before} to {self.curve_vertices_after} "
+                             f"control vertices")
+        if self.extracted_mesh_sources:
+            self.logger.info(f"Extracted {self.extracted_mesh_sources} meshes of merged objects once, and reused them "
+                             f"for {self.reused_mesh_sources} other objects")
+        if self.settings['cull_triangles']:
+            self.logger.info(f"Left out {self.culled_degenerate_triangles} degenerate and "
+                             f"{self.culled_duplicate_triangles} duplicate triangles")
+        self.logger.info(f"Welded {self.welded_corners} corners into {self.welded_vertices} vertices with the "
+                         f"'{self.settings['precision_profile']}' precision profile")
+        if self.settings['split_large_shapes']:
+            self.logger.info(f"Split {self.split_shapes} shapes to fit 16-bit indices, "
+                             f"saving about {self.split_index_bytes} bytes of index buffers")
+        if self.bounding_spheres_written:
+            self.logger.info(f"Wrote tight bounding spheres for {self.bounding_spheres_written} of "
+                             f"{self.bounding_spheres_computed} shapes, their radius is on average "
+                             f"{self.bounding_sphere_radius_ratio / self.bounding_spheres_written:.0%} of the "
+                             f"sphere around the bounding box")
+        elif self.settings['compute_bounding_spheres']:
+            self.logger.info(f"None of the bounding spheres computed for {self.bounding_spheres_computed} shapes "
+                             f"was tighter than the sphere around the bounding box")
 
         if self.settings['i3d_mapping_file_path'] != '':
             self.export_i3d_mapping()
@@ -271,68 +419,39 @@ class I3D:
         file_path = bpy.path.abspath(self.settings['i3d_mapping_file_path'])
         self.logger.info(f"Exporting i3d mappings to {file_path}")
 
-        # Only use ElementTree for parsing the file, writing is done manually to avoid formatting the entire file
-        tree = xml_i3d.parse(file_path)
-        if tree is None:
-            self.logger.error(f"Failed to parse the XML file: {file_path}")
-            return
-        root = tree.getroot()
-        i3d_mappings_element = root.find('i3dMappings')
-
-        with open(file_path, 'r', encoding='utf-8') as xml_file:
-            lines = xml_file.readlines()
-
-        i3d_mapping_idx = None
-        closing_root_idx = None
-        xml_indentation = ' ' * 4
-        for idx, line in enumerate(lines):
-            stripped_line = line.strip()  # Remove leading and trailing whitespace
-            if '<i3dMappings>' in stripped_line:
-                i3d_mapping_idx = idx
-                xml_indentation = line[:line.find('<')]  # Preserve indentation
-                break
-            if stripped_line == f"</{root.tag}>":
-                closing_root_idx = idx  # Preserve the index of the closing root tag
-
-        if i3d_mapping_idx is None and closing_root_idx is not None:
-            i3d_mapping_idx = closing_root_idx
-            lines.insert(i3d_mapping_idx, f"\n{xml_indentation}<i3dMappings>\n")
-            self.logger.info(f"Inserted missing <i3dMappings> before </{root.tag}>.")
-
-        if i3d_mapping_idx is None:
-            self.logger.warning("Cannot export i3d mapping. No valid root element found!")
+        # The file is only patched where the mappings are, instead of being parsed and written in full
+        try:
+            with open(file_path, 'rb') as xml_file:
+                data = xml_file.read()
+        except OSError as e:
+            self.logger.error(f"Failed to read the XML file: {file_path} ({e})")
             return
 
-        def _build_index_string(node_to_index) -> str:
-            if node_to_index.parent is None:  # Root node should end with '>'
-                return f"{self.scene_root_nodes.index(node_to_index)}>"
-            index = _build_index_string(node_to_index.parent)
-            if index[-1] != '>':  # If it's not a root use '|'
-                index += '|'
-            # Add the child index
-            index += str(node_to_index.parent.children.index(node_to_index))
-            return index
-
-        new_mappings = []
+        # The child indices are only taken at this point, since nodes such as bones can still be reparented during
+        # the export
+        paths = index_paths(self.scene_root_nodes, set(self.i3d_mapping))
+        mappings = []
         for mapping_node in self.i3d_mapping:
+            if (path := paths.get(mapping_node)) is None:
+                self.logger.warning(f"'{mapping_node.name}' is not part of the exported scene graph, "
+                                    f"its i3d mapping is left out")
+                continue
             # If the mapping is an empty string, use the node name
-            mapping_name = getattr(mapping_node.blender_object.i3d_mapping, 'mapping_name', '') or mapping_node.name
-            new_mappings.append(
-                f'{xml_indentation*2}<i3dMapping id="{mapping_name}" node="{_build_index_string(mapping_node)}" />\n'
-            )
-
-        # Remove old mappings and insert new ones
-        if i3d_mappings_element is not None:
-            # Remove existing mappings while keeping <i3dMappings> tag
-            end_idx = i3d_mapping_idx
-            while end_idx < len(lines) and '</i3dMappings>' not in lines[end_idx]:
-                end_idx += 1
-            lines[i3d_mapping_idx + 1:end_idx] = new_mappings  # Replace contents
-        else:
-            lines.insert(i3d_mapping_idx + 1, ''.join(new_mappings) + f"{xml_indentation}</i3dMappings>\n")
+            mappings.append((getattr(mapping_node.blender_object.i3d_mapping, 'mapping_name', '') or mapping_node.name,
+                             path))
+        if (patch := i3d_mappings_patch(data, mappings)) is None:
+            self.logger.warning("Cannot export i3d mapping. No valid root element found!")
+            return
+        start, end, block = patch
+        if start == end:
+            self.logger.info("Inserted missing <i3dMappings> before the closing root tag.")
+
+        if data[start:end] == block:
+            self.logger.info(f"i3dMappings in {file_path} are already up to date")
+            return
 
-        with open(file_path, 'w', encoding='utf-8') as xml_file:
-            xml_file.writelines(lines)
+        with open(file_path, 'wb') as xml_file:
+            xml_file.write(data[:start] + block + data[end:])
 
         self.logger.info(f"Successfully exported i3dMappings to {file_path}")
 
@@ -341,6 +460,7 @@ from i3dio.node_classes.node import *
 from i3dio.node_classes.shape import *
 from i3dio.node_classes.merge_group import *
 from i3dio.node_classes.merge_children import *
+from i3dio.node_classes.lod import *
 from i3dio.node_classes.skinned_mesh import *
 from i3dio.node_classes.material import *
 from i3dio.node_classes.file import *
@@ -0,0 +1,69 @@
+"""Patching of the <i3dMappings> element of a vehicle xml file. Only the bytes of that element are replaced, so the
+rest of the file is written back exactly as it was, without parsing it."""
+from __future__ import annotations
+import re
+from typing import (Dict, Hashable, List, Optional, Sequence, Set, Tuple)
+from xml.sax.saxutils import escape
+
+# The whole i3dMappings element of a vehicle xml file, which can also be empty or self-closing
+I3D_MAPPINGS_PATTERN = re.compile(rb'<i3dMappings\s*(?:/>|>.*?</i3dMappings\s*>)', re.DOTALL)
+CLOSING_ROOT_PATTERN = re.compile(rb'</([\w.:-]+)\s*>\s*$')
+
+
+def i3d_mappings_patch(data: bytes, mappings: List[Tuple[str, str]]) -> Optional[Tuple[int, int, bytes]]:
+    """Builds the <i3dMappings> element for the xml file and finds where it goes. The element keeps the indentation
+    and line endings of the file.
+
+    Args:
+        data: The contents of the xml file
+        mappings: The id and index path of each mapping, in the order they are written
+
+    Returns:
+        The byte range of the existing element and the bytes to replace it with, or None if the file has no root
+        element. The range is empty when the element is missing and inserted before the closing root tag.
+    """
+    newline = b'\r\n' if b'\r\n' in data else b'\n'
+
+    block_match = I3D_MAPPINGS_PATTERN.search(data)
+    if block_match is not None:
+        start, end = block_match.span()
+        xml_indentation = data[data.rfind(b'\n', 0, start) + 1:start]
+        if xml_indentation.strip():
+            xml_indentation = b' ' * 4
+        prefix = suffix = b''
+    else:
+        root_match = CLOSING_ROOT_PATTERN.search(data)
+        if root_match is None:
+            return None
+        # Inserted on its own lines right before the closing root tag
+        start = end = data.rfind(b'\n', 0, root_match.start()) + 1
+        xml_indentation = b' ' * 4
+        prefix = newline + xml_indentation
+        suffix = newline
+
+    lines = [b'<i3dMappings>']
+    for mapping_name, path in mappings:
+        mapping_id = escape(mapping_name, {'"': '&quot;'})
+        lines.append(xml_indentation * 2 + f'<i3dMapping id="{mapping_id}" node="{path}" />'.encode('utf-8'))
+    lines.append(xml_indentation + b'</i3dMappings>')
+    return start, end, prefix + newline.join(lines) + suffix
+
+
+def index_paths(root_nodes: Sequence, nodes: Set[Hashable]) -> Dict[Hashable, str]:
+    """The index paths of the given nodes, such as '0>2|1', computed in a single pass over the scene graph. Nodes that
+    aren't in the scene graph below the root nodes are left out.
+
+    Args:
+        root_nodes: The root nodes of the scene graph, every node has a list of `children`
+        nodes: The nodes to find the index paths of
+    """
+    paths = {}
+    stack = [(node, f"{index}>") for index, node in reversed(list(enumerate(root_nodes)))]
+    while stack and len(paths) < len(nodes):
+        node, path = stack.pop()
+        if node in nodes:
+            paths[node] = path
+        separator = '' if path[-1] == '>' else '|'
+        stack.extend((child, f"{path}{separator}{index}")
+                     for index, child in reversed(list(enumerate(node.children))))
+    return paths
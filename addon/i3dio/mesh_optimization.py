@@ -0,0 +1,470 @@
+"""Optimizations of the triangle and vertex order of exported geometry, reduction of its triangle count, removal of
+redundant triangles, splitting it into parts and computing tight bounds for it. Also simplification of curves."""
+from __future__ import annotations
+import collections
+import heapq
+import math
+from typing import List
+
+import numpy as np
+
+# Size of the simulated vertex cache when ordering triangles, and the exponent its score decays with
+CACHE_SIZE = 32
+CACHE_DECAY_POWER = 1.5
+# Vertices of the last triangle get a fixed score, so the next triangle doesn't have to share exactly those
+LAST_TRIANGLE_SCORE = 0.75
+# Vertices with few triangles left are boosted, to finish them off instead of leaving lone triangles behind
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+MAX_VALENCE_SCORE = 64
+# FIFO cache size used to measure the average cache miss ratio, close to what most GPUs have
+ACMR_CACHE_SIZE = 16
+# Collapses that turn a triangle by more than about 75 degrees are rejected, to avoid flipped and sliver triangles
+MAX_COLLAPSE_NORMAL_COSINE = 0.25
+# Collapses that would leave a sliver triangle behind are rejected as well
+MIN_TRIANGLE_QUALITY = 0.05
+# Triangles with a height below this fraction of their longest edge have no area to speak of
+DEGENERATE_TRIANGLE_TOLERANCE = 1e-6
+# Triangles are checked for degeneracy in chunks, to bound the memory of the corner positions
+DEGENERATE_CHUNK_TRIANGLES = 1 << 20
+# Ritter's method normally settles after a handful of steps, this only guards against pathological point sets
+MAX_SPHERE_GROWTH_STEPS = 64
+
+_CACHE_POSITION_SCORES = [LAST_TRIANGLE_SCORE if position < 3 else
+                          (1.0 - (position - 3) / (CACHE_SIZE - 3)) ** CACHE_DECAY_POWER
+                          for position in range(CACHE_SIZE)]
+_VALENCE_SCORES = [0.0] + [VALENCE_BOOST_SCALE * valence ** -VALENCE_BOOST_POWER
+                           for valence in range(1, MAX_VALENCE_SCORE + 1)]
+# Vertex scores by cache position + 1 and remaining triangles, clamped to MAX_VALENCE_SCORE, so scoring a vertex is a
+# single lookup. A vertex without triangles left scores -1.
+_VERTEX_SCORES = [[-1.0] + [position_score + valence_score for valence_score in _VALENCE_SCORES[1:]]
+                  for position_score in [0.0] + _CACHE_POSITION_SCORES]
+
+
+def optimize_vertex_cache(triangles: np.ndarray, num_vertices: int) -> np.ndarray:
+    """Reorders triangles for the post-transform vertex cache, with Tom Forsyth's linear-speed algorithm.
+
+    Every vertex is scored by its position in a simulated LRU cache and by how many of its triangles are left, and
+    the triangle with the highest sum of scores among those using a cached vertex is emitted next. The algorithm is
+    sequential by nature, so it runs in plain Python at roughly 40 thousand triangles per second.
+
+    Args:
+        triangles: Vertex indices of each triangle, shape (triangles, 3)
+        num_vertices: The number of vertices referenced by the triangles
+
+    Returns:
+        The index of each triangle in the optimized order
+    """
+    num_triangles = len(triangles)
+    if num_triangles == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # The triangles using each vertex, stored contiguously per vertex. The first `remaining[vertex]` entries are the
+    # triangles of the vertex that haven't been emitted yet.
+    corners = triangles.ravel()
+    valence = np.bincount(corners, minlength=num_vertices)
+    offsets = np.concatenate(([0], np.cumsum(valence)[:-1])).tolist()
+    adjacency = (np.argsort(corners, kind='stable') // 3).tolist()
+    remaining = valence.tolist()
+
+    scores = _VERTEX_SCORES
+    cache_position = [-1] * num_vertices
+    vertex_score = np.asarray(scores[0])[np.minimum(valence, MAX_VALENCE_SCORE)]
+    triangle_score = vertex_score[triangles].sum(axis=1).tolist()
+    vertex_score = vertex_score.tolist()
+    triangle_vertices = triangles.tolist()
+    emitted = bytearray(num_triangles)
+    order = []
+    cache = []
+    best_triangle = int(np.argmax(triangle_score))
+    next_unemitted = 0
+
+    while True:
+        if best_triangle < 0:
+            # None of the cached vertices have triangles left, so continue with the next triangle in input order
+            while next_unemitted < num_triangles and emitted[next_unemitted]:
+                next_unemitted += 1
+            if next_unemitted == num_triangles:
+                break
+            best_triangle = next_unemitted
+
+        order.append(best_triangle)
+        emitted[best_triangle] = 1
+        vertices = triangle_vertices[best_triangle]
+        # A vertex used twice by a triangle also lists the triangle twice, so it is removed for every corner
+        for vertex in vertices:
+            start = offsets[vertex]
+            last = start + remaining[vertex] - 1
+            for idx in range(start, last + 1):
+                if adjacency[idx] == best_triangle:
+                    adjacency[idx], adjacency[last] = adjacency[last], adjacency[idx]
+                    remaining[vertex] -= 1
+                    break
+
+        if vertices[0] == vertices[1] or vertices[1] == vertices[2] or vertices[0] == vertices[2]:
+            vertices = list(dict.fromkeys(vertices))
+        # The vertices of the emitted triangle move to the front of the cache, pushing the oldest ones out
+        touched = vertices + [vertex for vertex in cache if vertex not in vertices]
+        cache = touched[:CACHE_SIZE]
+        for vertex in touched[CACHE_SIZE:]:
+            cache_position[vertex] = -1
+
+        # Rescore the touched vertices, and gather the triangles of the cached ones as candidates for the next one
+        candidates = []
+        for position, vertex in enumerate(touched):
+            if position < CACHE_SIZE:
+                cache_position[vertex] = position
+            vertex_remaining = remaining[vertex]
+            score = scores[cache_position[vertex] + 1][vertex_remaining if vertex_remaining < MAX_VALENCE_SCORE
+                                                      else MAX_VALENCE_SCORE]
+            delta = score - vertex_score[vertex]
+            if not vertex_remaining:
+                vertex_score[vertex] = score
+                continue
+            start = offsets[vertex]
+            vertex_triangles = adjacency[start:start + vertex_remaining]
+            if delta:
+                vertex_score[vertex] = score
+                for triangle in vertex_triangles:
+                    triangle_score[triangle] += delta
+            if position < CACHE_SIZE:
+                candidates += vertex_triangles
+
+        best_triangle = max(candidates, key=triangle_score.__getitem__) if candidates else -1
+
+    return np.asarray(order, dtype=np.int64)
+
+
+def average_cache_miss_ratio(triangles: np.ndarray, cache_size: int = ACMR_CACHE_SIZE) -> float:
+    """The average number of vertices that miss a FIFO vertex cache per triangle, between 0.5 and 3.0"""
+    if not len(triangles):
+        return 0.0
+    cache = collections.deque()
+    cached = set()
+    misses = 0
+    for vertex in triangles.ravel().tolist():
+        if vertex not in cached:
+            misses += 1
+            cache.append(vertex)
+            cached.add(vertex)
+            if len(cache) > cache_size:
+                cached.discard(cache.popleft())
+    return misses / len(triangles)
+
+
+def _quadric_error(quadric: list, position: list) -> float:
+    x, y, z = position
+    return (quadric[0] * x * x + 2 * quadric[1] * x * y + 2 * quadric[2] * x * z + 2 * quadric[3] * x
+            + quadric[4] * y * y + 2 * quadric[5] * y * z + 2 * quadric[6] * y
+            + quadric[7] * z * z + 2 * quadric[8] * z + quadric[9])
+
+
+def _triangle_normal(a: list, b: list, c: list) -> tuple:
+    ab = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+    ac = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+    return (ab[1] * ac[2] - ab[2] * ac[1], ab[2] * ac[0] - ab[0] * ac[2], ab[0] * ac[1] - ab[1] * ac[0])
+
+
+def _triangle_quality(positions: list, double_area: float) -> float:
+    """1.0 for an equilateral triangle, going towards 0.0 the thinner the triangle is"""
+    a, b, c = positions
+    squared_edges = sum((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+                        for p, q in ((a, b), (b, c), (c, a)))
+    return 2 * math.sqrt(3) * double_area / squared_edges if squared_edges > 0 else 0.0
+
+
+def _dot(a: tuple, b: tuple) -> float:
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def decimate(positions: np.ndarray, loop_vertices: np.ndarray, triangle_loops: np.ndarray,
+             locked_vertices: np.ndarray, target_triangles: int) -> tuple[np.ndarray, np.ndarray]:
+    """Reduces the number of triangles with quadric error metric edge collapses (Garland and Heckbert).
+
+    Vertices are only ever collapsed onto one of their neighbours, so no new vertices or corners are created. The
+    corners moved along with a collapse take over a corner of the neighbour from a triangle that is removed by it,
+    which keeps uvs and other corner attributes valid as long as the removed vertex isn't on a seam. Seam vertices must
+    therefore be locked by the caller, borders and non-manifold edges are locked here.
+
+    Args:
+        positions: Position of each vertex, shape (vertices, 3)
+        loop_vertices: Vertex index of each corner
+        triangle_loops: Corner indices of each triangle, shape (triangles, 3)
+        locked_vertices: Mask of vertices that must stay in place
+        target_triangles: The number of triangles to stop at
+
+    Returns:
+        The corner indices of the remaining triangles, which can be more than the target when the mesh can't be
+        reduced any further, and the index each of them had in the input
+    """
+    num_triangles = len(triangle_loops)
+    if target_triangles >= num_triangles:
+        return triangle_loops, np.arange(num_triangles)
+    triangle_vertices = loop_vertices[triangle_loops]
+    points = positions.astype(np.float64)
+
+    # The quadric of a vertex is the area weighted sum of the squared distances to the planes of its triangles
+    corners = points[triangle_vertices]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    double_areas = np.linalg.norm(normals, axis=1)
+    normals = np.divide(normals, double_areas[:, np.newaxis], out=np.zeros_like(normals),
+                        where=double_areas[:, np.newaxis] > 0)
+    a, b, c = normals.T
+    d = -np.einsum('ij,ij->i', normals, corners[:, 0])
+    plane_quadrics = np.stack([a * a, a * b, a * c, a * d, b * b, b * c, b * d, c * c, c * d, d * d], axis=1)
+    plane_quadrics *= 0.5 * double_areas[:, np.newaxis]
+    quadrics = np.zeros((len(points), 10))
+    for corner in range(3):
+        np.add.at(quadrics, triangle_vertices[:, corner], plane_quadrics)
+
+    # Edges with only one triangle are borders and edges with more than two a non-manifold junction, both keep
+    # their vertices in place
+    edges = np.sort(triangle_vertices[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edges, edge_counts = np.unique(edges, axis=0, return_counts=True)
+    locked = locked_vertices.copy()
+    locked[edges[edge_counts != 2].ravel()] = True
+
+    original_normals = normals.tolist()
+    positions_list = points.tolist()
+    quadrics_list = quadrics.tolist()
+    locked = locked.tolist()
+    tri_vertices = triangle_vertices.tolist()
+    tri_loops = triangle_loops.tolist()
+    alive = [True] * num_triangles
+    vertex_triangles = [set() for _ in range(len(points))]
+    for triangle, vertices in enumerate(tri_vertices):
+        for vertex in vertices:
+            vertex_triangles[vertex].add(triangle)
+    removed = [False] * len(points)
+    version = [0] * len(points)
+    heap = []
+
+    def push(source: int, target: int) -> None:
+        quadric = [x + y for x, y in zip(quadrics_list[source], quadrics_list[target])]
+        heapq.heappush(heap, (_quadric_error(quadric, positions_list[target]), source, target,
+                              version[source], version[target]))
+
+    for first, second in edges[edge_counts == 2].tolist():
+        if not locked[first]:
+            push(first, second)
+        if not locked[second]:
+            push(second, first)
+
+    remaining = num_triangles
+    while remaining > target_triangles and heap:
+        _, source, target, source_version, target_version = heapq.heappop(heap)
+        # Entries are never updated in place, a newer one has been pushed if any of the vertices changed
+        if removed[source] or removed[target] or source_version != version[source] \
+                or target_version != version[target]:
+            continue
+        shared = vertex_triangles[source] & vertex_triangles[target]
+        if not shared:
+            continue
+        moved = vertex_triangles[source] - shared
+
+        # The only vertices both share may be the ones opposite of the collapsed edge, otherwise the surface folds
+        # onto itself (the link condition)
+        opposite = {vertex for triangle in shared for vertex in tri_vertices[triangle]}
+        source_neighbours = {vertex for triangle in moved for vertex in tri_vertices[triangle]}
+        target_neighbours = {vertex for triangle in vertex_triangles[target] - shared
+                             for vertex in tri_vertices[triangle]}
+        if (source_neighbours & target_neighbours) - opposite:
+            continue
+
+        # Reject collapses that would flip, degenerate or sharply turn any of the moved triangles
+        target_position = positions_list[target]
+        flips = False
+        for triangle in moved:
+            triangle_positions = [positions_list[vertex] for vertex in tri_vertices[triangle]]
+            before = _triangle_normal(*triangle_positions)
+            triangle_positions[tri_vertices[triangle].index(source)] = target_position
+            after = _triangle_normal(*triangle_positions)
+            # Compared to the original normal as well, so a series of small turns can't add up to a flip
+            original = original_normals[triangle]
+            after_length = math.hypot(*after)
+            if _dot(before, after) <= MAX_COLLAPSE_NORMAL_COSINE * math.hypot(*before) * after_length \
+                    or _dot(original, after) <= MAX_COLLAPSE_NORMAL_COSINE * after_length \
+                    or _triangle_quality(triangle_positions, after_length) < MIN_TRIANGLE_QUALITY:
+                flips = True
+                break
+        if flips:
+            continue
+
+        shared_triangle = next(iter(shared))
+        target_loop = tri_loops[shared_triangle][tri_vertices[shared_triangle].index(target)]
+        for triangle in shared:
+            alive[triangle] = False
+            for vertex in tri_vertices[triangle]:
+                vertex_triangles[vertex].discard(triangle)
+            remaining -= 1
+        for triangle in moved:
+            corner = tri_vertices[triangle].index(source)
+            tri_vertices[triangle][corner] = target
+            tri_loops[triangle][corner] = target_loop
+            vertex_triangles[target].add(triangle)
+        vertex_triangles[source].clear()
+        removed[source] = True
+        quadrics_list[target] = [x + y for x, y in zip(quadrics_list[target], quadrics_list[source])]
+        version[target] += 1
+
+        neighbours = {vertex for triangle in vertex_triangles[target] for vertex in tri_vertices[triangle]}
+        neighbours.discard(target)
+        for neighbour in neighbours:
+            if not locked[neighbour]:
+                push(neighbour, target)
+            if not locked[target]:
+                push(target, neighbour)
+
+    kept = np.flatnonzero(alive)
+    return np.asarray(tri_loops, dtype=triangle_loops.dtype)[kept], kept
+
+
+def find_redundant_triangles(positions: np.ndarray, triangle_vertices: np.ndarray, triangle_materials: np.ndarray,
+                             tolerance: float = DEGENERATE_TRIANGLE_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the triangles that can be left out without changing what the mesh looks like.
+
+    Degenerate triangles have an area below `tolerance` times their longest edge squared, so the threshold doesn't
+    depend on the scale of the mesh. Duplicates use the same vertices in the same winding order with the same material
+    as an earlier triangle. The winding is part of that, so the two sides of a double sided face are both kept.
+
+    Args:
+        positions: Position of each vertex, shape (vertices, 3)
+        triangle_vertices: Vertex indices of each triangle, shape (triangles, 3)
+        triangle_materials: Material index of each triangle, shape (triangles,)
+        tolerance: Height of a triangle relative to its longest edge, below which it is degenerate
+
+    Returns:
+        Masks of the degenerate triangles and of the duplicate triangles that aren't degenerate
+    """
+    degenerate = np.empty(len(triangle_vertices), dtype=bool)
+    for start in range(0, len(triangle_vertices), DEGENERATE_CHUNK_TRIANGLES):
+        corners = positions[triangle_vertices[start:start + DEGENERATE_CHUNK_TRIANGLES]].astype(np.float64)
+        edges = corners[:, [1, 2, 0]] - corners
+        double_areas = np.linalg.norm(np.cross(edges[:, 0], edges[:, 1]), axis=1)
+        longest_edges = np.sqrt((edges ** 2).sum(axis=2).max(axis=1))
+        degenerate[start:start + DEGENERATE_CHUNK_TRIANGLES] = double_areas <= tolerance * longest_edges ** 2
+
+    # Start each triangle at its lowest vertex index, which keeps the winding order intact
+    rotations = (np.argmin(triangle_vertices, axis=1)[:, np.newaxis] + np.arange(3)) % 3
+    keys = np.column_stack([np.take_along_axis(triangle_vertices, rotations, axis=1), triangle_materials])
+    keys = np.ascontiguousarray(keys, dtype=np.int64)
+    _, first_occurrence = np.unique(keys.view(np.dtype((np.void, keys.itemsize * keys.shape[1]))).ravel(),
+                                    return_index=True)
+    duplicate = np.ones(len(triangle_vertices), dtype=bool)
+    duplicate[first_occurrence] = False
+    return degenerate, duplicate & ~degenerate
+
+
+def split_triangles(positions: np.ndarray, triangles: np.ndarray, max_vertices: int) -> List[np.ndarray]:
+    """Splits triangles into spatially coherent parts that each use at most `max_vertices` vertices, by halving them
+    at the median of their centers along the longest axis of their bounds until every part is small enough.
+
+    Args:
+        positions: Position of each vertex, shape (vertices, 3)
+        triangles: Vertex indices of each triangle, shape (triangles, 3)
+        max_vertices: The maximum number of distinct vertices of a part, at least 3
+
+    Returns:
+        The indices of the triangles of each part, in ascending order
+    """
+    centers = positions[triangles].mean(axis=1)
+    parts = []
+    pending = [np.arange(len(triangles))]
+    while pending:
+        indices = pending.pop()
+        if len(np.unique(triangles[indices])) <= max_vertices:
+            parts.append(indices)
+            continue
+        part_centers = centers[indices]
+        axis = np.argmax(part_centers.max(axis=0) - part_centers.min(axis=0))
+        order = np.argsort(part_centers[:, axis], kind='stable')
+        half = len(indices) // 2
+        # The lower half is pushed last, so the parts come out from low to high along each split axis
+        pending.append(np.sort(indices[order[half:]]))
+        pending.append(np.sort(indices[order[:half]]))
+    return parts
+
+
+def bounding_sphere(positions: np.ndarray) -> tuple[np.ndarray, float]:
+    """Finds a near optimal sphere around the positions with Ritter's method: a first guess through two far apart
+    points is grown towards the farthest point outside of it, until it holds every point. The sphere around the center
+    of the bounds is used instead when that happens to be smaller.
+
+    Args:
+        positions: Positions to enclose, shape (points, 3), at least one point
+
+    Returns:
+        The center and radius of the sphere
+    """
+    points = positions.astype(np.float64)
+    far_point = points[np.argmax(((points - points[0]) ** 2).sum(axis=1))]
+    other_far_point = points[np.argmax(((points - far_point) ** 2).sum(axis=1))]
+    center = (far_point + other_far_point) / 2
+    radius = math.dist(far_point, other_far_point) / 2
+    for _ in range(MAX_SPHERE_GROWTH_STEPS):
+        distances = np.linalg.norm(points - center, axis=1)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] <= radius:
+            break
+        # Grow just enough to touch the farthest point, while keeping the opposite side of the sphere in place
+        new_radius = (radius + distances[farthest]) / 2
+        center += (points[farthest] - center) * ((new_radius - radius) / distances[farthest])
+        radius = new_radius
+    # Rounding can leave the last point a hair outside
+    radius = max(radius, float(np.linalg.norm(points - center, axis=1).max()))
+
+    box_center = (points.min(axis=0) + points.max(axis=0)) / 2
+    box_center_radius = float(np.linalg.norm(points - box_center, axis=1).max())
+    if box_center_radius < radius:
+        return box_center, box_center_radius
+    return center, radius
+
+
+def _segment_distances(points: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """Distance of each point to the line segment from start to end"""
+    direction = end - start
+    length_squared = direction @ direction
+    if length_squared == 0:
+        return np.linalg.norm(points - start, axis=1)
+    t = np.clip((points - start) @ direction / length_squared, 0.0, 1.0)
+    return np.linalg.norm(points - (start + t[:, np.newaxis] * direction), axis=1)
+
+
+def simplify_polyline(points: np.ndarray, tolerance: float, cyclic: bool = False) -> np.ndarray:
+    """Simplifies a polyline with the Ramer-Douglas-Peucker algorithm, so that every point that is left out is within
+    `tolerance` of the simplified polyline. The first and last points are always kept.
+
+    Args:
+        points: The points of the polyline, shape (points, 3)
+        tolerance: The largest distance a left out point may have to the simplified polyline
+        cyclic: Whether the polyline is closed by a segment from its last point back to the first one. The first point
+            is kept and the last one can be left out, as long as the points are within tolerance of the closing segment
+
+    Returns:
+        The indices of the points to keep, in ascending order
+    """
+    points = points.astype(np.float64)
+    if cyclic:
+        # Simplified as an open polyline that ends where it starts
+        points = np.concatenate([points, points[:1]])
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    pending = [(0, len(points) - 1)]
+    if cyclic:
+        # The point farthest from the start is kept as well, so a closed curve never collapses into a single point
+        split = int(np.argmax(np.linalg.norm(points - points[0], axis=1)))
+        keep[split] = True
+        pending = [(0, split), (split, len(points) - 1)]
+    while pending:
+        first, last = pending.pop()
+        if last - first < 2:
+            continue
+        distances = _segment_distances(points[first + 1:last], points[first], points[last])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            pending += [(first, split), (split, last)]
+    if cyclic:
+        keep = keep[:-1]
+    return np.flatnonzero(keep)
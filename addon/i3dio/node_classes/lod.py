@@ -0,0 +1,142 @@
+"""Levels of detail that are generated on export, by decimating the triangles of a mesh"""
+from __future__ import annotations
+import dataclasses
+from typing import Optional
+import numpy as np
+import bpy
+
+from .node import (SceneGraphNode, TransformGroupNode)
+from .shape import (ShapePartNode, IndexedTriangleSet, EvaluatedMesh, MeshArrays, quantize, pack_rows)
+from .. import xml_i3d
+from ..i3d import I3D
+from ..shape_cache import ShapeKey
+from ..mesh_optimization import decimate
+
+# Giants Engine supports four levels of detail per LOD group, the full detail level included
+MAX_LOD_LEVELS = 4
+# Attributes of the object that are written to the LOD group instead of the levels
+LOD_GROUP_ATTRIBUTES = ('lodDistance', 'lodBlending')
+
+
+def seam_vertices(arrays: MeshArrays) -> np.ndarray:
+    """Finds the vertices with corners that differ in normal, uvs, color or material. Those are on hard edges, uv seams
+    or material borders, which have to stay in place when the mesh is decimated.
+
+    Returns:
+        Mask of the seam vertices, shape (vertices,)
+    """
+    corners = arrays.triangle_loops.ravel()
+    vertices = arrays.loop_vertices[corners]
+    columns = [vertices, np.repeat(arrays.triangle_materials, 3), quantize(arrays.normals[corners])]
+    columns += [quantize(uv[corners]) for uv in arrays.uvs]
+    if arrays.colors is not None:
+        columns.append(quantize(arrays.colors[corners]))
+    if arrays.generic is not None:
+        columns.append(arrays.generic[corners])
+    _, unique_corners = np.unique(pack_rows(columns), return_index=True)
+    return np.bincount(vertices[unique_corners], minlength=len(arrays.positions)) > 1
+
+
+class DecimatedTriangleSet(IndexedTriangleSet):
+    """A shape holding the mesh with its number of triangles reduced to a ratio of the original"""
+    def __init__(self, id_: int, i3d: I3D, evaluated_mesh: EvaluatedMesh, shape_name: Optional[str], ratio: float):
+        self.ratio = ratio
+        super().__init__(id_, i3d, evaluated_mesh, shape_name)
+
+    def _source_arrays(self) -> MeshArrays:
+        arrays = self.evaluated_mesh.extract_arrays()
+        triangle_loops, kept_triangles = self._decimate(arrays)
+        self.logger.info(f"Decimated from '{len(arrays.triangle_loops)}' to '{len(triangle_loops)}' triangles")
+        # The decimated triangles only reference existing corners, so everything else is shared with the full mesh
+        return dataclasses.replace(arrays, triangle_loops=triangle_loops,
+                                   triangle_materials=arrays.triangle_materials[kept_triangles])
+
+    def _decimate(self, arrays: MeshArrays) -> tuple[np.ndarray, np.ndarray]:
+        target_triangles = max(1, int(len(arrays.triangle_loops) * self.ratio))
+        shape_cache = self.i3d.shape_cache
+        if shape_cache is not None:
+            # Decimation is by far the slowest part of exporting a LOD, so its result is cached by the source geometry
+            cache_key = ShapeKey().update('LOD', arrays.positions, arrays.loop_vertices, arrays.normals,
+                                          len(arrays.uvs), *arrays.uvs, arrays.colors, arrays.generic,
+                                          arrays.triangle_loops, arrays.triangle_materials,
+                                          target_triangles).hexdigest()
+            if (entry := shape_cache.get(cache_key)) is not None:
+                self.logger.debug("Decimated triangles were found in the shape cache")
+                _, cached = entry
+                return cached['triangle_loops'], cached['kept_triangles']
+
+        triangle_loops, kept_triangles = decimate(arrays.positions, arrays.loop_vertices, arrays.triangle_loops,
+                                                  seam_vertices(arrays), target_triangles)
+        if len(triangle_loops) > target_triangles:
+            self.logger.warning(f"Could only be decimated to '{len(triangle_loops)}' triangles instead of "
+                                f"'{target_triangles}', since most of its vertices are on hard edges, "
+                                f"uv seams or borders")
+        if shape_cache is not None:
+            shape_cache.put(cache_key, {}, {'triangle_loops': triangle_loops, 'kept_triangles': kept_triangles})
+        return triangle_loops, kept_triangles
+
+
+class LodSourceMesh(EvaluatedMesh):
+    """The evaluated mesh of an object with generated LODs, shared by all of its levels. The object is evaluated and
+    extracted once, and every level is decimated from the arrays of the full mesh."""
+    def release(self, keep_arrays: bool = False) -> None:
+        # The shapes of the levels release their mesh once written, but the next level still needs it
+        pass
+
+    def release_levels(self) -> None:
+        """Frees the mesh, once the shapes of all levels have been written"""
+        super().release()
+
+
+class AutoLodRoot(TransformGroupNode):
+    """A mesh exported as a LOD group, with the full mesh and its decimated levels as children"""
+    def __init__(self, id_: int, lod_object: bpy.types.Object, i3d: I3D, parent: SceneGraphNode | None = None):
+        self.source_mesh = LodSourceMesh(i3d, lod_object)
+        super().__init__(id_=id_, empty_object=lod_object, i3d=i3d, parent=parent)
+        self.levels = [self.i3d.add_auto_lod_level(lod_object, self, level) for level in range(self.num_levels + 1)]
+        self.source_mesh.release_levels()
+
+    @property
+    def num_levels(self) -> int:
+        """The number of decimated levels, not counting the full detail level"""
+        return min(self.blender_object.i3d_auto_lod.levels, MAX_LOD_LEVELS - 1)
+
+    def populate_xml_element(self):
+        # The other attributes of the object are written to the levels, since those are the actual shapes
+        self._write_user_attributes()
+        self._add_transform_to_xml_element(self._transform_for_conversion)
+        i3d_attributes = self.blender_object.i3d_attributes
+        distances = tuple(i3d_attributes.lod_distances[:self.num_levels + 1])
+        if any(distance <= previous for previous, distance in zip(distances, distances[1:])):
+            self.logger.warning(f"LOD distances {distances} are not increasing, set them in the "
+                                f"'Generated LODs' panel of the object")
+        self._write_attribute('lodDistance', distances)
+        self._write_attribute('lodBlending', i3d_attributes.lod_blending)
+
+
+class AutoLodLevel(ShapePartNode):
+    """One level of an `AutoLodRoot`, level 0 being the full mesh"""
+    def __init__(self, id_: int, lod_object: bpy.types.Object, i3d: I3D, parent: AutoLodRoot, level: int):
+        self.level = level
+        super().__init__(id_, lod_object, i3d, parent, f"_LOD{level}")
+
+    def add_shape(self):
+        source_mesh = self.parent.source_mesh
+        if self.level == 0:
+            self.shape_id = self.i3d.add_shape(source_mesh)
+        else:
+            self.shape_id = self.i3d.add_shape(source_mesh, shape_name=f"{source_mesh.name}_LOD{self.level}",
+                                               lod_ratio=self.i3d.get_setting('lod_ratios')[self.level - 1])
+        self.xml_elements['IndexedTriangleSet'] = self.i3d.shapes[self.shape_id].element
+
+    def _write_properties(self):
+        if self.level == 0:
+            super()._write_properties()
+            # The LOD settings of the object belong to the LOD group, not to its shape
+            for name in LOD_GROUP_ATTRIBUTES:
+                self.element.attrib.pop(name, None)
+            return
+        # Only the shape attributes of the mesh are repeated for the decimated levels, things like physics are only
+        # needed once
+        data = self.blender_object.data
+        xml_i3d.write_i3d_properties(data, data.i3d_attributes, self.xml_elements)
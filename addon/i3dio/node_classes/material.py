@@ -40,6 +40,14 @@ class Material(Node):
     def is_normalmapped(self) -> bool:
         return 'Normalmap' in self.xml_elements
 
+    def required_vertex_attributes(self) -> set[str] | None:
+        """The vertex attributes used by the shader variation of the material, or None if the material doesn't have a
+        shader that declares them"""
+        attributes = self.blender_material.i3d_attributes
+        if attributes.shader_name == SHADER_DEFAULT or not attributes.required_vertex_attributes:
+            return None
+        return {attribute.name for attribute in attributes.required_vertex_attributes}
+
     def populate_xml_element(self) -> None:
         material = self.blender_material
         if material.use_nodes:
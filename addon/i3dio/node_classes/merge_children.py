@@ -2,7 +2,7 @@ import bpy
 import mathutils
 
 from .node import SceneGraphNode
-from .shape import (ShapeNode, EvaluatedMesh)
+from .shape import (ShapeNode, EvaluatedMesh, InstancedMesh)
 from ..i3d import I3D
 
 # Maximum index value for `mergeChildren` objects, used to normalize
@@ -34,11 +34,11 @@ class MergeChildrenRoot(ShapeNode):
         if obj.type == 'MESH':
             self.logger.debug(f"Processing mesh: '{obj.name}', g_value: {g_value}")
             self.i3d.shapes[self.shape_id].append_from_evaluated_mesh(
-                EvaluatedMesh(self.i3d, obj, reference_frame=reference_frame),
+                InstancedMesh.for_object(self.i3d, obj, reference_frame=reference_frame),
                 g_value
             )
 
-        for child in obj.children:
+        for child in self.i3d.hierarchy.children(obj):
             self._process_child_subtree(child, g_value, reference_frame)
 
     def _add_children_meshes(self) -> None:
@@ -57,7 +57,7 @@ class MergeChildrenRoot(ShapeNode):
         self.logger.debug(f"Merging child meshes (Interpolation steps: {interpolation_steps})")
 
         g_value_index = 0
-        for child in root_obj.children:
+        for child in self.i3d.hierarchy.children(root_obj):
             # Both mesh and non-mesh objects are processed; non-mesh objects only affect interpolation steps.
             # Generic value for this child and its descendants.
             generic_value = g_value_index / MERGE_CHILDREN_MAX_INDEX
@@ -67,6 +67,9 @@ class MergeChildrenRoot(ShapeNode):
             # Increment the g_value index for the next group of child meshes.
             g_value_index += interpolation_steps
 
+        # All children are known at this point, so the merged geometry can be written right away
+        self.i3d.shapes[self.shape_id].finalize()
+
     def populate_xml_element(self) -> None:
         self.logger.debug("Populating XML")
         super().populate_xml_element()
@@ -3,7 +3,7 @@ from typing import (OrderedDict, Optional, List)
 import bpy
 
 from .node import (SceneGraphNode, TransformGroupNode)
-from .shape import (ShapeNode, EvaluatedMesh)
+from .shape import (ShapeNode, EvaluatedMesh, InstancedMesh)
 
 from .. import (
             debugging,
@@ -36,7 +36,7 @@ class MergeGroupRoot(ShapeNode):
         self.skin_bind_ids += f"{child.id:d} "
         self._write_attribute('skinBindNodeIds', self.skin_bind_ids[:-1])
         self.i3d.shapes[self.shape_id].append_from_evaluated_mesh(
-            EvaluatedMesh(self.i3d, child.blender_object, reference_frame=self.blender_object.matrix_world))
+            InstancedMesh.for_object(self.i3d, child.blender_object, reference_frame=self.blender_object.matrix_world))
 
     def populate_xml_element(self):
         super().populate_xml_element()
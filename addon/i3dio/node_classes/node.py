@@ -110,9 +110,7 @@ class SceneGraphNode(Node):
         except AttributeError:
             pass
 
-        if "ANIMATIONS" in i3d.settings['features_to_export'] and isinstance(self.blender_object, bpy.types.Object):
-            self.i3d.collect_animation_link(self)
-
+        self.add_animation_link()
         self.add_i3d_mapping_to_xml()
 
         self.logger.debug(f"Initialized as a '{self.__class__.__name__}'")
@@ -222,6 +220,11 @@ class SceneGraphNode(Node):
     def add_child(self, node: SceneGraphNode):
         self.children.append(node)
 
+    def add_animation_link(self):
+        if "ANIMATIONS" in self.i3d.settings['features_to_export'] \
+                and isinstance(self.blender_object, bpy.types.Object):
+            self.i3d.collect_animation_link(self)
+
     def add_i3d_mapping_to_xml(self):
         try:
             if getattr(self.blender_object.i3d_mapping, 'is_mapped'):
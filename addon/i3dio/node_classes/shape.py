@@ -1,20 +1,215 @@
-import math
+from __future__ import annotations
 import mathutils
-import collections
 import logging
-from typing import (OrderedDict, Optional, List, ChainMap)
+import dataclasses
+from dataclasses import dataclass
+from typing import (Optional, List, ChainMap, Callable, Iterable, Iterator)
+import numpy as np
 import bpy
 
-from .node import (Node, SceneGraphNode)
+from .node import (Node, SceneGraphNode, TransformGroupNode)
 
 from .. import (debugging, xml_i3d)
 from ..i3d import I3D
+from ..shape_cache import ShapeKey
+from ..xml_writer import (FORMAT_CHUNK_ROWS, format_rows, element_lines)
+from ..skinning import (MAX_BLEND_WEIGHTS, select_skin_weights)
+from ..welding import (WELD_CHUNK_ROWS, WRITTEN_DECIMALS, PrecisionProfile, PRECISION_PROFILES, quantize, weld_keys,
+                       weld, weld_chunked)
+from ..mesh_optimization import (optimize_vertex_cache, average_cache_miss_ratio, split_triangles, bounding_sphere,
+                                 find_redundant_triangles, simplify_polyline)
+
+
+# Maximum number of uv layers supported by Giants Engine
+MAX_UV_LAYERS = 4
+# A computed bounding sphere is only written when its radius is at least this much smaller than that of the sphere
+# around the bounding box, which is what the engine falls back to
+MIN_BOUNDING_SPHERE_GAIN = 0.05
+# The vertex order of shapes with more triangles than this isn't optimized, since that would take over ten seconds
+MAX_VERTEX_CACHE_TRIANGLES = 500_000
+# Attribute data types that can be exported as extra channels, with the name of their value and number of components
+CHANNEL_ATTRIBUTE_TYPES = {'FLOAT': ('value', 1), 'INT': ('value', 1), 'FLOAT2': ('vector', 2),
+                           'FLOAT_VECTOR': ('vector', 3), 'FLOAT_COLOR': ('color', 4), 'BYTE_COLOR': ('color', 4),
+                           'QUATERNION': ('value', 4)}
+
+
+def parse_attribute_channels(text: str, logger=None) -> dict[str, str]:
+    """Parses the mapping of mesh attributes to vertex channels from the export settings, which has the form
+    'attribute:channel, ...' with uv0 to uv3 or generic as channel.
+
+    Returns:
+        The channel of each attribute name, entries that can't be parsed are left out with a warning
+    """
+    channels = {'generic'} | {f"uv{layer_idx}" for layer_idx in range(MAX_UV_LAYERS)}
+    attribute_channels = {}
+    for entry in filter(None, (entry.strip() for entry in text.split(','))):
+        attribute_name, _, channel = (part.strip() for part in entry.rpartition(':'))
+        if not attribute_name or channel.lower() not in channels:
+            if logger is not None:
+                logger.warning(f"Attribute channel '{entry}' isn't of the form 'attribute:channel' with uv0 to "
+                               f"uv{MAX_UV_LAYERS - 1} or generic as channel, it is ignored")
+            continue
+        attribute_channels[attribute_name] = channel.lower()
+    return attribute_channels
+
+
+def read_corner_attribute(mesh: bpy.types.Mesh, name: str, loop_vertices: np.ndarray, logger=None,
+                          empty: Callable = np.empty) -> Optional[np.ndarray]:
+    """Reads a point or corner attribute of the mesh in bulk, expanded to the corners.
+
+    Args:
+        empty: Allocates the array that is read into, like `numpy.empty`, see `ScratchSpace.empty`
+
+    Returns:
+        The values with shape (loops, components), or None if the mesh doesn't have a usable attribute of that name
+    """
+    if (attribute := mesh.attributes.get(name)) is None:
+        return None
+    if attribute.data_type not in CHANNEL_ATTRIBUTE_TYPES or attribute.domain not in ('POINT', 'CORNER'):
+        if logger is not None:
+            logger.warning(f"Incompatible attribute {name}: domain={attribute.domain}, "
+                           f"data_type={attribute.data_type}, it is ignored")
+        return None
+    value_name, num_components = CHANNEL_ATTRIBUTE_TYPES[attribute.data_type]
+    values = empty(len(attribute.data) * num_components,
+                   dtype=np.int32 if attribute.data_type == 'INT' else np.float32)
+    attribute.data.foreach_get(value_name, values)
+    values = cast_array(values, np.float32, empty).reshape(-1, num_components)
+    if attribute.domain == 'POINT':
+        values = gather_rows(values, loop_vertices, empty)
+    return values
+
+
+def gather_rows(values: np.ndarray, indices: np.ndarray, empty: Callable = np.empty) -> np.ndarray:
+    """Returns `values[indices]` in an array allocated with `empty`, such as point values expanded to the corners"""
+    gathered = empty((len(indices), *values.shape[1:]), dtype=values.dtype)
+    # Any other mode than 'raise' takes the values without an intermediate copy
+    np.take(values, indices, axis=0, out=gathered, mode='clip')
+    return gathered
+
+
+def cast_array(values: np.ndarray, dtype, empty: Callable = np.empty) -> np.ndarray:
+    """Returns the values as the given dtype in an array allocated with `empty`, or as is if they already are"""
+    if values.dtype == dtype:
+        return values
+    cast = empty(values.shape, dtype=dtype)
+    cast[...] = values
+    return cast
+
+
+@dataclass
+class MeshArrays:
+    """Flat copies of the mesh data needed for export, read in bulk with `foreach_get`.
+
+    Everything that is stored per corner (loop) has already been expanded from the point domain where needed, so
+    per corner attributes can be gathered with a single index array.
+    """
+    positions: np.ndarray  # (vertices, 3) float32
+    loop_vertices: np.ndarray  # (loops,) int32, vertex index of each loop
+    normals: np.ndarray  # (loops, 3) float32
+    uvs: List[np.ndarray]  # (loops, 2) float32 per uv layer, in export order
+    colors: Optional[np.ndarray]  # (loops, 4) float32, sRGB
+    generic: Optional[np.ndarray]  # (loops,) float64
+    triangle_loops: np.ndarray  # (triangles, 3) int32, loop indices of each triangle
+    triangle_materials: np.ndarray  # (triangles,) int32, material slot index of each triangle
+
+    @classmethod
+    def from_mesh(cls, mesh: bpy.types.Mesh, alphabetic_uvs: bool = False, logger=None,
+                  empty: Callable = np.empty, attribute_channels: dict[str, str] = None) -> MeshArrays:
+        """Extracts the arrays from a mesh, which must already have its loop triangles calculated.
+
+        Args:
+            empty: Allocates the arrays that are read into, like `numpy.empty`, see `ScratchSpace.empty`
+            attribute_channels: Mesh attributes to export in a uv layer or as the generic value, see
+                `parse_attribute_channels`. Attributes with more than two components fill the next uv layer as well.
+        """
+        num_loops = len(mesh.loops)
+        num_triangles = len(mesh.loop_triangles)
+
+        positions = empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', positions)
+        loop_vertices = empty(num_loops, dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', loop_vertices)
+        normals = empty(num_loops * 3, dtype=np.float32)
+        mesh.corner_normals.foreach_get('vector', normals)
+        triangle_loops = empty(num_triangles * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get('loops', triangle_loops)
+        triangle_materials = empty(num_triangles, dtype=np.int32)
+        mesh.loop_triangles.foreach_get('material_index', triangle_materials)
+
+        uv_keys = mesh.uv_layers.keys()
+        if alphabetic_uvs:
+            uv_keys = sorted(uv_keys)
+        uvs = []
+        for uv_key in uv_keys[:MAX_UV_LAYERS]:
+            uv = empty(num_loops * 2, dtype=np.float32)
+            mesh.uv_layers[uv_key].data.foreach_get('uv', uv)
+            uvs.append(uv.reshape(-1, 2))
+
+        colors = None
+        if len(mesh.color_attributes):
+            # Use the active color layer or fallback to the first (GE supports only one layer)
+            color_layer = mesh.color_attributes.active_color or mesh.color_attributes[0]
+            if color_layer.domain in ('CORNER', 'POINT'):
+                colors = empty(len(color_layer.data) * 4, dtype=np.float32)
+                color_layer.data.foreach_get('color_srgb', colors)
+                colors = colors.reshape(-1, 4)
+                if color_layer.domain == 'POINT':
+                    colors = gather_rows(colors, loop_vertices, empty)
+            elif logger is not None:
+                logger.warning(f"Incompatible color attribute {color_layer.name}: "
+                               f"domain={color_layer.domain}, data_type={color_layer.data_type}")
+
+        generic = None
+        if (generic_layer := mesh.attributes.get('generic')) is not None:
+            # The generic value can come from Geometry Nodes, and is expected to be stored per vertex
+            if generic_layer.domain in ('POINT', 'CORNER'):
+                generic = empty(len(generic_layer.data), dtype=np.float32)
+                generic_layer.data.foreach_get('value', generic)
+                if generic_layer.domain == 'POINT':
+                    generic = gather_rows(generic, loop_vertices, empty)
+                generic = cast_array(generic, np.float64, empty)
+            elif logger is not None:
+                logger.warning(f"Incompatible generic attribute: domain={generic_layer.domain}, it is ignored")
+
+        for attribute_name, channel in (attribute_channels or {}).items():
+            if (values := read_corner_attribute(mesh, attribute_name, loop_vertices, logger, empty)) is None:
+                continue
+            if channel == 'generic':
+                generic = cast_array(values[:, 0], np.float64, empty)
+                continue
+            # Two components go into each uv layer, starting at the mapped one
+            first_layer = int(channel[2:])
+            num_layers = (values.shape[1] + 1) // 2
+            if first_layer + num_layers > MAX_UV_LAYERS and logger is not None:
+                logger.warning(f"Attribute {attribute_name} doesn't fit in the uv layers from {channel} on, "
+                               f"its last components are left out")
+            for offset in range(min(num_layers, MAX_UV_LAYERS - first_layer)):
+                # Layers before the mapped one that the mesh doesn't have are zero
+                while len(uvs) <= first_layer + offset:
+                    uvs.append(np.zeros((num_loops, 2), dtype=np.float32))
+                # The second component of the last layer is zero for attributes with an odd number of components
+                layer = empty((num_loops, 2), dtype=np.float32)
+                components = values[:, 2 * offset:2 * offset + 2]
+                layer[:, :components.shape[1]] = components
+                layer[:, components.shape[1]:] = 0.0
+                uvs[first_layer + offset] = layer
+
+        return cls(positions=positions.reshape(-1, 3),
+                   loop_vertices=loop_vertices,
+                   normals=normals.reshape(-1, 3),
+                   uvs=uvs,
+                   colors=colors,
+                   generic=generic,
+                   triangle_loops=triangle_loops.reshape(-1, 3),
+                   triangle_materials=triangle_materials)
 
 
 class MaterialStorage:
     triangles: List = None
 
-    def __init__(self):
+    def __init__(self, material_id: int):
+        self.material_id = material_id
         self.triangles = []
 
     def __str__(self):
@@ -30,8 +225,13 @@ class SubSet:
         self.first_vertex = 0
         self.number_of_indices = 0
         self.number_of_vertices = 0
+        # Chunks of triangles, each a tuple of (MeshArrays, triangle indices into those arrays, bind index)
         self.triangles = []
 
+    @property
+    def number_of_triangles(self) -> int:
+        return sum(len(triangle_indices) for _, triangle_indices, _ in self.triangles)
+
     def as_dict(self):
         subset_attributes = {'firstIndex': f"{self.first_index}",
                              'firstVertex': f"{self.first_vertex}",
@@ -40,123 +240,350 @@ class SubSet:
         return subset_attributes
 
     def __str__(self):
-        return f'numTriangles="{len(self.triangles)}" ' \
+        return f'numTriangles="{self.number_of_triangles}" ' \
                f'firstIndex="{self.first_index}" firstVertex="{self.first_vertex}" ' \
                f'numIndices="{self.number_of_indices}" numVertices="{self.number_of_vertices}"'
 
-    def add_triangle(self, triangle):
-        self.triangles.append(triangle)
-
-
-class Vertex:
-    def __init__(self, subset_idx: int, position, normal, vertex_color, uvs, blend_ids=None,
-                 blend_weights=None, generic_value=None):
-        self._subset_idx = subset_idx
-        self._position = position
-        self._normal = normal
-        self._vertex_color = vertex_color
-        self._uvs = uvs
-        self._blend_ids = blend_ids
-        self._blend_weights = blend_weights
-        self._generic_value = generic_value
-        self._str = ''
-        self._make_hash_string()
-
-    def _make_hash_string(self):
-        self._str = f"{self._subset_idx}{self._position}{self._normal}{self._vertex_color}"
-        if self._generic_value is not None:
-            self._str += f"{self._generic_value}"
-
-        for uv in self._uvs:
-            self._str += f"{uv}"
-
-    def __str__(self):
-        return self._str
-
-    def __hash__(self):
-        return hash(self._str)
-
-    def __eq__(self, other):
-        return f"{self!s}" == f'{other!s}'
-
-    def position_for_xml(self):
-        return "{0:.6f} {1:.6f} {2:.6f}".format(*self._position)
-
-    def normal_for_xml(self):
-        return "{0:.6f} {1:.6f} {2:.6f}".format(*self._normal)
-
-    def vertex_color_for_xml(self):
-        if self._vertex_color is not None:
-            return "{0:.6f} {1:.6f} {2:.6f} {3:.6f}".format(*self._vertex_color)
-        else:
-            return ''
-
-    def uvs_for_xml(self):
-        uvs = []
-        for uv in self._uvs:
-            uvs.append("{0:.6f} {1:.6f}".format(*uv))
-        return uvs
-
-    def blend_ids_for_xml(self):
-        return "{0:d} {1:d} {2:d} {3:d}".format(*self._blend_ids)
-
-    def blend_weights_for_xml(self):
-        return "{0:.6f} {1:.6f} {2:.6f} {3:.6f}".format(*self._blend_weights)
-
-    def blend_id_for_xml(self):
-        return "{0:d}".format(self._blend_ids)
-
-    def generic_value_for_xml(self):
-        return "{}".format(self._generic_value)
+    def add_triangles(self, arrays: MeshArrays, triangle_indices: np.ndarray, bind_index: int = 0):
+        self.triangles.append((arrays, triangle_indices, bind_index))
+
+
+@dataclass
+class VertexArrays:
+    """Attributes of the welded vertices, in the order they are written to the i3d file"""
+    positions: np.ndarray  # (vertices, 3) float32
+    normals: np.ndarray  # (vertices, 3) float32
+    uvs: List[np.ndarray]  # (vertices, 2) float32 per uv layer
+    colors: Optional[np.ndarray] = None  # (vertices, 4) float32
+    blend_ids: Optional[np.ndarray] = None  # (vertices, 4) int32 for skinning or (vertices,) for merge groups
+    blend_weights: Optional[np.ndarray] = None  # (vertices, 4) float32
+    generic: Optional[np.ndarray] = None  # (vertices,) float64
+
+    def __len__(self):
+        return len(self.positions)
+
+    def take(self, indices: np.ndarray) -> VertexArrays:
+        """Returns the given vertices, in the given order"""
+        return VertexArrays(positions=self.positions[indices],
+                            normals=self.normals[indices],
+                            uvs=[uv[indices] for uv in self.uvs],
+                            colors=None if self.colors is None else self.colors[indices],
+                            blend_ids=None if self.blend_ids is None else self.blend_ids[indices],
+                            blend_weights=None if self.blend_weights is None else self.blend_weights[indices],
+                            generic=None if self.generic is None else self.generic[indices])
+
+
+def read_vertex_groups(mesh: bpy.types.Mesh) -> tuple[np.ndarray, np.ndarray]:
+    """Reads the vertex group assignments of every vertex into dense arrays.
+
+    Returns:
+        The vertex group index of each assignment, with shape (vertices, most assignments of any vertex) and padded
+        with -1, and the matching weights.
+    """
+    counts = np.empty(len(mesh.vertices), dtype=np.int64)
+    groups = []
+    weights = []
+    for vertex_index, vertex in enumerate(mesh.vertices):
+        vertex_groups = vertex.groups
+        counts[vertex_index] = len(vertex_groups)
+        for vertex_group in vertex_groups:
+            groups.append(vertex_group.group)
+            weights.append(vertex_group.weight)
+
+    rows = np.repeat(np.arange(len(counts)), counts)
+    columns = np.arange(len(groups)) - np.repeat(np.cumsum(counts) - counts, counts)
+    width = max(int(counts.max(initial=0)), 1)
+    dense_groups = np.full((len(counts), width), -1, dtype=np.int32)
+    dense_weights = np.zeros((len(counts), width), dtype=np.float32)
+    dense_groups[rows, columns] = groups
+    dense_weights[rows, columns] = weights
+    return dense_groups, dense_weights
 
 
 class EvaluatedMesh:
+    """Handle to the evaluated copy of a mesh object. The object isn't evaluated until its mesh is first used, so
+    meshes that turn out to be exported already are never evaluated at all."""
     def __init__(self, i3d: I3D, mesh_object: bpy.types.Object, name: str = None,
                  reference_frame: mathutils.Matrix = None, node=None):
         self.name = name or mesh_object.data.name
         self.i3d = i3d
         self.source_object = mesh_object
-        self.object = None
-        self.mesh = None
+        self.reference_frame = reference_frame
+        self.is_evaluated = False
+        self._object = None
+        self._mesh = None
+        self.arrays: Optional[MeshArrays] = None
         self.logger = debugging.ObjectNameAdapter(logging.getLogger(f"{__name__}.{type(self).__name__}"),
                                                   {'object_name': self.name})
-        self.generate_evaluated_mesh(mesh_object, reference_frame)
         self.node = node
 
+    @property
+    def object(self) -> bpy.types.Object:
+        self._evaluate()
+        return self._object
+
+    @property
+    def mesh(self) -> Optional[bpy.types.Mesh]:
+        """The evaluated mesh, which is None once it has been released"""
+        self._evaluate()
+        return self._mesh
+
+    def _evaluate(self) -> None:
+        if not self.is_evaluated:
+            self.is_evaluated = True
+            self.generate_evaluated_mesh(self.source_object, self.reference_frame)
+
     def generate_evaluated_mesh(self, mesh_object: bpy.types.Object, reference_frame: mathutils.Matrix = None) -> None:
         if self.i3d.get_setting('apply_modifiers'):
-            self.object = mesh_object.evaluated_get(self.i3d.depsgraph)
+            self._object = mesh_object.evaluated_get(self.i3d.depsgraph)
             self.logger.debug("is exported with modifiers applied")
         else:
-            self.object = mesh_object
+            self._object = mesh_object
             self.logger.debug("is exported without modifiers applied")
 
-        self.mesh = self.object.to_mesh(preserve_all_data_layers=False, depsgraph=self.i3d.depsgraph)
+        self._mesh = self._object.to_mesh(preserve_all_data_layers=False, depsgraph=self.i3d.depsgraph)
+        self._mesh.transform(self.export_transform(reference_frame))
+        if self.conversion_matrix().is_negative:
+            self._mesh.flip_normals()
+            self.logger.debug("conversion matrix is negative, flipping normals")
 
-        # If a reference is given transform the generated mesh by that frame to place it somewhere else than center of
-        # the mesh origo
-        if reference_frame is not None:
-            self.mesh.transform(reference_frame.inverted() @ self.object.matrix_world)
+        # Calculates triangles from mesh polygons
+        self._mesh.calc_loop_triangles()
 
+    def conversion_matrix(self) -> mathutils.Matrix:
+        """The axis conversion of the export, including the unit scale when that is applied"""
         conversion_matrix = self.i3d.conversion_matrix
         if self.i3d.get_setting('apply_unit_scale'):
             self.logger.debug("applying unit scaling")
             conversion_matrix = \
                 mathutils.Matrix.Scale(bpy.context.scene.unit_settings.scale_length, 4) @ conversion_matrix
+        return conversion_matrix
 
-        self.mesh.transform(conversion_matrix)
-        if conversion_matrix.is_negative:
-            self.mesh.flip_normals()
-            self.logger.debug("conversion matrix is negative, flipping normals")
+    def export_transform(self, reference_frame: mathutils.Matrix = None) -> mathutils.Matrix:
+        """The transform from the local space of the mesh object to the space the mesh is exported in"""
+        # If a reference is given transform the generated mesh by that frame to place it somewhere else than center of
+        # the mesh origo
+        if reference_frame is not None:
+            return self.conversion_matrix() @ reference_frame.inverted() @ self.source_object.matrix_world
+        return self.conversion_matrix()
+
+    def extract_arrays(self) -> MeshArrays:
+        """Reads the evaluated mesh into flat arrays, only done once per evaluated mesh"""
+        if self.arrays is None:
+            empty = np.empty if self.i3d.scratch is None else self.i3d.scratch.empty
+            self.arrays = MeshArrays.from_mesh(self.mesh, self.i3d.get_setting('alphabetic_uvs'), self.logger, empty,
+                                               self.i3d.attribute_channels)
+        return self.arrays
+
+    def get_materials(self) -> List[bpy.types.Material]:
+        """The materials in the slots of the mesh, a mesh without any materials is given the default material"""
+        mesh = self.mesh
+        if not len(mesh.materials):
+            self.logger.warning(f"Mesh '{mesh.name}' has no materials, assigning default material")
+            mesh.materials.append(self.i3d.get_default_material().blender_material)
+            self.logger.info(f"Assigned default material '{mesh.materials[-1].name}'")
+        return list(mesh.materials)
 
-        # Calculates triangles from mesh polygons
-        self.mesh.calc_loop_triangles()
+    def release(self, keep_arrays: bool = False) -> None:
+        """Frees the temporary mesh as soon as it isn't needed anymore. This is done explicitly instead of in
+        `__del__`, since garbage collection can happen at any point of the export.
 
-    # On hold for the moment, it seems to be triggered at random times in the middle of an export which messes with
-    # everything. Further investigation is needed.
-    def __del__(self):
-        pass
-        # self.object.to_mesh_clear()
+        Args:
+            keep_arrays: Keep the extracted arrays, for when the triangles of the mesh haven't been welded yet
+        """
+        if self._mesh is not None:
+            self._object.to_mesh_clear()
+            self._mesh = None
+        if not keep_arrays:
+            self.arrays = None
+
+
+def transform_arrays(arrays: MeshArrays, matrix: mathutils.Matrix, flip: bool = False) -> MeshArrays:
+    """Transforms the positions and normals of the arrays like `bpy.types.Mesh.transform`, followed by
+    `bpy.types.Mesh.flip_normals` if `flip` is set, into new arrays. The other arrays are shared with the originals.
+
+    Normals are transformed by the inverse transpose of the matrix and renormalized, so they stay perpendicular to the
+    surface under non uniform scaling. Blender computes the normals from the winding of the faces, so they point the
+    other way after a mirroring transform, and once more when the winding is flipped.
+    """
+    matrix = np.array(matrix, dtype=np.float64)
+    linear = matrix[:3, :3]
+    positions = (arrays.positions @ linear.T + matrix[:3, 3]).astype(np.float32)
+    normal_matrix = np.linalg.inv(linear).T
+    if (np.linalg.det(linear) < 0) != flip:
+        normal_matrix = -normal_matrix
+    normals = arrays.normals @ normal_matrix.T
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    triangle_loops = arrays.triangle_loops
+    if flip:
+        triangle_loops = np.ascontiguousarray(triangle_loops[:, [0, 2, 1]])
+    return dataclasses.replace(arrays, positions=positions, normals=normals.astype(np.float32),
+                               triangle_loops=triangle_loops)
+
+
+# Modifier properties that don't change what the modifier does
+IGNORED_MODIFIER_PROPERTIES = {'rna_type', 'name', 'show_expanded', 'show_in_editmode', 'show_on_cage',
+                               'show_render', 'is_active', 'is_override_data', 'persistent_uid', 'use_pin_to_last'}
+# Values of coordinate and space settings, such as the texture coordinates of a Displace modifier, that make the result
+# of a modifier depend on where the object itself is
+WORLD_SPACE_VALUES = {'GLOBAL', 'WORLD'}
+
+
+def _is_world_space_setting(identifier: str, value) -> bool:
+    if not (identifier.endswith('_coords') or 'space' in identifier):
+        return False
+    values = value if isinstance(value, set) else {value}
+    return not values.isdisjoint(WORLD_SPACE_VALUES)
+
+
+def modifier_stack_key(mesh_object: bpy.types.Object) -> Optional[tuple]:
+    """Describes the enabled modifiers of an object by their settings. Returns None if the result of the modifiers can
+    depend on more than the mesh and those settings, such as on the transform of another object or on the world
+    transform of the object itself."""
+    key = []
+    for modifier in mesh_object.modifiers:
+        if not modifier.show_viewport:
+            continue
+        # Geometry nodes can read anything in the scene
+        if modifier.type == 'NODES':
+            return None
+        settings = [modifier.type]
+        for prop in modifier.bl_rna.properties:
+            if prop.identifier in IGNORED_MODIFIER_PROPERTIES:
+                continue
+            value = getattr(modifier, prop.identifier)
+            if prop.type == 'POINTER':
+                if value is None:
+                    continue
+                if isinstance(value, bpy.types.Object) or not isinstance(value, bpy.types.ID):
+                    return None
+            elif prop.type == 'COLLECTION':
+                return None
+            elif prop.type == 'ENUM' and _is_world_space_setting(prop.identifier, value):
+                return None
+            elif isinstance(value, set):
+                value = frozenset(value)
+            elif getattr(prop, 'is_array', False):
+                value = tuple(tuple(item) if hasattr(item, '__len__') else item for item in value)
+            settings.append((prop.identifier, value))
+        key.append(tuple(settings))
+    return tuple(key)
+
+
+def mesh_content_key(evaluated_mesh: EvaluatedMesh, lod_ratio: Optional[float] = None) -> Optional[str]:
+    """A hash of everything that the shape of a single mesh is built from, used to find meshes with identical content
+    across mesh datablocks before building a shape for them. The other things a shape depends on are the export
+    settings, which are the same for every shape of an export. Returns None for meshes whose shape depends on the
+    object using it.
+
+    Args:
+        evaluated_mesh: The mesh, its arrays are extracted if they haven't been already
+        lod_ratio: The ratio the mesh is decimated to, for the shapes of generated LODs
+    """
+    shape_attributes = evaluated_mesh.source_object.data.i3d_attributes
+    # The bounding volume is written relative to the object using the shape
+    if shape_attributes.bounding_volume_object is not None:
+        return None
+    arrays = evaluated_mesh.extract_arrays()
+    # Meshes with a generic attribute are exported as generic shapes
+    if arrays.generic is not None:
+        return None
+    materials = [None if material is None else material.name for material in evaluated_mesh.get_materials()]
+    # Attributes of the mesh that are written to the shape, instead of the node using it
+    shape_attribute_values = []
+    for name, attribute in shape_attributes.i3d_map.items():
+        if attribute.get('placement') == 'IndexedTriangleSet':
+            value = getattr(shape_attributes, name)
+            if hasattr(value, '__len__') and not isinstance(value, str):
+                value = tuple(value)
+            shape_attribute_values.append((name, value))
+    return ShapeKey().update(arrays.positions, arrays.loop_vertices, arrays.normals, len(arrays.uvs), *arrays.uvs,
+                             arrays.colors, arrays.triangle_loops, arrays.triangle_materials, materials,
+                             shape_attribute_values, lod_ratio).hexdigest()
+
+
+class InstancedMesh(EvaluatedMesh):
+    """An evaluated mesh of an object that has the same mesh and modifiers as other objects, like the links of a
+    chain. The mesh is evaluated and extracted once for all of those objects, without any transform, and the arrays
+    are then transformed for each object on its own."""
+    def __init__(self, i3d: I3D, mesh_object: bpy.types.Object, source_key: tuple,
+                 reference_frame: mathutils.Matrix = None):
+        super().__init__(i3d, mesh_object, reference_frame=reference_frame)
+        self.source_key = source_key
+
+    @classmethod
+    def for_object(cls, i3d: I3D, mesh_object: bpy.types.Object,
+                   reference_frame: mathutils.Matrix = None) -> EvaluatedMesh:
+        """An evaluated mesh of the object which shares its extracted arrays with objects that have the same mesh and
+        modifiers, or a regular `EvaluatedMesh` when the modifiers don't allow that"""
+        modifiers = modifier_stack_key(mesh_object) if i3d.get_setting('apply_modifiers') else ()
+        if modifiers is None:
+            return EvaluatedMesh(i3d, mesh_object, reference_frame=reference_frame)
+        source_key = (mesh_object.data, modifiers, tuple(group.name for group in mesh_object.vertex_groups),
+                      tuple(slot.material for slot in mesh_object.material_slots),
+                      mesh_object.show_only_shape_key, mesh_object.active_shape_key_index)
+        return cls(i3d, mesh_object, source_key, reference_frame)
+
+    def _source(self) -> tuple[MeshArrays, List[bpy.types.Material]]:
+        if (source := self.i3d.mesh_sources.get(self.source_key)) is not None:
+            self.i3d.reused_mesh_sources += 1
+            return source
+        self._evaluate_untransformed()
+        source = self.i3d.mesh_sources[self.source_key] = (super().extract_arrays(), super().get_materials())
+        self.i3d.extracted_mesh_sources += 1
+        super().release()
+        return source
+
+    def _evaluate_untransformed(self) -> None:
+        self.is_evaluated = True
+        if self.i3d.get_setting('apply_modifiers'):
+            self._object = self.source_object.evaluated_get(self.i3d.depsgraph)
+        else:
+            self._object = self.source_object
+        self._mesh = self._object.to_mesh(preserve_all_data_layers=False, depsgraph=self.i3d.depsgraph)
+        self._mesh.calc_loop_triangles()
+
+    def extract_arrays(self) -> MeshArrays:
+        if self.arrays is None:
+            self.arrays = transform_arrays(self._source()[0], self.export_transform(self.reference_frame),
+                                           self.conversion_matrix().is_negative)
+        return self.arrays
+
+    def get_materials(self) -> List[bpy.types.Material]:
+        return list(self._source()[1])
+
+
+# Geometry values that are stored as arrays in the shape cache, instead of in its payload
+GEOMETRY_ARRAYS = ('vertex_arrays', 'triangles')
+
+
+def geometry_cache_entry(geometry: dict) -> tuple[dict, dict[str, np.ndarray]]:
+    """Splits the geometry of a shape into the payload and arrays of a shape cache entry"""
+    payload = {'vertex_group_ids': geometry['vertex_group_ids'], 'parts': []}
+    arrays = {}
+    for index, part in enumerate([geometry, *geometry.get('split_parts', [])]):
+        part_payload = {name: value for name, value in part.items()
+                        if name not in (*GEOMETRY_ARRAYS, 'split_parts', 'vertex_group_ids')}
+        part_payload['vertex_arrays'] = list(part['vertex_arrays'])
+        payload['parts'].append(part_payload)
+        arrays.update((f"{index}_{name}", values) for name, values in part['vertex_arrays'].items())
+        arrays[f"{index}_triangles"] = part['triangles']
+    return payload, arrays
+
+
+def geometry_from_cache_entry(payload: dict, arrays: dict[str, np.ndarray]) -> dict:
+    """The geometry of a shape from the payload and arrays of a shape cache entry"""
+    parts = []
+    for index, part in enumerate(payload['parts']):
+        part['vertex_arrays'] = {name: arrays[f"{index}_{name}"] for name in part['vertex_arrays']}
+        part['triangles'] = arrays[f"{index}_triangles"]
+        parts.append(part)
+    geometry, *split_parts = parts
+    if split_parts:
+        geometry['split_parts'] = split_parts
+    geometry['vertex_group_ids'] = payload['vertex_group_ids']
+    return geometry
 
 
 class IndexedTriangleSet(Node):
@@ -169,8 +596,8 @@ class IndexedTriangleSet(Node):
         self.id: int = id_
         self.i3d: I3D = i3d
         self.evaluated_mesh: EvaluatedMesh = evaluated_mesh
-        self.vertices: OrderedDict[Vertex, int] = collections.OrderedDict()
-        self.triangles: List[List[int]] = list()  # List of lists of vertex indexes
+        self.vertices: Optional[VertexArrays] = None
+        self.triangles: np.ndarray = np.empty((0, 3), dtype=np.int64)  # Vertex indexes of each triangle
         self.subsets: List[SubSet] = []
         self.is_merge_group = is_merge_group
         self.is_generic = is_generic
@@ -180,9 +607,20 @@ class IndexedTriangleSet(Node):
         self.child_index: int = 0
         self.generic_values_by_child_index = {}
         self.vertex_group_ids = {}
+        self._vertex_groups: Optional[tuple[np.ndarray, np.ndarray]] = None
+        # Keys of the shared sources in `I3D.mesh_sources` that meshes of this shape were extracted from
+        self._source_keys: set[tuple] = set()
         self.tangent: bool = False
         self.material_ids: List[int] = []
         self.materials: dict[str, MaterialStorage] = {}
+        # Shapes that meshes are appended to are first welded and written once all meshes have been added
+        self.needs_finalizing: bool = False
+        # The geometry as it is written, as produced by `_build_geometry`
+        self.geometry: Optional[dict] = None
+        # The shapes holding the other parts of the geometry, when it had to be split for having too many vertices
+        self.parts: List[IndexedTriangleSetPart] = []
+        # The number of bytes of the vertices and triangles that were streamed to the file
+        self.written_size = 0
         if shape_name is None:
             self.shape_name = self.evaluated_mesh.name
         else:
@@ -207,178 +645,289 @@ class IndexedTriangleSet(Node):
     def element(self, value):
         self.xml_elements['node'] = value
 
-    def process_subsets(self, mesh) -> None:
-        self.triangles = []
-        self.vertices = collections.OrderedDict()
+    def process_subsets(self) -> None:
+        """Welds the corners of all subsets into unique vertices and fills out the vertex and triangle arrays"""
+        chunks = [(subset_idx, *chunk) for subset_idx, subset in enumerate(self.subsets) for chunk in subset.triangles]
+        if not chunks:
+            self.vertices = VertexArrays(positions=np.empty((0, 3), dtype=np.float32),
+                                         normals=np.empty((0, 3), dtype=np.float32), uvs=[])
+            self.triangles = np.empty((0, 3), dtype=np.int64)
+            return
+        num_uvs = max((len(arrays.uvs) for _, arrays, _, _ in chunks), default=0)
+        has_colors = any(arrays.colors is not None for _, arrays, _, _ in chunks)
+        zeroed_uvs = set()
+        if self.i3d.get_setting('strip_vertex_attributes') \
+                and (required := self._shader_vertex_attributes()) is not None:
+            # The first uv layer is always kept, since textured shaders can't do without it
+            used_uvs = [layer_idx for layer_idx in range(num_uvs) if layer_idx == 0 or f"uv{layer_idx}" in required]
+            stripped = [f"uv{layer_idx}" for layer_idx in range(num_uvs) if layer_idx not in used_uvs]
+            # Uv layers are numbered, so unused layers before a used one are kept, but zeroed so they weld together
+            num_uvs = used_uvs[-1] + 1 if used_uvs else 0
+            zeroed_uvs = set(range(num_uvs)) - set(used_uvs)
+            if has_colors and 'color' not in required:
+                has_colors = False
+                stripped.append('color')
+            if stripped:
+                self.logger.info(f"Stripped vertex attributes that none of its shaders use: {', '.join(stripped)}")
+
+        # The corner arrays are filled chunk by chunk, so they can be scratch buffers that aren't held in memory
+        empty = np.empty if self.i3d.scratch is None else self.i3d.scratch.empty
+        num_corners = 3 * sum(len(triangle_indices) for _, _, triangle_indices, _ in chunks)
+        is_skinned = self.bone_mapping is not None and not self.is_merge_group
+        corner_subsets = empty(num_corners, dtype=np.int32)
+        corner_vertices = empty(num_corners, dtype=np.int32) if is_skinned else None
+        positions = empty((num_corners, 3), dtype=np.float32)
+        normals = empty((num_corners, 3), dtype=np.float32)
+        uvs = [empty((num_corners, 2), dtype=np.float32) for _ in range(num_uvs)]
+        colors = empty((num_corners, 4), dtype=np.float32) if has_colors else None
+        generic = empty(num_corners, dtype=np.float64) if self.is_generic else None
+        bind_ids = empty(num_corners, dtype=np.int32) if self.is_merge_group else None
+        start = 0
+        for subset_idx, arrays, triangle_indices, bind_index in chunks:
+            corners = arrays.triangle_loops[triangle_indices].ravel()
+            corner_range = slice(start, start + len(corners))
+            start += len(corners)
+            vertex_indices = arrays.loop_vertices[corners]
+            corner_subsets[corner_range] = subset_idx
+            if corner_vertices is not None:
+                corner_vertices[corner_range] = vertex_indices
+            positions[corner_range] = arrays.positions[vertex_indices]
+            normals[corner_range] = arrays.normals[corners]
+            # Meshes that are merged together can have a differing amount of uv layers or lack vertex colors
+            for layer_idx, layer in enumerate(uvs):
+                if layer_idx < len(arrays.uvs) and layer_idx not in zeroed_uvs:
+                    layer[corner_range] = arrays.uvs[layer_idx][corners]
+                else:
+                    layer[corner_range] = 0.0
+            if has_colors:
+                colors[corner_range] = arrays.colors[corners] if arrays.colors is not None else 1.0
+            if self.is_generic_from_geometry_nodes and arrays.generic is not None:
+                generic[corner_range] = arrays.generic[corners]
+            elif self.is_generic:
+                generic[corner_range] = self.generic_values_by_child_index[bind_index]
+            if bind_ids is not None:
+                bind_ids[corner_range] = bind_index
+
+        if self.i3d.get_setting('remove_redundant_attributes'):
+            uvs, colors = self._remove_redundant_attributes(uvs, colors)
+
+        blend_ids = blend_weights = None
+        if self.is_merge_group:
+            blend_ids = bind_ids
+        elif is_skinned:
+            blend_ids, blend_weights = self._process_skin_weights(corner_vertices)
+
+        # The corners are welded on everything that ends up in the vertex, see `weld_keys`
+        precision = self.precision
+
+        def corner_keys(key_range: slice) -> np.ndarray:
+            return weld_keys(precision, corner_subsets[key_range], positions[key_range], normals[key_range],
+                             [uv[key_range] for uv in uvs],
+                             *(None if column is None else column[key_range]
+                               for column in (colors, generic, blend_ids, blend_weights)))
+
+        if self.i3d.scratch is None or num_corners <= WELD_CHUNK_ROWS:
+            vertex_corners, corner_to_vertex = weld(corner_keys(slice(None)))
+        else:
+            # The keys are written to a scratch buffer chunk by chunk, and welded without loading all of them at once
+            first_keys = corner_keys(slice(0, WELD_CHUNK_ROWS))
+            keys = empty(num_corners, dtype=first_keys.dtype)
+            keys[:WELD_CHUNK_ROWS] = first_keys
+            for key_start in range(WELD_CHUNK_ROWS, num_corners, WELD_CHUNK_ROWS):
+                keys[key_start:key_start + WELD_CHUNK_ROWS] = corner_keys(slice(key_start, key_start + WELD_CHUNK_ROWS))
+            vertex_corners, corner_to_vertex = weld_chunked(keys, WELD_CHUNK_ROWS, empty)
+
+        self.vertices = VertexArrays(positions=positions[vertex_corners],
+                                     normals=normals[vertex_corners],
+                                     uvs=[uv[vertex_corners] for uv in uvs],
+                                     colors=None if colors is None else colors[vertex_corners],
+                                     blend_ids=None if blend_ids is None else blend_ids[vertex_corners],
+                                     blend_weights=None if blend_weights is None else blend_weights[vertex_corners],
+                                     generic=None if generic is None else generic[vertex_corners])
+        self.triangles = corner_to_vertex.reshape(-1, 3)
+        self.logger.info(f"Welded '{num_corners}' corners into '{len(self.vertices)}' vertices "
+                         f"({1 - len(self.vertices) / num_corners:.0%} fewer)")
+        self.i3d.welded_corners += num_corners
+        self.i3d.welded_vertices += len(self.vertices)
+
+        # Vertices are numbered by first appearance and the subsets are processed in order, so every subset owns a
+        # contiguous range of vertices
+        vertices_per_subset = np.bincount(corner_subsets[vertex_corners], minlength=len(self.subsets)).tolist()
         next_vertex = 0
         next_index = 0
         for idx, subset in enumerate(self.subsets):
-            self.logger.debug(f"Subset with index {idx}")
             subset.first_vertex = next_vertex
             subset.first_index = next_index
-            next_vertex, next_index = self.process_subset(mesh, subset, subset_idx=idx)
-
-    def process_subset(self, mesh: bpy.types.Mesh, subset: SubSet, triangle_offset: int = 0, subset_idx: int = 0) -> \
-            tuple[int, int]:
-        self.logger.debug(f"Processing subset: {subset}")
-
-        zero_weight_vertices = set()
-        for triangle_ in subset.triangles[triangle_offset:]:
-            bind_index = 0
-            if isinstance(triangle_, tuple):
-                triangle = triangle_[0]
-                bind_index = triangle_[1]
-                mesh = triangle_[2]
+            subset.number_of_vertices = vertices_per_subset[idx]
+            subset.number_of_indices = 3 * subset.number_of_triangles
+            next_vertex += subset.number_of_vertices
+            next_index += subset.number_of_indices
+            self.logger.debug(f"Subset {idx} with '{subset.number_of_triangles}' triangles and {subset}")
+
+        if self.i3d.get_setting('optimize_vertex_cache'):
+            self._optimize_vertex_order()
+
+    def _remove_redundant_attributes(self, uvs: List[np.ndarray],
+                                     colors: Optional[np.ndarray]) -> tuple[List[np.ndarray], Optional[np.ndarray]]:
+        """Removes trailing uv layers that are constant or a copy of an earlier layer, and vertex colors that are white
+        everywhere. Attributes are compared on the weld grid.
+
+        The first uv layer is always kept, since textured shaders can't do without it. Attributes that the shader of
+        any of the materials lists as required are kept as well.
+        """
+        required = self._shader_vertex_attributes() or set()
+        removed = []
+        precision = self.precision
+        quantized_uvs = [quantize(uv, precision.uv_decimals) for uv in uvs]
+        while len(quantized_uvs) > 1:
+            layer_idx = len(quantized_uvs) - 1
+            layer = quantized_uvs[layer_idx]
+            if f"uv{layer_idx}" in required:
+                break
+            if (layer == layer[0]).all():
+                removed.append(f"uv{layer_idx} (constant)")
+            elif (copied := next((other_idx for other_idx in range(layer_idx)
+                                  if np.array_equal(quantized_uvs[other_idx], layer)), None)) is not None:
+                removed.append(f"uv{layer_idx} (copy of uv{copied})")
             else:
-                triangle = triangle_
-
-            # Add a new empty container for the vertex indexes of the triangle
-            self.triangles.append(list())
-            for loop_index in triangle.loops:
-                blender_vertex = mesh.vertices[mesh.loops[loop_index].vertex_index]
-
-                # Add vertex color
-                vertex_color = None
-                if len(mesh.color_attributes):
-                    # Use the active color layer or fallback to the first (GE supports only one layer)
-                    color_layer = mesh.color_attributes.active_color or mesh.color_attributes[0]
-
-                    match color_layer.domain:
-                        case 'CORNER':
-                            # Color data is stored per corner/loop
-                            vertex_color = color_layer.data[loop_index].color_srgb
-                        case 'POINT':
-                            # Color data is stored per vertex
-                            color_vertex_index = mesh.loops[loop_index].vertex_index
-                            vertex_color = color_layer.data[color_vertex_index].color_srgb
-                        case _:
-                            self.logger.warning(f"Incompatible color attribute {color_layer.name}: "
-                                                f"domain={color_layer.domain}, data_type={color_layer.data_type}")
-
-                generic_value = None
-                if self.is_generic_from_geometry_nodes:
-                    # Get the generic value from the mesh attributes, can come from Geometry Nodes
-                    generic_layer = mesh.attributes["generic"]
-                    generic_vertex_index = mesh.loops[loop_index].vertex_index
-                    generic_value = generic_layer.data[generic_vertex_index].value
-                elif self.is_generic:
-                    generic_value = self.generic_values_by_child_index[bind_index]
-
-                # Add uvs
-                uvs = []
-                uv_keys = mesh.uv_layers.keys()
-                if self.i3d.settings['alphabetic_uvs']:
-                    uv_keys = sorted(uv_keys)
-
-                for count, uv_key in enumerate(uv_keys):
-                    if count < 4:
-                        uvs.append(mesh.uv_layers.get(uv_key).data[loop_index].uv)
-
-                blend_weights = []
-                blend_ids = []
-                if self.bone_mapping is not None:
-                    for vertex_group in blender_vertex.groups:
-                        # Filter out any potential vertex groups that aren't related to armatures
-                        if self.evaluated_mesh.object.vertex_groups[vertex_group.group].name in self.bone_mapping:
-                            if len(blend_ids) < 4:
-                                # Filters out weightings that are less than the decimal precision of i3d anyway
-                                if not math.isclose(vertex_group.weight, 0, abs_tol=0.000001):
-                                    if vertex_group.group not in self.vertex_group_ids:
-                                        self.vertex_group_ids[vertex_group.group] = len(self.vertex_group_ids)
-                                    blend_ids.append(self.vertex_group_ids[vertex_group.group])
-                                    blend_weights.append(vertex_group.weight)
-                            else:
-                                self.logger.warning("Vertex has weights from more than 4 bones! Rest of bones will be"
-                                                    "ignored for export!")
-                                break
-
-                    if len(blend_ids) == 0:
-                        zero_weight_vertices.add(blender_vertex.index)
-
-                    if len(blend_ids) < 4:
-                        padding = [0] * (4 - len(blend_ids))
-                        blend_ids += padding
-                        blend_weights += padding
-
-                vertex = Vertex(subset_idx,
-                                blender_vertex.co.xyz,
-                                mesh.loops[loop_index].normal,
-                                vertex_color,
-                                uvs,
-                                bind_index if isinstance(triangle_, tuple) else blend_ids,
-                                blend_weights,
-                                generic_value)
-
-                if vertex not in self.vertices:
-                    vertex_index = len(self.vertices)
-                    self.vertices[vertex] = vertex_index
-                    subset.number_of_vertices += 1
-                else:
-                    vertex_index = self.vertices[vertex]
-
-                self.triangles[-1].append(vertex_index)
-            subset.number_of_indices += 3
-
-        if zero_weight_vertices:
-            self.logger.warning(f"Has {len(zero_weight_vertices)} vertices with 0.0 weight to all bones. "
+                break
+            quantized_uvs.pop()
+        if colors is not None and 'color' not in required \
+                and (quantize(colors, precision.color_decimals) == 1.0).all():
+            removed.append("color (white)")
+            colors = None
+        if removed:
+            self.logger.info(f"Removed redundant vertex attributes: {', '.join(removed)}")
+        return uvs[:len(quantized_uvs)], colors
+
+    def _shader_vertex_attributes(self) -> Optional[set[str]]:
+        """The vertex attributes used by the shaders of all materials of the shape, or None if that isn't known for
+        every material"""
+        required = set()
+        for material_id in self.material_ids:
+            if (material_attributes := self.i3d.materials[material_id].required_vertex_attributes()) is None:
+                return None
+            required |= material_attributes
+        return required
+
+    def _optimize_vertex_order(self) -> None:
+        """Reorders the triangles of each subset for the vertex cache of the GPU, and then numbers the vertices in the
+        order the triangles use them, so they are also fetched from memory in order"""
+        if len(self.triangles) > MAX_VERTEX_CACHE_TRIANGLES:
+            self.logger.warning(f"Has '{len(self.triangles)}' triangles, which is more than "
+                                f"'{MAX_VERTEX_CACHE_TRIANGLES}'. Its vertex order is not optimized, since that "
+                                f"would take too long")
+            return
+        acmr_before = average_cache_miss_ratio(self.triangles)
+        for subset in self.subsets:
+            first_triangle = subset.first_index // 3
+            triangles = self.triangles[first_triangle:first_triangle + subset.number_of_indices // 3]
+            # The vertices of a subset are a contiguous range, so it can be optimized on its own
+            order = optimize_vertex_cache(triangles - subset.first_vertex, subset.number_of_vertices)
+            triangles[:] = triangles[order]
+
+        # Renumbering by first use keeps the vertices of each subset in its own range, since subsets come in order
+        first_use, corner_to_vertex = weld(self.triangles.ravel())
+        self.vertices = self.vertices.take(self.triangles.ravel()[first_use])
+        self.triangles = corner_to_vertex.reshape(-1, 3)
+        self.logger.info(f"Average cache miss ratio went from {acmr_before:.3f} to "
+                         f"{average_cache_miss_ratio(self.triangles):.3f} by optimizing the vertex order")
+
+    def _read_vertex_groups(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._vertex_groups is None:
+            self._vertex_groups = read_vertex_groups(self.evaluated_mesh.mesh)
+        return self._vertex_groups
+
+    def _bone_groups(self) -> np.ndarray:
+        # Filter out any potential vertex groups that aren't related to armatures
+        return np.array([vertex_group.name in self.bone_mapping
+                         for vertex_group in self.evaluated_mesh.object.vertex_groups], dtype=bool)
+
+    def _process_skin_weights(self, vertex_indices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the blend ids and weights of the given corner vertices. The weights are selected once per vertex,
+        while the blend ids are numbered in the order the bones are first used by the corners."""
+        bone_groups = self._bone_groups()
+        groups, weights = self._read_vertex_groups()
+        vertex_blend_groups, vertex_blend_weights, num_influences = \
+            select_skin_weights(groups, weights, bone_groups, self.i3d.get_setting('normalize_skin_weights'))
+
+        used_influences = num_influences[np.unique(vertex_indices)]
+        if num_too_many := np.count_nonzero(used_influences > MAX_BLEND_WEIGHTS):
+            self.logger.warning(f"Has {num_too_many} vertices with weights from more than {MAX_BLEND_WEIGHTS} bones! "
+                                f"Only the {MAX_BLEND_WEIGHTS} strongest bones of those are exported.")
+        if num_zero_weight := np.count_nonzero(used_influences == 0):
+            self.logger.warning(f"Has {num_zero_weight} vertices with 0.0 weight to all bones. "
                                 "This will confuse GE and result in the mesh showing up as just a wireframe. "
                                 "Please correct by assigning some weight to all vertices.")
 
-        self.logger.debug(f"Subset {triangle.material_index} with '{len(subset.triangles)}' triangles and {subset}")
-        return subset.first_vertex + subset.number_of_vertices, subset.first_index + subset.number_of_indices
+        corner_groups = vertex_blend_groups[vertex_indices]
+        # Number the vertex groups in the order they are first used, this is the order of the skin bind node ids
+        used_groups = corner_groups[corner_groups >= 0]
+        unique_groups, first_use = np.unique(used_groups, return_index=True)
+        for group in unique_groups[np.argsort(first_use)].tolist():
+            self.vertex_group_ids.setdefault(group, len(self.vertex_group_ids))
+
+        group_to_blend_id = np.zeros(len(bone_groups) + 1, dtype=np.int32)
+        for group, blend_id in self.vertex_group_ids.items():
+            group_to_blend_id[group] = blend_id
+        blend_ids = np.where(corner_groups >= 0, group_to_blend_id[corner_groups], 0)
+        return blend_ids, vertex_blend_weights[vertex_indices]
+
+    def _source_arrays(self) -> MeshArrays:
+        """The arrays that the shape is built from"""
+        return self.evaluated_mesh.extract_arrays()
 
     def populate_from_evaluated_mesh(self):
         """Populates mesh data from evaluated mesh."""
-        mesh = self.evaluated_mesh.mesh
+        arrays = self._source_arrays()
+        self._track_source(self.evaluated_mesh)
         # Check if evaluated mesh has "generic" attribute in its attributes
-        if "generic" in mesh.attributes:
+        if arrays.generic is not None:
             self.logger.debug("'generic' was found in mesh attributes, likely from a 'Geometry Nodes' modifer. "
                               "Exporting as generic")
             self.is_generic = True
             self.is_generic_from_geometry_nodes = True
 
-        self._ensure_materials_exist(mesh)
-        self._process_mesh_triangles(mesh)
-        self.process_subsets(mesh)
+        self._process_mesh_triangles(self.evaluated_mesh, arrays)
 
     def append_from_evaluated_mesh(self, mesh_to_append: EvaluatedMesh, generic_value: float = None):
-        """Appends mesh data from another EvaluatedMesh to existing IndexedTriangleSet."""
+        """Appends mesh data from another EvaluatedMesh to existing IndexedTriangleSet.
+
+        The triangles are only collected here, welding and writing is done once for all meshes in `finalize`.
+        """
         if not (self.is_merge_group or self.is_generic):
             self.logger.warning("Cannot add a mesh to an IndexedTriangleSet that is neither a merge group nor generic.")
             return
 
-        mesh = mesh_to_append.mesh
-        self._ensure_materials_exist(mesh)
+        arrays = mesh_to_append.extract_arrays()
+        self._track_source(mesh_to_append)
 
         if self.is_generic and generic_value is not None:
-            self.logger.debug(f"Added mesh '{mesh.name}' with generic value '{generic_value}'")
+            self.logger.debug(f"Added mesh '{mesh_to_append.name}' with generic value '{generic_value}'")
             prev_child_index = self.child_index
             self.generic_values_by_child_index[prev_child_index] = generic_value
-            self._process_mesh_triangles(mesh, index=prev_child_index, append=True)
+            self._process_mesh_triangles(mesh_to_append, arrays, index=prev_child_index, append=True)
             self.child_index += 1
         else:
             self.bind_index += 1
-            self._process_mesh_triangles(mesh, index=self.bind_index, append=True)
-
-        self.process_subsets(mesh)
-        self.xml_elements['vertices'].clear()
-        self.write_vertices()
-        self.xml_elements['triangles'].clear()
-        self.write_triangles()
-
-        self.xml_elements['subsets'].clear()
-        self._write_attribute('count', len(self.subsets), 'subsets')
-        for subset in self.subsets:
-            xml_i3d.SubElement(self.xml_elements['subsets'], 'Subset', subset.as_dict())
-
-    def _ensure_materials_exist(self, mesh: bpy.types.Mesh) -> None:
-        """Ensure that the mesh has at least one material, and if not, assign the default material."""
-        if not len(mesh.materials):
-            self.logger.warning(f"Mesh '{mesh.name}' has no materials, assigning default material")
-            mesh.materials.append(self.i3d.get_default_material().blender_material)
-            self.logger.info(f"Assigned default material '{mesh.materials[-1].name}'")
-
-    def _process_mesh_triangles(self, mesh: bpy.types.Mesh, index: int = None, append: bool = False) -> None:
+            self._process_mesh_triangles(mesh_to_append, arrays, index=self.bind_index, append=True)
+        self.needs_finalizing = True
+        # Only the extracted arrays are needed when the shape is finalized
+        mesh_to_append.release(keep_arrays=True)
+
+    def finalize(self) -> None:
+        """Welds and writes the geometry of all meshes that has been appended to the shape"""
+        if not self.needs_finalizing:
+            return
+        self.needs_finalizing = False
+        self._write_geometry()
+        self._release_sources()
+        # The node using the shape was written before all the materials of the appended meshes were known
+        if self.evaluated_mesh.node is not None:
+            self.evaluated_mesh.node.write_material_ids()
+
+    def _process_mesh_triangles(self, evaluated_mesh: EvaluatedMesh, arrays: MeshArrays, index: int = None,
+                                append: bool = False) -> None:
         """
         Processes triangles of the given mesh and assigns them to materials.
         - Ensures all triangles have valid materials.
@@ -387,81 +936,78 @@ class IndexedTriangleSet(Node):
         - Updates material IDs and determines if tangents are needed.
 
         Args:
-            mesh (bpy.types.Mesh): The mesh whose triangles will be processed.
+            evaluated_mesh (EvaluatedMesh): The mesh whose material slots are used.
+            arrays (MeshArrays): The extracted arrays of the mesh, holding the triangles to process.
             index (int, optional): The index used when appending a new mesh.
             append (bool, optional): If True, appends triangles to an existing set.
         """
-        # Group triangles by material in a temporary dictionary, order here does not matter
-        material_to_triangles_map = {}
+        slot_materials = evaluated_mesh.get_materials()
+        kept_triangles = self._cull_triangles(evaluated_mesh.name, arrays)
+        material_indices = arrays.triangle_materials[kept_triangles]
 
         # Determine a fallback material for handling corrupt mesh data.
         # If the mesh has only one material, we'll use that. Otherwise, use the default.
-        unique_mats = {mat for mat in mesh.materials if mat is not None}
+        unique_mats = {mat for mat in slot_materials if mat is not None}
         fallback_material = (next(iter(unique_mats), None) if len(unique_mats) == 1 else None)
 
-        has_warned_for_invalid_index = False
-        has_warned_for_empty_slot = False
-
-        for triangle in mesh.loop_triangles:
-            triangle_material = None
-            if not (0 <= triangle.material_index < len(mesh.materials)):
-                # Check if the triangle's material index is within the bounds for the slots list
-                if not has_warned_for_invalid_index:
-                    self.logger.warning("triangle(s) found with invalid material index, assigning fallback material")
-                    has_warned_for_invalid_index = True
-                if fallback_material is None:
-                    fallback_material = self.i3d.get_default_material().blender_material
-                triangle_material = fallback_material
-            else:
-                # Check if the slot assigned to this triangle is empty (None)
-                mat = mesh.materials[triangle.material_index]
-                if mat is None:
-                    if not has_warned_for_empty_slot:
-                        self.logger.warning("triangle(s) found with empty material slot, assigning fallback material")
-                        has_warned_for_empty_slot = True
-                    if fallback_material is None:
-                        fallback_material = self.i3d.get_default_material().blender_material
-                    triangle_material = fallback_material
-                else:
-                    triangle_material = mat
-
-            # Add the triangle to the list for its assigned material
-            triangles_list = material_to_triangles_map.setdefault(triangle_material, [])
-
-            # For merge/append operations, we must also store the mesh and its bind index
-            if append or self.is_merge_group:
-                triangles_list.append((triangle, index or self.bind_index, mesh))
-            else:
-                triangles_list.append(triangle)
-
-        if not material_to_triangles_map:
+        # Check if the triangle's material index is within the bounds for the slots list
+        invalid_index = (material_indices < 0) | (material_indices >= len(slot_materials))
+        slot_indices = np.where(invalid_index, 0, material_indices)
+        # Check if the slot assigned to this triangle is empty (None)
+        empty_slots = np.array([mat is None for mat in slot_materials], dtype=bool)
+        empty_slot = ~invalid_index & empty_slots[slot_indices]
+
+        if invalid_index.any():
+            self.logger.warning("triangle(s) found with invalid material index, assigning fallback material")
+        if empty_slot.any():
+            self.logger.warning("triangle(s) found with empty material slot, assigning fallback material")
+        needs_fallback = invalid_index | empty_slot
+        if needs_fallback.any() and fallback_material is None:
+            fallback_material = self.i3d.get_default_material().blender_material
+
+        used_slots = set(np.unique(slot_indices[~needs_fallback]).tolist())
+        used_mats = {slot_materials[slot] for slot in used_slots}
+        if needs_fallback.any():
+            used_mats.add(fallback_material)
+
+        if not used_mats:
             self.logger.warning("No used materials found on mesh.")
             return
 
         # Build the final list of materials in the correct order. Important for preventing material mix-ups.
         # We loop through the mesh's material slots (which have the right order) and create a new list containing
         # only the materials that are actually used. This guarantees that the order stays consistent.
-        ordered_used_materials = [mat for mat in mesh.materials if mat in material_to_triangles_map]
+        ordered_used_materials = list(dict.fromkeys(mat for mat in slot_materials if mat in used_mats))
 
         # Very unlikely, but could happen on a mesh with all empty slots or fully corrupted indices
-        if fallback_material and fallback_material not in ordered_used_materials \
-                and fallback_material in material_to_triangles_map:
+        if fallback_material and fallback_material not in ordered_used_materials and fallback_material in used_mats:
             self.logger.debug(f"Adding fallback material '{fallback_material.name}' to the ordered list.")
             ordered_used_materials.append(fallback_material)
 
         self.logger.debug(f"Material slot order being processed: {', '.join(m.name for m in ordered_used_materials)}")
 
+        # Map every triangle to the position of its material in the ordered list
+        material_order = {mat: idx for idx, mat in enumerate(ordered_used_materials)}
+        slot_to_material = np.array([material_order.get(mat, -1) for mat in slot_materials], dtype=np.int32)
+        triangle_to_material = slot_to_material[slot_indices]
+        if needs_fallback.any():
+            triangle_to_material[needs_fallback] = material_order[fallback_material]
+
         # Build the final export data using the ordered list
-        self.material_ids = [self.i3d.add_material(m) for m in ordered_used_materials]
-        self.tangent = self.tangent or any(self.i3d.materials[m_id].is_normalmapped() for m_id in self.material_ids)
+        material_ids = [self.i3d.add_material(m) for m in ordered_used_materials]
+        self.material_ids = material_ids
+        self.tangent = self.tangent or any(self.i3d.materials[m_id].is_normalmapped() for m_id in material_ids)
+
+        bind_index = index or self.bind_index
+        triangles_by_material = {mat: kept_triangles[triangle_to_material == idx]
+                                 for idx, mat in enumerate(ordered_used_materials)}
 
         # If appending, we add to the existing self.materials dictionary. Otherwise, we create new subsets.
         if append or self.is_merge_group:
             # Add the newly collected triangles to the `self.materials` storage
-            for mat in ordered_used_materials:
-                triangles_for_mat = material_to_triangles_map[mat]
-                storage_entry = self.materials.setdefault(mat.name, MaterialStorage())
-                storage_entry.triangles.extend(triangles_for_mat)
+            for mat, material_id in zip(ordered_used_materials, material_ids):
+                storage_entry = self.materials.setdefault(mat.name, MaterialStorage(material_id))
+                storage_entry.triangles.append((arrays, triangles_by_material[mat], bind_index))
 
             # Rebuild subsets from the now-updated self.materials dictionary
             self.subsets.clear()
@@ -469,97 +1015,319 @@ class IndexedTriangleSet(Node):
                 subset = SubSet()
                 subset.triangles = storage.triangles
                 self.subsets.append(subset)
+            self.material_ids = [storage.material_id for storage in self.materials.values()]
 
         else:  # For single meshes, directly create subsets from the ordered list of materials
             self.subsets.clear()
             for mat in ordered_used_materials:
                 subset = SubSet()
-                subset.triangles = material_to_triangles_map[mat]
+                subset.add_triangles(arrays, triangles_by_material[mat])
                 self.subsets.append(subset)
 
         # Warn about any materials in slots that were not used
-        all_slot_mats = {mat for mat in mesh.materials if mat is not None}
-        used_mats = set(material_to_triangles_map.keys())
-        for mat in all_slot_mats - used_mats:
+        for mat in unique_mats - used_mats:
             self.logger.warning(f"Material '{mat.name}' is not used by any triangle, it will be ignored.")
 
-    def write_vertices(self, offset=0):
-        # Vertices
-        self._write_attribute('count', len(self.vertices), 'vertices')
-        self._write_attribute('normal', True, 'vertices')
-        if self.tangent:
-            self._write_attribute('tangent', True, 'vertices')
-        for count, _ in enumerate(list(self.vertices.keys())[0].uvs_for_xml()):
-            self._write_attribute(f"uv{count}", True, 'vertices')
+    def _cull_triangles(self, mesh_name: str, arrays: MeshArrays) -> np.ndarray:
+        """Returns the indices of the triangles to export, leaving out degenerate and duplicate triangles"""
+        if not self.i3d.get_setting('cull_triangles'):
+            return np.arange(len(arrays.triangle_loops))
+        degenerate, duplicate = find_redundant_triangles(arrays.positions, arrays.loop_vertices[arrays.triangle_loops],
+                                                         arrays.triangle_materials)
+        num_degenerate = int(np.count_nonzero(degenerate))
+        num_duplicate = int(np.count_nonzero(duplicate))
+        if num_degenerate or num_duplicate:
+            message = f"Mesh '{mesh_name}' has {num_degenerate} degenerate and {num_duplicate} duplicate triangles"
+            if self.i3d.get_setting('strict_triangle_culling'):
+                self.logger.error(f"{message}, which fails the export in strict mode")
+                raise ValueError(f"{message} (shape '{self.name}')")
+            self.logger.info(f"{message}, which are left out")
+            self.i3d.culled_degenerate_triangles += num_degenerate
+            self.i3d.culled_duplicate_triangles += num_duplicate
+        return np.flatnonzero(~(degenerate | duplicate))
 
+    def populate_xml_element(self):
+        if self.is_generic:
+            # Skip writing mesh data for the root object of merged children.
+            # This ensures no vertices are exported while still allowing the bounding volume to be calculated.
+            self._process_bounding_volume()
+            self.evaluated_mesh.release()
+            return
+        # The arrays are needed for the geometry anyway, so this doesn't read anything from the mesh twice
+        if len(self.evaluated_mesh.extract_arrays().positions) == 0:
+            self.logger.warning("has no vertices! Export of this mesh is aborted.")
+            self.evaluated_mesh.release()
+            return
+        self.populate_from_evaluated_mesh()
+        self._process_bounding_volume()
         if self.is_merge_group:
-            self._write_attribute('singleblendweights', True, 'vertices')
-        elif self.is_generic:
-            self._write_attribute('generic', True, 'vertices')
-        elif self.bone_mapping is not None:
-            self._write_attribute('blendweights', True, 'vertices')
-
-        # Write vertices to xml
-        vertices_has_colors = False
-        for vertex in list(self.vertices.keys())[offset:]:
-            vertex_attributes = {'p': vertex.position_for_xml(),
-                                 'n': vertex.normal_for_xml()
-                                 }
-
-            for count, uv in enumerate(vertex.uvs_for_xml()):
-                vertex_attributes[f"t{count}"] = uv
-
-            vertex_color = vertex.vertex_color_for_xml()
-            if vertex_color != '':
-                vertices_has_colors = True
-                vertex_attributes['c'] = vertex_color
+            # Merge group children are appended later on, so the geometry is written when the shape is finalized
+            self.needs_finalizing = True
+            self.evaluated_mesh.release(keep_arrays=True)
+            return
+        self._write_geometry()
+        self._release_sources()
+
+    def _track_source(self, evaluated_mesh: EvaluatedMesh) -> None:
+        if isinstance(evaluated_mesh, InstancedMesh):
+            self._source_keys.add(evaluated_mesh.source_key)
+
+    def _release_sources(self) -> None:
+        """Frees everything the geometry was built from, once the arrays to write are built. Shared sources are
+        dropped as well, a later shape using the same mesh extracts it again."""
+        for source_key in self._source_keys:
+            self.i3d.mesh_sources.pop(source_key, None)
+        self._source_keys.clear()
+        self.vertices = None
+        self.triangles = np.empty((0, 3), dtype=np.int64)
+        self._vertex_groups = None
+        for subset in self.subsets:
+            subset.triangles = []
+        for storage in self.materials.values():
+            storage.triangles = []
+        self.evaluated_mesh.release()
 
-            if self.is_merge_group:
-                vertex_attributes['bi'] = vertex.blend_id_for_xml()
-            elif self.is_generic:
-                vertex_attributes['g'] = vertex.generic_value_for_xml()
-            elif self.bone_mapping is not None:
-                vertex_attributes['bw'] = vertex.blend_weights_for_xml()
-                vertex_attributes['bi'] = vertex.blend_ids_for_xml()
+    @property
+    def precision(self) -> PrecisionProfile:
+        return PRECISION_PROFILES[self.i3d.get_setting('precision_profile')]
 
-            xml_i3d.SubElement(self.xml_elements['vertices'], 'v', vertex_attributes)
+    @property
+    def can_be_split(self) -> bool:
+        # Merged and skinned shapes depend on the node using them being a single shape
+        return not (self.is_merge_group or self.is_generic or self.bone_mapping is not None)
 
-        if vertices_has_colors:
-            self._write_attribute('color', True, 'vertices')
+    def _build_geometry(self) -> dict:
+        """Welds the subsets into the vertices, triangles and subsets the way they are written to the i3d file.
 
-    def write_triangles(self, offset=0):
-        self._write_attribute('count', len(self.triangles), 'triangles')
+        The vertex attributes are kept as arrays by the name they are written with, they are only formatted while the
+        file is written, see `streamed_children`. When the shape is split, the geometry holds the first part and the
+        geometry of the other parts under 'split_parts'.
+        """
+        self.process_subsets()
+        max_vertices = self.i3d.get_setting('max_shape_vertices')
+        if self.i3d.get_setting('split_large_shapes') and self.can_be_split \
+                and len(self.vertices) > max_vertices:
+            geometry, *split_parts = [self._part_geometry(*part) for part in self._split(max_vertices)]
+            geometry['split_parts'] = split_parts
+            self.logger.info(f"Has '{len(self.vertices)}' vertices, which is more than '{max_vertices}'. "
+                             f"It is split into {len(split_parts) + 1} parts")
+        else:
+            geometry = self._part_geometry(self.vertices, self.triangles, [subset.as_dict() for subset in self.subsets])
+        geometry['vertex_group_ids'] = list(self.vertex_group_ids.items())
+        return geometry
+
+    def _split(self, max_vertices: int) -> Iterator[tuple[VertexArrays, np.ndarray, List[dict], List[int]]]:
+        """Splits the welded geometry into spatially coherent parts of at most `max_vertices` vertices each"""
+        triangle_subsets = np.repeat(np.arange(len(self.subsets)),
+                                     [subset.number_of_triangles for subset in self.subsets])
+        for triangle_indices in split_triangles(self.vertices.positions, self.triangles, max_vertices):
+            # Renumbering by first use keeps the vertices of each subset together, since the triangles stay in order
+            first_use, corner_to_vertex = weld(self.triangles[triangle_indices].ravel())
+            triangles = corner_to_vertex.reshape(-1, 3)
+            subsets = []
+            subset_indices, triangle_counts = np.unique(triangle_subsets[triangle_indices], return_counts=True)
+            first_triangle = 0
+            for triangle_count in triangle_counts.tolist():
+                subset_triangles = triangles[first_triangle:first_triangle + triangle_count]
+                subsets.append({'firstIndex': f"{3 * first_triangle}",
+                                'firstVertex': f"{subset_triangles.min()}",
+                                'numIndices': f"{3 * triangle_count}",
+                                'numVertices': f"{subset_triangles.max() - subset_triangles.min() + 1}"})
+                first_triangle += triangle_count
+            yield (self.vertices.take(self.triangles[triangle_indices].ravel()[first_use]), triangles, subsets,
+                   subset_indices.tolist())
+
+    def _part_geometry(self, vertices: VertexArrays, triangles: np.ndarray, subsets: List[dict],
+                       subset_indices: Optional[List[int]] = None) -> dict:
+        vertices_attributes = {'count': len(vertices), 'normal': True}
+        if self.tangent:
+            vertices_attributes['tangent'] = True
+        for count in range(len(vertices.uvs)):
+            vertices_attributes[f"uv{count}"] = True
 
-        # Write triangles to xml
-        for triangle in self.triangles[offset:]:
-            xml_i3d.SubElement(self.xml_elements['triangles'], 't', {'vi': "{0} {1} {2}".format(*triangle)})
+        if self.is_merge_group:
+            vertices_attributes['singleblendweights'] = True
+        elif self.is_generic:
+            vertices_attributes['generic'] = True
+        elif self.bone_mapping is not None:
+            vertices_attributes['blendweights'] = True
 
-    def populate_xml_element(self):
-        if len(self.evaluated_mesh.mesh.vertices) == 0 or self.is_generic:
-            if self.is_generic:
-                # Skip writing mesh data for the root object of merged children.
-                # This ensures no vertices are exported while still allowing the bounding volume to be calculated.
-                self._process_bounding_volume()
-                return
+        # The attributes of each vertex by the name they are written with, in the order they are written
+        vertex_arrays = {'p': vertices.positions, 'n': vertices.normals}
+        for count, uv in enumerate(vertices.uvs):
+            vertex_arrays[f"t{count}"] = uv
 
-            self.logger.warning("has no vertices! Export of this mesh is aborted.")
-            return
-        self.populate_from_evaluated_mesh()
-        self.logger.debug(f"Has '{len(self.subsets)}' subsets, "
-                          f"'{len(self.triangles)}' triangles and "
-                          f"'{len(self.vertices)}' vertices")
+        if vertices.colors is not None:
+            vertex_arrays['c'] = vertices.colors
+            vertices_attributes['color'] = True
 
-        self.write_vertices()
-        self.write_triangles()
+        if self.is_merge_group:
+            vertex_arrays['bi'] = vertices.blend_ids
+        elif self.is_generic:
+            vertex_arrays['g'] = vertices.generic
+        elif self.bone_mapping is not None:
+            vertex_arrays['bw'] = vertices.blend_weights
+            vertex_arrays['bi'] = vertices.blend_ids
+
+        geometry = {'vertices': vertices_attributes,
+                    'vertex_arrays': vertex_arrays,
+                    'triangles': triangles,
+                    'subsets': subsets}
+        if subset_indices is not None:
+            # The subsets of the shape that the part has triangles in, which decides the materials of the part
+            geometry['subset_indices'] = subset_indices
+        if self.i3d.get_setting('compute_bounding_spheres') and self.can_be_split and len(vertices):
+            geometry['bounding_sphere'] = self._bounding_sphere(vertices.positions)
+        return geometry
+
+    def _attribute_format(self, name: str, values: np.ndarray) -> tuple[np.ndarray, str]:
+        """The values of a vertex attribute the way they are formatted, and the format of a single value"""
+        if name == 'bi':
+            return values, '%d'
+        if name == 'g':
+            # Generic values are written in full
+            return values, '%r'
+        precision = self.precision
+        decimals = {'p': precision.position_decimals, 'n': precision.normal_decimals, 'c': precision.color_decimals,
+                    'bw': precision.weight_decimals}.get(name, precision.uv_decimals)
+        if precision.snap:
+            return quantize(values, decimals, dtype=np.float64), f"%.{decimals}f"
+        return values, f"%.{WRITTEN_DECIMALS}f"
+
+    @staticmethod
+    def _bounding_sphere(positions: np.ndarray) -> dict:
+        center, radius = bounding_sphere(positions)
+        # Pad the radius for the six significant digits that the center and radius are written with
+        radius += 1e-5 * (radius + float(np.abs(center).max()))
+        box_radius = float(np.linalg.norm(positions.max(axis=0) - positions.min(axis=0))) / 2
+        return {'center': center.tolist(), 'radius': radius, 'box_radius': box_radius}
+
+    def _geometry_key(self) -> str:
+        """Hashes everything that the formatted geometry depends on, to look it up in the shape cache"""
+        settings = self.i3d.settings
+        key = ShapeKey()
+        key.update(tuple(tuple(row) for row in self.i3d.conversion_matrix))
+        key.update_settings(settings, self.can_be_split)
+        if settings['strip_vertex_attributes'] or settings['remove_redundant_attributes']:
+            # Materials are hashed by name, so their shaders can change without changing the key otherwise
+            required = self._shader_vertex_attributes()
+            key.update(None if required is None else sorted(required))
+        if settings['apply_unit_scale']:
+            key.update(bpy.context.scene.unit_settings.scale_length)
+        key.update(self.is_merge_group, self.is_generic, self.is_generic_from_geometry_nodes, self.tangent)
+        key.update([self.i3d.materials[material_id].name for material_id in self.material_ids])
+
+        hashed_arrays = {}
+        for subset in self.subsets:
+            key.update(len(subset.triangles))
+            for arrays, triangle_indices, bind_index in subset.triangles:
+                # Merged meshes share their arrays between subsets, so hash each of them only once
+                if (arrays_digest := hashed_arrays.get(id(arrays))) is None:
+                    arrays_key = ShapeKey().update(arrays.positions, arrays.loop_vertices, arrays.normals,
+                                                   len(arrays.uvs), *arrays.uvs, arrays.colors, arrays.generic,
+                                                   arrays.triangle_loops)
+                    arrays_digest = hashed_arrays[id(arrays)] = arrays_key.hexdigest()
+                key.update(arrays_digest, triangle_indices, bind_index)
+                if self.is_generic:
+                    key.update(self.generic_values_by_child_index.get(bind_index))
+
+        if self.bone_mapping is not None and not self.is_merge_group and not self.is_generic:
+            groups, weights = self._read_vertex_groups()
+            key.update(groups, weights, self._bone_groups(), settings['normalize_skin_weights'])
+        return key.hexdigest()
+
+    def written_geometry_size(self) -> int:
+        """The number of bytes the vertex and triangle elements of the shape and its parts took up in the i3d file,
+        without their indentation. Only known once the file has been written."""
+        return sum(shape.written_size for shape in [self, *self.parts])
+
+    def _write_geometry(self) -> None:
+        for element_name in ('vertices', 'triangles', 'subsets'):
+            self.xml_elements[element_name].clear()
+
+        shape_cache = self.i3d.shape_cache
+        geometry = None
+        if shape_cache is not None:
+            cache_key = self._geometry_key()
+            if (entry := shape_cache.get(cache_key)) is not None:
+                self.logger.debug("Geometry was found in the shape cache")
+                geometry = geometry_from_cache_entry(*entry)
+                self.vertex_group_ids.update(geometry['vertex_group_ids'])
+        if geometry is None:
+            geometry = self._build_geometry()
+            if shape_cache is not None:
+                shape_cache.put(cache_key, *geometry_cache_entry(geometry))
+
+        self.logger.debug(f"Has '{len(geometry['subsets'])}' subsets, "
+                          f"'{len(geometry['triangles'])}' triangles and "
+                          f"'{geometry['vertices']['count']}' vertices")
+
+        self._write_geometry_elements(geometry)
+        if split_parts := geometry.get('split_parts'):
+            material_ids = self.material_ids
+            self.material_ids = [material_ids[idx] for idx in geometry['subset_indices']]
+            for part_geometry in split_parts:
+                self.parts.append(self.i3d.add_shape_part(self, part_geometry, material_ids))
+            # Every index takes two bytes instead of four, now that the parts fit within 16-bit indices
+            self.i3d.split_shapes += 1
+            self.i3d.split_index_bytes += 2 * sum(len(part.geometry['triangles']) * 3 for part in [self, *self.parts])
+
+    def _write_geometry_elements(self, geometry: dict) -> None:
+        # The vertices and triangles themselves are streamed to the file on export, see `streamed_children`
+        self.geometry = geometry
+        for name, value in geometry['vertices'].items():
+            self._write_attribute(name, value, 'vertices')
+        self._write_attribute('count', len(geometry['triangles']), 'triangles')
 
         # Subsets
-        self._write_attribute('count', len(self.subsets), 'subsets')
+        self._write_attribute('count', len(geometry['subsets']), 'subsets')
+        for subset in geometry['subsets']:
+            xml_i3d.SubElement(self.xml_elements['subsets'], 'Subset', subset)
 
-        self._process_bounding_volume()
+        if (sphere := geometry.get('bounding_sphere')) is not None:
+            self._write_bounding_sphere(sphere)
 
-        # Write subsets
-        for subset in self.subsets:
-            xml_i3d.SubElement(self.xml_elements['subsets'], 'Subset', subset.as_dict())
+    def _write_bounding_sphere(self, sphere: dict) -> None:
+        """Writes the computed bounding sphere, unless the user set a bounding volume or the engine's own sphere around
+        the bounding box is about as tight"""
+        if self.evaluated_mesh.source_object.data.i3d_attributes.bounding_volume_object is not None:
+            return
+        self.i3d.bounding_spheres_computed += 1
+        if sphere['radius'] > (1 - MIN_BOUNDING_SPHERE_GAIN) * sphere['box_radius']:
+            self.logger.debug(f"Bounding sphere with radius '{sphere['radius']:.6g}' isn't tighter than the one "
+                              f"around its bounding box, leaving it to the engine")
+            return
+        self.logger.debug(f"Bounding sphere has radius '{sphere['radius']:.6g}' instead of "
+                          f"'{sphere['box_radius']:.6g}' for the sphere around its bounding box")
+        self._write_attribute('bvCenter', tuple(sphere['center']))
+        self._write_attribute('bvRadius', sphere['radius'])
+        self.i3d.bounding_spheres_written += 1
+        self.i3d.bounding_sphere_radius_ratio += sphere['radius'] / sphere['box_radius']
+
+    def _vertex_lines(self) -> Iterator[str]:
+        # Taken out of the geometry, so the arrays are freed as soon as the shape is written
+        vertex_arrays = self.geometry.pop('vertex_arrays')
+        # Formatted a chunk at a time, so the lines of the whole shape never exist at once
+        for start in range(0, self.geometry['vertices']['count'], FORMAT_CHUNK_ROWS):
+            rows = slice(start, start + FORMAT_CHUNK_ROWS)
+            lines = element_lines('v', {name: self._attribute_format(name, values[rows])
+                                        for name, values in vertex_arrays.items()})
+            self.written_size += sum(map(len, lines))
+            yield from lines
+
+    def _triangle_lines(self) -> Iterator[str]:
+        triangles = self.geometry.pop('triangles')
+        for start in range(0, len(triangles), FORMAT_CHUNK_ROWS):
+            lines = element_lines('t', {'vi': (triangles[start:start + FORMAT_CHUNK_ROWS], '%d')})
+            self.written_size += sum(map(len, lines))
+            yield from lines
+
+    def streamed_children(self) -> dict[xml_i3d.XML_Element, Callable[[], Iterable[str]]]:
+        """The vertex and triangle elements to stream into the i3d file, see `xml_writer.export_to_i3d_file`"""
+        if self.geometry is None:
+            return {}
+        return {self.xml_elements['vertices']: self._vertex_lines,
+                self.xml_elements['triangles']: self._triangle_lines}
 
     def _process_bounding_volume(self):
         bounding_volume_object = self.evaluated_mesh.source_object.data.i3d_attributes.bounding_volume_object
@@ -583,26 +1351,16 @@ class IndexedTriangleSet(Node):
             )
 
 
-class ControlVertex:
-    def __init__(self, position):
-        self._position = position
-        self._str = ''
-        self._make_hash_string()
-
-    def _make_hash_string(self):
-        self._str = f"{self._position}"
-
-    def __str__(self):
-        return self._str
-
-    def __hash__(self):
-        return hash(self._str)
-
-    def __eq__(self, other):
-        return f"{self!s}" == f'{other!s}'
+class IndexedTriangleSetPart(IndexedTriangleSet):
+    """One of the parts that a shape with too many vertices is split into, written from already formatted geometry"""
+    def __init__(self, id_: int, i3d: I3D, shape: IndexedTriangleSet, shape_name: str, geometry: dict,
+                 material_ids: List[int]):
+        self.part_geometry = geometry
+        super().__init__(id_, i3d, shape.evaluated_mesh, shape_name)
+        self.material_ids = [material_ids[idx] for idx in geometry['subset_indices']]
 
-    def position_for_xml(self):
-        return "{0:.6f} {1:.6f} {2:.6f}".format(*self._position)
+    def populate_xml_element(self):
+        self._write_geometry_elements(self.part_geometry)
 
 
 class EvaluatedNurbsCurve:
@@ -638,19 +1396,34 @@ class EvaluatedNurbsCurve:
 
         self.curve_data.transform(conversion_matrix)
 
+    def read_spline_points(self, spline: bpy.types.Spline) -> np.ndarray:
+        """Reads the positions of the points of a spline in bulk, shape (points, 3)"""
+        if spline.type == 'BEZIER':
+            positions = np.empty(len(spline.bezier_points) * 3, dtype=np.float32)
+            spline.bezier_points.foreach_get('co', positions)
+            return positions.reshape(-1, 3)
+        # Nurbs and poly points have a fourth coordinate for the weight
+        positions = np.empty(len(spline.points) * 4, dtype=np.float32)
+        spline.points.foreach_get('co', positions)
+        return positions.reshape(-1, 4)[:, :3]
+
 
 class NurbsCurve(Node):
     ELEMENT_TAG = 'NurbsCurve'
     NAME_FIELD_NAME = 'name'
     ID_FIELD_NAME = 'shapeId'
 
-    def __init__(self, id_: int, i3d: I3D, evaluated_curve_data: EvaluatedNurbsCurve, shape_name: Optional[str] = None):
+    def __init__(self, id_: int, i3d: I3D, evaluated_curve_data: EvaluatedNurbsCurve, shape_name: Optional[str] = None,
+                 spline_index: int = 0):
         self.id: int = id_
         self.i3d: I3D = i3d
         self.evaluated_curve_data: EvaluatedNurbsCurve = evaluated_curve_data
-        self.control_vertex: OrderedDict[ControlVertex, int] = collections.OrderedDict()
+        self.spline_index = spline_index
+        self.control_vertices: np.ndarray = np.empty((0, 3), dtype=np.float32)
         self.spline_type = None
         self.spline_form = None
+        # The curves holding the other splines of the curve object, when all splines are exported
+        self.parts: List[NurbsCurve] = []
         if shape_name is None:
             self.shape_name = self.evaluated_curve_data.name
         else:
@@ -670,34 +1443,44 @@ class NurbsCurve(Node):
         self.xml_elements['node'] = value
 
     def process_spline(self, spline):
-        if spline.type == 'BEZIER':
-            points = spline.bezier_points
-            self.spline_type = "cubic"
-        elif spline.type == 'NURBS':
-            points = spline.points
+        if spline.type in ('BEZIER', 'NURBS'):
             self.spline_type = "cubic"
         elif spline.type == 'POLY':
-            points = spline.points
             self.spline_type = "linear"
         else:
             self.logger.warning(f"{spline.type} is not supported! Export of this curve is aborted.")
             return
 
-        for loop_index, point in enumerate(points):
-            ctrl_vertex = ControlVertex(point.co.xyz)
-            self.control_vertex[ctrl_vertex] = loop_index
-
+        positions = self.evaluated_curve_data.read_spline_points(spline)
+        # Repeated points add nothing to the curve, but only consecutive ones are dropped, since a path can cross itself
+        repeated = np.zeros(len(positions), dtype=bool)
+        repeated[1:] = (positions[1:] == positions[:-1]).all(axis=1)
+        if spline.use_cyclic_u and len(positions) > 1:
+            repeated[-1] |= (positions[-1] == positions[0]).all()
+        if num_repeated := np.count_nonzero(repeated):
+            self.logger.debug(f"Dropped {num_repeated} repeated control vertices")
+            positions = positions[~repeated]
+
+        tolerance = self.i3d.get_setting('curve_tolerance')
+        # Only linear splines are simplified, the control vertices of the others aren't points on the curve
+        if tolerance > 0 and self.spline_type == "linear" and len(positions) > 2:
+            kept = simplify_polyline(positions, tolerance, spline.use_cyclic_u)
+            self.logger.info(f"Resampled from '{len(positions)}' to '{len(kept)}' control vertices "
+                             f"within a tolerance of {tolerance:g}")
+            self.i3d.curve_vertices_before += len(positions)
+            self.i3d.curve_vertices_after += len(kept)
+            positions = positions[kept]
+
+        self.control_vertices = positions
         self.spline_form = "closed" if spline.use_cyclic_u else "open"
 
     def populate_from_evaluated_nurbscurve(self):
-        spline = self.evaluated_curve_data.curve_data.splines[0]
+        spline = self.evaluated_curve_data.curve_data.splines[self.spline_index]
         self.process_spline(spline)
 
     def write_control_vertices(self):
-        for control_vertex in list(self.control_vertex.keys()):
-            vertex_attributes = {'c': control_vertex.position_for_xml()}
-
-            xml_i3d.SubElement(self.element, 'cv', vertex_attributes)
+        for position in format_rows(self.control_vertices, '%.6f'):
+            xml_i3d.SubElement(self.element, 'cv', {'c': position})
 
     def populate_xml_element(self):
         if len(self.evaluated_curve_data.curve_data.splines) == 0:
@@ -709,7 +1492,7 @@ class NurbsCurve(Node):
             self._write_attribute('type', self.spline_type, 'node')
         if self.spline_form:
             self._write_attribute('form', self.spline_form, 'node')
-        self.logger.debug(f"Has '{len(self.control_vertex)}' control vertices")
+        self.logger.debug(f"Has '{len(self.control_vertices)}' control vertices")
         self.write_control_vertices()
 
 
@@ -732,10 +1515,85 @@ class ShapeNode(SceneGraphNode):
             self.shape_id = self.i3d.add_shape(EvaluatedMesh(self.i3d, self.blender_object))
             self.xml_elements['IndexedTriangleSet'] = self.i3d.shapes[self.shape_id].element
 
+    def write_material_ids(self) -> None:
+        self._write_attribute('materialIds', ' '.join(map(str, self.i3d.shapes[self.shape_id].material_ids)))
+
+    def _split_parts(self) -> List[IndexedTriangleSet | NurbsCurve]:
+        """All parts of the shape when it was split for having too many vertices, or all splines of a curve when those
+        are exported. Otherwise an empty list"""
+        shape = self.i3d.shapes[self.shape_id]
+        if not shape.parts:
+            return []
+        return [shape, *shape.parts]
+
+    def _populate_as_split_shape(self, parts: List[IndexedTriangleSet]) -> None:
+        """Turns the node into a transform group, with a shape node for each part of the split shape"""
+        self.element.tag = TransformGroupNode.ELEMENT_TAG
+        self.logger.debug(f"has a shape that is split into {len(parts)} parts, exporting it as a TransformGroup")
+        # The node properties of the object are written once to the group, the parts only get the shape properties
+        xml_i3d.write_i3d_properties(self.blender_object, self.blender_object.i3d_attributes, self.xml_elements)
+        self._write_user_attributes()
+        self._add_transform_to_xml_element(self._transform_for_conversion)
+        for index, part in enumerate(parts):
+            self.i3d.add_split_shape_part_node(self.blender_object, self, part, index)
+
     def populate_xml_element(self):
         self.add_shape()
+        if parts := self._split_parts():
+            self._populate_as_split_shape(parts)
+            return
         if self.blender_object.type == 'MESH':
-            self._write_attribute('materialIds', ' '.join(map(str, self.i3d.shapes[self.shape_id].material_ids)))
+            self.write_material_ids()
         self.logger.debug(f"has shape ID '{self.shape_id}'")
         self._write_attribute('shapeId', self.shape_id)
         super().populate_xml_element()
+
+
+class ShapePartNode(ShapeNode):
+    """A shape node holding part of what an object is exported as, placed under the node of the object. That node
+    holds the transform, user attributes, i3d mapping and animations of the object."""
+    def __init__(self, id_: int, shape_object: bpy.types.Object, i3d: I3D, parent: SceneGraphNode, name_suffix: str):
+        self.name_suffix = name_suffix
+        super().__init__(id_=id_, shape_object=shape_object, i3d=i3d, parent=parent)
+
+    @property
+    def name(self):
+        return f"{self._name}{self.name_suffix}"
+
+    @property
+    def _transform_for_conversion(self) -> Optional[mathutils.Matrix]:
+        # The parent is placed where the object is
+        return None
+
+    def add_animation_link(self):
+        pass
+
+    def add_i3d_mapping_to_xml(self):
+        pass
+
+    def _write_user_attributes(self):
+        pass
+
+
+class SplitShapePartNode(ShapePartNode):
+    """A shape node for one part of a shape that was split for having too many vertices, or one spline of a curve"""
+    def __init__(self, id_: int, shape_object: bpy.types.Object, i3d: I3D, parent: ShapeNode,
+                 shape: IndexedTriangleSet | NurbsCurve, index: int):
+        self.shape = shape
+        super().__init__(id_, shape_object, i3d, parent, f"_part{index}")
+
+    def add_shape(self):
+        self.shape_id = self.shape.id
+        self.xml_elements[self.shape.ELEMENT_TAG] = self.shape.element
+
+    def _write_properties(self):
+        # The node properties of the object are written to the group holding the parts
+        try:
+            data = self.blender_object.data
+            xml_i3d.write_i3d_properties(data, data.i3d_attributes, self.xml_elements)
+        except AttributeError:
+            self.logger.debug('Has no data specific attributes')
+
+    def _split_parts(self) -> List[IndexedTriangleSet | NurbsCurve]:
+        # The first part is the split shape itself, which still has the other parts
+        return []
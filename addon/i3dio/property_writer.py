@@ -0,0 +1,185 @@
+"""Writer plans for the i3d properties of property groups. The `i3d_map` of a property group class is compiled once
+into a flat list of property writers, so writing the properties of an object only reads and compares its values."""
+from __future__ import annotations
+import functools
+import logging
+import math
+from dataclasses import dataclass
+from typing import (Callable, Dict, Iterator, Optional, Tuple)
+
+logger = logging.getLogger(__name__)
+
+# Marks a property that should not be written, since its value can't be converted
+SKIP_PROPERTY = object()
+# Marks a tracked member that can have any value, as opposed to only being used when it has a specific value
+ANY_VALUE = object()
+
+
+@dataclass(frozen=True)
+class PropertyWriter:
+    """How a single property of a property group is written, compiled once per property group class by
+    `compile_writer_plan` from its `i3d_map`"""
+    key: str
+    i3d_name: Optional[str]
+    placement: str
+    default: object
+    # Turns the value into the value to write, or `SKIP_PROPERTY`
+    convert: Optional[Callable[[object], object]]
+    # Whether the dependencies of the property are met, for the object and property group
+    depends: Optional[Callable[[object, object], bool]]
+    # The boolean property that toggles whether the value is taken from a member of the object instead
+    tracking_key: Optional[str]
+    tracking_path: Optional[str]
+    tracking_value: object
+    tracking_mapping: Optional[Dict]
+
+
+def _convert_hex(key: str, value):
+    try:
+        value_decimal = int(value, 16)
+    except ValueError:
+        logger.error(f"Supplied value '{value}' for '{key}' is not a hex value!")
+        return SKIP_PROPERTY
+    if 0 <= value_decimal <= 2**32 - 1:  # Check that it is actually a 32-bit unsigned int
+        return value_decimal
+    logger.warning(f"Supplied value '{value}' for '{key}' is out of bounds."
+                   f" It should be within range [0, ffffffff] (32-bit unsigned)")
+    return SKIP_PROPERTY
+
+
+def _convert_angle(default: float, value):
+    value_to_write = math.degrees(value)
+    return SKIP_PROPERTY if math.isclose(value_to_write, default, abs_tol=0.0001) else value_to_write
+
+
+def _compile_converter(key: str, entry: Dict) -> Optional[Callable[[object], object]]:
+    # The type field is used for unique types, that then get converted fx. HEX values
+    field_type = entry.get('type')
+    if field_type == 'HEX':
+        return functools.partial(_convert_hex, key)
+    if field_type == 'OVERRIDE':
+        override = entry.get('override')
+        return lambda value: override
+    if field_type == 'ANGLE':
+        return functools.partial(_convert_angle, entry.get('default'))
+    return None
+
+
+def _compile_dependencies(i3d_map: Dict, dependants: list) -> Optional[Callable[[object, object], bool]]:
+    """A predicate telling if the values some property depends on are all what they have to be"""
+    if not dependants:
+        return None
+    checks = []
+    for dependant in dependants:
+        name = dependant['name']
+        # The dependant value might be tracking a member of the object, which is then used if tracking is enabled
+        tracking = i3d_map[name].get('tracking', False)
+        if tracking:
+            checks.append((name, name + '_tracking', tracking['member_path'], tracking.get('mapping') or None,
+                           dependant['value']))
+        else:
+            checks.append((name, None, None, None, dependant['value']))
+
+    def depends(obj, property_group) -> bool:
+        for name, tracking_key, member_path, mapping, required_value in checks:
+            member_value = getattr(property_group, name)
+            if tracking_key is not None and getattr(property_group, tracking_key):
+                member_value = getattr(obj, member_path)
+                if mapping is not None:
+                    member_value = mapping[member_value]
+            if member_value != required_value:
+                return False
+        return True
+    return depends
+
+
+def compile_writer_plan(property_group_class: type) -> Tuple[PropertyWriter, ...]:
+    """Turns the i3d_map of a property group class into the writers of its properties, in the order of the class"""
+    i3d_map = property_group_class.i3d_map
+    # Since blender properties are basically abusing the annotation system, we can also abuse this to create
+    # a generic property export function by accessing the annotation dictionary
+    annotations = property_group_class.__annotations__
+    plan = []
+    for key in annotations:
+        # If the attribute isn't in the i3d_map, then it isn't supposed to be exported as an attribute
+        if key not in i3d_map:
+            continue
+        entry = i3d_map[key]
+        tracking = entry.get('tracking')
+        tracking_key = key + '_tracking' if tracking and key + '_tracking' in annotations else None
+        default = entry.get('default')
+        plan.append(PropertyWriter(
+            key=key,
+            i3d_name=entry.get('name'),
+            placement=entry.get('placement', 'Node'),
+            # Sequences are compared elementwise with the value, which is read as a tuple
+            default=tuple(default) if isinstance(default, (list, tuple)) else default,
+            convert=_compile_converter(key, entry),
+            depends=_compile_dependencies(i3d_map, entry.get('depends', [])),
+            tracking_key=tracking_key,
+            tracking_path=tracking['member_path'] if tracking_key else None,
+            tracking_value=tracking.get('value', ANY_VALUE) if tracking_key else ANY_VALUE,
+            tracking_mapping=tracking.get('mapping') if tracking_key else None,
+        ))
+    return tuple(plan)
+
+
+_writer_plans: Dict[type, Tuple[PropertyWriter, ...]] = {}
+
+
+def writer_plan(property_group_class: type) -> Tuple[PropertyWriter, ...]:
+    """The writers of a property group class, which are compiled on first use"""
+    plan = _writer_plans.get(property_group_class)
+    if plan is None:
+        plan = _writer_plans[property_group_class] = compile_writer_plan(property_group_class)
+    return plan
+
+
+def non_default_properties(obj, property_group, sequence_types: Tuple[type, ...] = (tuple, list)) \
+        -> Iterator[Tuple[str, str, object]]:
+    """Yields the placement, i3d name and value to write of every property of the property group that isn't at its
+    default value, in the order of the class
+
+    Args:
+        obj: The blender object or data the property group belongs to, which tracked members are read from
+        property_group: The property group to write
+        sequence_types: The types of values that are compared elementwise with their default
+    """
+    for writer in writer_plan(type(property_group)):
+        # If this attribute does not live up to its dependencies, then skip it
+        if writer.depends is not None and not writer.depends(obj, property_group):
+            continue
+
+        value = getattr(property_group, writer.key)
+        if writer.tracking_key is not None and getattr(property_group, writer.tracking_key):
+            member_value = getattr(obj, writer.tracking_path)
+            if writer.tracking_value is not ANY_VALUE and member_value != writer.tracking_value:
+                continue
+            value = member_value if writer.tracking_mapping is None else writer.tracking_mapping[member_value]
+
+        value_to_write = value
+        i3d_name = writer.i3d_name
+        default = writer.default
+        # Special case of checking floats, since these can be not equal due to floating point errors
+        if isinstance(value, float):
+            if math.isclose(value, default, abs_tol=0.0000001):
+                continue
+        elif isinstance(value, sequence_types):
+            value = tuple(value)
+            if len(value) == len(default) and all(math.isclose(a, b, abs_tol=0.0000001)
+                                                  for a, b in zip(value, default)):
+                continue
+        # In the case that the value is default, then just ignore it
+        elif value == default:
+            continue
+        # In some cases of enums the i3d_name is actually the enum value itself. It is signaled by not having a name
+        elif i3d_name is None:
+            i3d_name = value
+            value_to_write = 1
+
+        if writer.convert is not None:
+            value_to_write = writer.convert(value)
+            if value_to_write is SKIP_PROPERTY:
+                continue
+
+        yield writer.placement, i3d_name, value_to_write
@@ -0,0 +1,66 @@
+"""Scratch buffers for the working arrays of very large meshes. Arrays above a size threshold are backed by memory
+mapped files in a temporary directory instead of RAM, so the operating system can page them out while a mesh with
+millions of corners is extracted and welded."""
+from __future__ import annotations
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_DIRECTORY_PREFIX = 'i3d_scratch_'
+
+
+class ScratchSpace:
+    def __init__(self, threshold: int, directory: str | os.PathLike | None = None):
+        """
+        Args:
+            threshold: Arrays of at least this many bytes are memory mapped, smaller ones are kept in memory
+            directory: The directory to create the temporary directory in, the system default if None
+        """
+        self.threshold = threshold
+        self.parent_directory = directory
+        # Only created once the first array crosses the threshold
+        self.directory: Optional[Path] = None
+        self.mapped_arrays = 0
+        self.mapped_bytes = 0
+
+    def empty(self, shape, dtype) -> np.ndarray:
+        """Returns an uninitialized array like `numpy.empty`, which is memory mapped if it is large enough"""
+        dtype = np.dtype(dtype)
+        shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        num_bytes = int(np.prod(shape)) * dtype.itemsize
+        if num_bytes == 0 or num_bytes < self.threshold:
+            return np.empty(shape, dtype=dtype)
+        try:
+            if self.directory is None:
+                self.directory = Path(tempfile.mkdtemp(prefix=SCRATCH_DIRECTORY_PREFIX, dir=self.parent_directory))
+            file_descriptor, path = tempfile.mkstemp(suffix='.bin', dir=self.directory)
+            os.close(file_descriptor)
+            array = np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+        except OSError as error:
+            logger.warning(f"Can't create a scratch file for {num_bytes} bytes, keeping the array in memory: {error}")
+            return np.empty(shape, dtype=dtype)
+        try:
+            # The mapping keeps the data alive, so the file can be removed right away where the system allows it
+            os.unlink(path)
+        except OSError:
+            pass
+        self.mapped_arrays += 1
+        self.mapped_bytes += num_bytes
+        # A plain view of the mapping, so results of operations on it aren't mistaken for memory mapped arrays
+        return array.view(np.ndarray)
+
+    def close(self) -> None:
+        """Removes the scratch files, the arrays mapped to them must not be used anymore"""
+        if self.directory is None:
+            return
+        logger.info(f"Used {self.mapped_arrays} memory mapped scratch arrays, "
+                    f"{self.mapped_bytes / (1024 * 1024):.1f} MB in total")
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
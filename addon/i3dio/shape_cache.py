@@ -0,0 +1,154 @@
+"""Persistent cache of the geometry written for shapes, so unchanged meshes don't have to be welded again on every
+export. Entries are stored in a directory next to the .blend file and named by a hash of everything
+the written geometry depends on, so an entry never has to be invalidated, only evicted when the cache grows too big."""
+from __future__ import annotations
+import hashlib
+import io
+import json
+import logging
+import os
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the geometry written for a shape changes, so entries from older versions are never reused
+CACHE_VERSION = 2
+CACHE_DIRECTORY_NAME = '.i3d_shape_cache'
+ENTRY_SUFFIX = '.npz'
+# The member of an entry holding its payload as json, next to its arrays
+PAYLOAD_MEMBER = 'payload'
+# The export settings that the geometry written for any shape depends on, besides the mesh itself
+GEOMETRY_SETTINGS = ('apply_unit_scale', 'alphabetic_uvs', 'optimize_vertex_cache', 'precision_profile',
+                     'strip_vertex_attributes', 'remove_redundant_attributes', 'compute_bounding_spheres')
+
+
+class ShapeKey:
+    """Incrementally hashes everything that the written geometry of a shape depends on"""
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=20)
+        self.update(CACHE_VERSION)
+
+    def update(self, *values) -> ShapeKey:
+        for value in values:
+            if isinstance(value, np.ndarray):
+                # Include the layout, so arrays holding the same bytes in a different shape don't collide
+                self._hash.update(f"{value.dtype.str}{value.shape}".encode())
+                self._hash.update(np.ascontiguousarray(value).data)
+            else:
+                self._hash.update(repr(value).encode())
+            self._hash.update(b'\x00')
+        return self
+
+    def update_settings(self, settings: dict, can_be_split: bool) -> ShapeKey:
+        """Hashes the export settings in `GEOMETRY_SETTINGS`, and the maximum number of vertices per shape for
+        shapes that are split when they have more"""
+        self.update(*(settings[name] for name in GEOMETRY_SETTINGS))
+        self.update(settings['max_shape_vertices'] if can_be_split and settings['split_large_shapes'] else None)
+        return self
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class ShapeCache:
+    def __init__(self, directory: str | os.PathLike, max_size: int):
+        """
+        Args:
+            directory: The directory the entries are stored in, it is created if it doesn't exist
+            max_size: The size in bytes the cache is trimmed to, by evicting the least recently used entries
+        """
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        except OSError as error:
+            logger.warning(f"Can't create shape cache directory '{self.directory}', the cache is disabled: {error}")
+            self.directory = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f"{key}{ENTRY_SUFFIX}"
+
+    def get(self, key: str) -> Optional[tuple[dict, dict[str, np.ndarray]]]:
+        """Returns the payload and arrays stored for the key, or None if there isn't a usable entry"""
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        try:
+            with np.load(io.BytesIO(path.read_bytes()), allow_pickle=False) as entry:
+                arrays = dict(entry)
+            payload = json.loads(arrays.pop(PAYLOAD_MEMBER).tobytes())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, zlib.error, zipfile.BadZipFile, ValueError, KeyError) as error:
+            logger.warning(f"Discarding unreadable shape cache entry '{path.name}': {error}")
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        # The modification time is the last use of the entry, which is what eviction goes by
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return payload, arrays
+
+    def put(self, key: str, payload: dict, arrays: dict[str, np.ndarray] = None) -> None:
+        """Stores plain values that can be written as json, along with arrays"""
+        if not self.enabled:
+            return
+        buffer = io.BytesIO()
+        payload = np.frombuffer(json.dumps(payload, separators=(',', ':')).encode('utf-8'), dtype=np.uint8)
+        np.savez_compressed(buffer, **(arrays or {}), **{PAYLOAD_MEMBER: payload})
+        path = self._entry_path(key)
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            temporary_path.write_bytes(buffer.getvalue())
+            # Replacing is atomic, so an interrupted export never leaves a half written entry behind
+            os.replace(temporary_path, path)
+        except OSError as error:
+            logger.warning(f"Failed to write shape cache entry '{path.name}': {error}")
+            temporary_path.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits within its maximum size"""
+        if not self.enabled:
+            return
+        entries = []
+        for path in self.directory.glob(f"*{ENTRY_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total_size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total_size -= size
+            self.evicted += 1
+
+    def close(self) -> None:
+        """Trims the cache and logs how much it was used during the export"""
+        if not self.enabled:
+            return
+        self.evict()
+        logger.info(f"Shape cache: {self.hits} hits, {self.misses} misses, {self.evicted} entries evicted")
@@ -0,0 +1,50 @@
+"""Selection of the bone influences that are exported for each vertex of a skinned mesh"""
+from __future__ import annotations
+
+import numpy as np
+
+# Giants Engine supports up to four bones per vertex
+MAX_BLEND_WEIGHTS = 4
+# Weights below the decimal precision of the i3d format are ignored
+MIN_BLEND_WEIGHT = 0.000001
+
+
+def select_skin_weights(groups: np.ndarray, weights: np.ndarray, bone_groups: np.ndarray,
+                        normalize: bool = False) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Selects the (up to) four strongest bone influences of every vertex.
+
+    Args:
+        groups: Vertex group index of each assignment, as returned by `shape.read_vertex_groups`
+        weights: Weight of each assignment
+        bone_groups: Mask over the vertex groups of the object, True for groups that belong to a bone
+        normalize: Rescale the selected weights of each vertex to sum to one
+
+    Returns:
+        Vertex group indices with shape (vertices, 4) padded with -1, the matching weights padded with 0 and the number
+        of bone influences each vertex had before selection.
+    """
+    valid = (groups >= 0) & (groups < len(bone_groups))
+    valid[valid] = bone_groups[groups[valid]]
+    valid &= np.abs(weights) > MIN_BLEND_WEIGHT
+    num_influences = np.count_nonzero(valid, axis=1)
+
+    rows = np.arange(len(groups))[:, np.newaxis]
+    if groups.shape[1] > MAX_BLEND_WEIGHTS:
+        columns = np.argpartition(np.where(valid, -weights, np.inf), MAX_BLEND_WEIGHTS - 1, axis=1)
+        columns = np.sort(columns[:, :MAX_BLEND_WEIGHTS], axis=1)  # Keep the vertex group order of the selection
+    else:
+        columns = np.broadcast_to(np.arange(groups.shape[1]), groups.shape)
+    selected = valid[rows, columns]
+    # Move the selected influences in front of the unused slots, without changing their order
+    order = np.argsort(~selected, axis=1, kind='stable')
+    columns = np.take_along_axis(columns, order, axis=1)
+    selected = np.take_along_axis(selected, order, axis=1)
+
+    blend_groups = np.full((len(groups), MAX_BLEND_WEIGHTS), -1, dtype=np.int32)
+    blend_weights = np.zeros((len(groups), MAX_BLEND_WEIGHTS), dtype=np.float32)
+    blend_groups[:, :columns.shape[1]] = np.where(selected, groups[rows, columns], -1)
+    blend_weights[:, :columns.shape[1]] = np.where(selected, weights[rows, columns], 0.0)
+    if normalize:
+        totals = blend_weights.sum(axis=1, keepdims=True)
+        np.divide(blend_weights, totals, out=blend_weights, where=totals > 0)
+    return blend_groups, blend_weights, num_influences
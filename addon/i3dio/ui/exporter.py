@@ -4,6 +4,8 @@ from bpy.props import (
     StringProperty,
     BoolProperty,
     IntProperty,
+    FloatProperty,
+    FloatVectorProperty,
     EnumProperty,
     PointerProperty,
     CollectionProperty
@@ -155,6 +157,154 @@ class I3D_IO_OT_export(Operator, ExportHelper):
         default=False
     )
 
+    normalize_skin_weights: BoolProperty(
+        name="Normalize Skin Weights",
+        description="Rescale the weights of each skinned vertex to sum to one, "
+                    "after only the 4 strongest bones have been kept",
+        default=False
+    )
+
+    attribute_channels: StringProperty(
+        name="Attribute Channels",
+        description="Mesh attributes to export as extra vertex data, for shaders that need baked data. "
+                    "Comma separated 'attribute:channel' pairs, with uv0 to uv3 or generic as channel. "
+                    "Attributes with three or four components fill the next uv layer as well, "
+                    "fx. 'wind:uv2, phase:generic'",
+        default=''
+    )
+
+    precision_profile: EnumProperty(
+        name="Precision",
+        description="The precision that vertices are welded on and written with",
+        items=[
+            ('EXACT', "Exact", "Only weld vertices that are written identically, with six decimals"),
+            ('ENGINE', "Engine", "Weld vertices that are the same to four decimals, which is plenty for the engine"),
+            ('COMPACT', "Compact", "Weld and write positions to millimeters and other attributes to three or four "
+                                   "decimals, for smaller files with fewer vertices")
+        ],
+        default='ENGINE'
+    )
+
+    cull_triangles: BoolProperty(
+        name="Remove Degenerate Triangles",
+        description="Leave out triangles without any area, and triangles that are an exact copy of another one "
+                    "with the same vertices, winding and material",
+        default=False
+    )
+
+    strict_triangle_culling: BoolProperty(
+        name="Strict",
+        description="Fail the export when a mesh has degenerate or duplicate triangles, instead of leaving them out",
+        default=False
+    )
+
+    optimize_vertex_cache: BoolProperty(
+        name="Optimize Vertex Order",
+        description="Reorder the triangles and vertices of each mesh for faster rendering by the GPU. "
+                    "Takes about 10 seconds per 400,000 triangles, meshes with more than 500,000 triangles "
+                    "are left as they are",
+        default=False
+    )
+
+    strip_vertex_attributes: BoolProperty(
+        name="Strip Unused Vertex Attributes",
+        description="Leave out the uv layers and vertex colors of a mesh that none of the shaders of its materials "
+                    "use. Only done for meshes where every material has a shader that lists its vertex attributes",
+        default=False
+    )
+
+    remove_redundant_attributes: BoolProperty(
+        name="Remove Redundant Vertex Attributes",
+        description="Leave out vertex colors that are white everywhere, and trailing uv layers beyond the first that "
+                    "are constant or a copy of another layer",
+        default=False
+    )
+
+    deduplicate_shapes: BoolProperty(
+        name="Deduplicate Shapes",
+        description="Export meshes with identical geometry, materials and shape settings as one shape, "
+                    "even when they use different mesh datablocks",
+        default=False
+    )
+
+    use_shape_cache: BoolProperty(
+        name="Shape Cache",
+        description="Store the exported geometry of meshes in a cache folder next to the .blend file, "
+                    "so meshes that haven't changed since an earlier export are exported faster",
+        default=False
+    )
+
+    shape_cache_size: IntProperty(
+        name="Cache Size (MB)",
+        description="The shape cache is trimmed to this size after each export, "
+                    "by removing the geometry that was used least recently",
+        default=512,
+        min=1
+    )
+
+    use_scratch_files: BoolProperty(
+        name="Scratch Files",
+        description="Keep the working arrays of very large meshes in temporary files instead of memory, "
+                    "so meshes with millions of vertices can be exported with less memory. Slower",
+        default=False
+    )
+
+    scratch_threshold: IntProperty(
+        name="Threshold (MB)",
+        description="Working arrays of at least this size are kept in temporary files",
+        default=256,
+        min=1
+    )
+
+    compute_bounding_spheres: BoolProperty(
+        name="Compute Bounding Spheres",
+        description="Write a tight bounding sphere computed from the vertices for shapes without a bounding volume "
+                    "object, when it is noticeably smaller than the sphere around the bounding box that the engine "
+                    "uses otherwise. Gives better culling. Merge groups and skinned meshes are left to the engine",
+        default=False
+    )
+
+    split_large_shapes: BoolProperty(
+        name="Split Large Shapes",
+        description="Split meshes with more vertices than the limit into several shapes under a TransformGroup, "
+                    "so each of them can use 16-bit indices. Merge groups and skinned meshes are never split",
+        default=False
+    )
+
+    max_shape_vertices: IntProperty(
+        name="Vertex Limit",
+        description="The maximum number of vertices of each part of a split mesh",
+        default=65535,
+        min=256,
+        max=65535
+    )
+
+    lod_ratios: FloatVectorProperty(
+        name="LOD Ratios",
+        description="The share of the triangles of a mesh that is kept for each generated level of detail",
+        size=3,
+        default=(0.5, 0.25, 0.125),
+        min=0.01,
+        max=1.0,
+        subtype='FACTOR'
+    )
+
+    export_all_splines: BoolProperty(
+        name="Export All Splines",
+        description="Export every spline of a curve object as its own curve, under a TransformGroup for the object. "
+                    "Otherwise only the first spline is exported",
+        default=False
+    )
+
+    curve_tolerance: FloatProperty(
+        name="Curve Tolerance",
+        description="Leave out control vertices of poly curves as long as the curve through the remaining ones "
+                    "stays within this distance of the left out ones. 0 keeps every control vertex",
+        default=0.0,
+        min=0.0,
+        subtype='DISTANCE'
+    )
+
     object_types_to_export: EnumProperty(
         name="Object Types",
         description="Select which objects should be included in the exported",
@@ -181,6 +331,8 @@ class I3D_IO_OT_export(Operator, ExportHelper):
             ('MERGE_CHILDREN', "Merge Children", "Merge the child objects of empties with Merge Children enabled "
                                                  "into a single exported mesh"),
             ('ANIMATIONS', "Animations", "Export animations"),
+            ('AUTO_LODS', "Generated LODs", "Export meshes with Generate LODs enabled as LOD groups, "
+                                            "with levels of detail generated by reducing their triangles"),
         ),
         options={'ENUM_FLAG'},
         default={'MERGE_GROUPS', 'SKINNED_MESHES', 'MERGE_CHILDREN'},
@@ -223,6 +375,12 @@ class I3D_IO_OT_export(Operator, ExportHelper):
         default=True
     )
 
+    memory_report: BoolProperty(
+        name="Memory Report",
+        description="Measure the peak memory use of the export and log it per phase. Slows down the export",
+        default=False
+    )
+
     object_sorting_prefix: StringProperty(
         name="Sorting Prefix",
         description="To allow some form of control over the output ordering of the objects in the I3D file it is "
@@ -255,6 +413,25 @@ class I3D_IO_OT_export(Operator, ExportHelper):
             "apply_modifiers",
             "apply_unit_scale",
             "alphabetic_uvs",
+            "normalize_skin_weights",
+            "attribute_channels",
+            "precision_profile",
+            "cull_triangles",
+            "strict_triangle_culling",
+            "optimize_vertex_cache",
+            "strip_vertex_attributes",
+            "remove_redundant_attributes",
+            "deduplicate_shapes",
+            "use_shape_cache",
+            "shape_cache_size",
+            "use_scratch_files",
+            "scratch_threshold",
+            "compute_bounding_spheres",
+            "split_large_shapes",
+            "max_shape_vertices",
+            "lod_ratios",
+            "export_all_splines",
+            "curve_tolerance",
             "object_types_to_export",
             "features_to_export",
             "copy_files",
@@ -262,6 +439,7 @@ class I3D_IO_OT_export(Operator, ExportHelper):
             "file_structure",
             "verbose_output",
             "log_to_file",
+            "memory_report",
             "object_sorting_prefix",
         ]
         export_props = {}
@@ -270,6 +448,8 @@ class I3D_IO_OT_export(Operator, ExportHelper):
                 value = getattr(self, prop)
                 if isinstance(value, set):
                     export_props[prop] = list(value)
+                elif isinstance(value, bpy.types.bpy_prop_array):
+                    export_props[prop] = value[:]
                 else:
                     export_props[prop] = value
         context.scene[self.scene_key] = export_props
@@ -355,6 +535,33 @@ def export_options(layout: bpy.types.UILayout, operator):
         col.prop(operator, 'apply_modifiers')
         col.prop(operator, 'apply_unit_scale')
         col.prop(operator, 'alphabetic_uvs')
+        col.prop(operator, 'normalize_skin_weights')
+        col.prop(operator, 'attribute_channels')
+        col.prop(operator, 'precision_profile')
+        col.prop(operator, 'cull_triangles')
+        row = col.row()
+        row.enabled = operator.cull_triangles
+        row.prop(operator, 'strict_triangle_culling')
+        col.prop(operator, 'optimize_vertex_cache')
+        col.prop(operator, 'strip_vertex_attributes')
+        col.prop(operator, 'remove_redundant_attributes')
+        col.prop(operator, 'deduplicate_shapes')
+        col.prop(operator, 'use_shape_cache')
+        row = col.row()
+        row.enabled = operator.use_shape_cache
+        row.prop(operator, 'shape_cache_size')
+        col.prop(operator, 'use_scratch_files')
+        row = col.row()
+        row.enabled = operator.use_scratch_files
+        row.prop(operator, 'scratch_threshold')
+        col.prop(operator, 'compute_bounding_spheres')
+        col.prop(operator, 'split_large_shapes')
+        row = col.row()
+        row.enabled = operator.split_large_shapes
+        row.prop(operator, 'max_shape_vertices')
+        col.prop(operator, 'lod_ratios')
+        col.prop(operator, 'export_all_splines')
+        col.prop(operator, 'curve_tolerance')
         body.separator(type='LINE')
         body.prop(operator, 'object_types_to_export', expand=True)
         body.separator(type='LINE')
@@ -381,6 +588,7 @@ def export_debug(layout, operator):
     if body:
         body.prop(operator, 'verbose_output')
         body.prop(operator, 'log_to_file')
+        body.prop(operator, 'memory_report')
 
 
 def export_i3d_mapping(layout, operator):
@@ -491,6 +491,25 @@ class I3DMergeChildren(bpy.types.PropertyGroup):
     )
 
 
+@register
+class I3DAutoLOD(bpy.types.PropertyGroup):
+    enabled: BoolProperty(
+        name="Generate LODs",
+        description=(
+            "Export this mesh as a LOD group, with levels of detail that are generated by reducing its triangles. "
+            "The amount of triangles of each level is set in the export settings"
+        ),
+        default=False
+    )
+    levels: IntProperty(
+        name="Levels",
+        description="The number of generated levels, besides the full detail mesh",
+        default=2,
+        min=1,
+        max=3
+    )
+
+
 @register
 class I3DMappingData(bpy.types.PropertyGroup):
     is_mapped: BoolProperty(
@@ -630,6 +649,7 @@ class I3D_IO_PT_object_attributes(Panel):
             draw_rigid_body_attributes(layout, i3d_attributes)
             draw_merge_children_attributes(layout, obj.i3d_merge_children)
             draw_merge_group_attributes(layout, context)
+            draw_auto_lod_attributes(layout, obj.i3d_auto_lod, i3d_attributes)
 
         draw_visibility_condition_attributes(layout, i3d_attributes)
 
@@ -799,6 +819,23 @@ def draw_merge_children_attributes(layout: bpy.types.UILayout, i3d_merge_childre
         panel.prop(i3d_merge_children, 'interpolation_steps')
 
 
+def draw_auto_lod_attributes(layout: bpy.types.UILayout, i3d_auto_lod: bpy.types.PropertyGroup,
+                             i3d_attributes: bpy.types.PropertyGroup) -> None:
+    header, panel = layout.panel('i3d_auto_lod_panel', default_closed=True)
+    header.use_property_split = False
+    header.prop(i3d_auto_lod, 'enabled', text="")
+    header.label(text="Generated LODs")
+    if panel:
+        panel.enabled = i3d_auto_lod.enabled
+        panel.prop(i3d_auto_lod, 'levels')
+        for i in range(4):
+            row = panel.row()
+            row.enabled = 0 < i <= i3d_auto_lod.levels
+            # The same distances as for LOD groups that are built by hand
+            row.prop(i3d_attributes, 'lod_distances', index=i, text=f"Level {i}")
+        panel.prop(i3d_attributes, 'lod_blending')
+
+
 def draw_i3d_mapping_box(layout: bpy.types.UILayout, i3d_mapping: bpy.types.PropertyGroup) -> None:
     box = layout.box()
     box.use_property_split = False
@@ -1062,6 +1099,7 @@ def register():
     bpy.types.Object.i3d_reference = PointerProperty(type=I3DReferenceData)
     bpy.types.Scene.i3dio_merge_groups = CollectionProperty(type=I3DMergeGroup)
     bpy.types.Object.i3d_merge_children = PointerProperty(type=I3DMergeChildren)
+    bpy.types.Object.i3d_auto_lod = PointerProperty(type=I3DAutoLOD)
     load_post.append(handle_old_merge_groups)
     load_post.append(handle_old_lod_distances)
     load_post.append(handle_old_reference_paths)
@@ -1071,6 +1109,7 @@ def unregister():
     load_post.remove(handle_old_reference_paths)
     load_post.remove(handle_old_lod_distances)
     load_post.remove(handle_old_merge_groups)
+    del bpy.types.Object.i3d_auto_lod
     del bpy.types.Object.i3d_merge_children
     del bpy.types.Scene.i3dio_merge_groups
     del bpy.types.Object.i3d_reference
@@ -0,0 +1,34 @@
+"""Collection of the user attributes of the exported nodes, which are written to the <UserAttributes> element of the
+i3d file in one go once every node has been added"""
+from __future__ import annotations
+import xml.etree.ElementTree as ET
+from typing import (Callable, Dict, Iterable, List, Tuple, Union)
+
+UserAttributeValue = Union[str, int, float, bool, tuple]
+# The name, i3d type and value of a user attribute
+UserAttribute = Tuple[str, str, UserAttributeValue]
+
+
+class UserAttributes:
+    def __init__(self):
+        self._by_node: Dict[int, List[UserAttribute]] = {}
+
+    def add(self, node_id: int, attributes: Iterable[UserAttribute]) -> None:
+        """Adds attributes to a node, after the ones it already has"""
+        self._by_node.setdefault(node_id, []).extend(attributes)
+
+    def write(self, element: ET.Element, write_value: Callable[[ET.Element, str, UserAttributeValue], None]) -> None:
+        """Writes a <UserAttribute> for every node into the element, in the order of the node ids, and forgets them
+
+        Args:
+            element: The <UserAttributes> element
+            write_value: Writes the value of an attribute into its element with the formatting of its type, like
+                `xml_i3d.write_attribute`
+        """
+        for node_id in sorted(self._by_node):
+            node_attribute_element = ET.SubElement(element, 'UserAttribute', attrib={'nodeId': str(node_id)})
+            for name, type_, value in self._by_node[node_id]:
+                attribute_element = ET.SubElement(node_attribute_element, 'Attribute',
+                                                  attrib={'name': name, 'type': type_})
+                write_value(attribute_element, 'value', value)
+        self._by_node.clear()
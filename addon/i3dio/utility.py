@@ -8,7 +8,8 @@ import math
 import mathutils
 import bpy
 from pathlib import Path
-import re
+
+from .hierarchy import natural_sort_key
 
 logger = logging.getLogger(__name__)
 
@@ -96,7 +97,7 @@ with the use of a regex as detailed in this answer on stackoverflow https://stac
 
 
 def sort_blender_objects_by_outliner_ordering(objects: List[BlenderObject]) -> List[BlenderObject]:
-    return sorted(objects, key=lambda s: [int(t) if t.isdigit() else t.lower() for t in re.split('(\d+)', s.name)])
+    return sorted(objects, key=lambda s: natural_sort_key(s.name))
 
 
 def get_fs_data_path(as_path: bool = False) -> str | Path:
@@ -0,0 +1,174 @@
+"""Welding of mesh corners into unique vertices. Corners are compared on packed byte keys of their attributes, rounded
+to the decimal grids of a precision profile, so a shape is welded with a few sorts instead of hashing every corner in
+Python."""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import (Callable, List, Optional)
+
+import numpy as np
+
+# Positions, normals, uvs and colors are welded on the grid of the old string based vertex key, which printed
+# the vectors with four decimals.
+WELD_DECIMALS = 4
+# Corners are welded in chunks of this many once they are in scratch buffers
+WELD_CHUNK_ROWS = 1 << 20
+# The number of decimals that vertex attributes are written with, unless a precision profile snaps them
+WRITTEN_DECIMALS = 6
+
+
+@dataclass(frozen=True)
+class PrecisionProfile:
+    """The decimal grids that vertex attributes are welded on. With `snap`, the written values are snapped to those
+    grids as well and written with just as many decimals, so the output only depends on which vertices were welded."""
+    position_decimals: int
+    normal_decimals: int
+    uv_decimals: int
+    color_decimals: int
+    weight_decimals: int
+    snap: bool = False
+
+
+PRECISION_PROFILES = {
+    # Welds the vertices that are written identically, and nothing more
+    'EXACT': PrecisionProfile(WRITTEN_DECIMALS, WRITTEN_DECIMALS, WRITTEN_DECIMALS, WRITTEN_DECIMALS, WRITTEN_DECIMALS,
+                              snap=True),
+    'ENGINE': PrecisionProfile(WELD_DECIMALS, WELD_DECIMALS, WELD_DECIMALS, WELD_DECIMALS, WRITTEN_DECIMALS),
+    # Millimeters, about a texel of a 4k texture and slightly finer than 8-bit colors
+    'COMPACT': PrecisionProfile(3, 3, 4, 3, 3, snap=True),
+}
+
+
+def quantize(values: np.ndarray, decimals: int = WELD_DECIMALS, dtype=np.float32) -> np.ndarray:
+    """Rounds values to a decimal grid for use in a weld key. Rounding is done in double precision, the result can
+    be stored as float32 for values of limited range such as normals, uvs and colors."""
+    return np.round(values.astype(np.float64), decimals).astype(dtype, copy=False)
+
+
+def pack_rows(columns: List[np.ndarray]) -> np.ndarray:
+    """Packs the rows of several arrays with equal length into one compact byte key per row.
+
+    The columns can have different dtypes, each is kept at its own size in the key."""
+    num_rows = len(columns[0])
+    packed = np.concatenate([np.ascontiguousarray(column).reshape(num_rows, -1).view(np.uint8)
+                             for column in columns], axis=1)
+    return np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+
+
+def weld_keys(precision: PrecisionProfile, subsets: np.ndarray, positions: np.ndarray, normals: np.ndarray,
+              uvs: List[np.ndarray], colors: Optional[np.ndarray] = None, generic: Optional[np.ndarray] = None,
+              blend_ids: Optional[np.ndarray] = None, blend_weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Packs the key that mesh corners are welded on, which holds everything that ends up in their vertex.
+
+    The old string based key held the subset index, position, normal, vertex color, generic value and uvs. Blend ids
+    and weights weren't part of it, so corners at the same place with a different merge group child or different
+    skin weights were welded, and the vertex got the ids and weights of whichever corner came first. They are part
+    of the key now, which only gives more vertices where the old ones were written wrong.
+
+    Args:
+        precision: The decimal grids that the attributes are rounded to
+        subsets: The subset index of each corner, vertices can't be shared between subsets
+        positions: Positions, rounded in double precision since they aren't limited to a small range
+        normals: Normals of the corners
+        uvs: Each uv layer that is written
+        colors: Vertex colors, if they are written
+        generic: Generic values, which are welded on their exact value
+        blend_ids: Bone ids for skinning or the merge group child index, which are welded on their exact value
+        blend_weights: Skin weights
+    """
+    key_columns = [subsets, quantize(positions, precision.position_decimals, dtype=np.float64),
+                   quantize(normals, precision.normal_decimals)]
+    key_columns += [quantize(uv, precision.uv_decimals) for uv in uvs]
+    if colors is not None:
+        key_columns.append(quantize(colors, precision.color_decimals))
+    key_columns += [column for column in (generic, blend_ids) if column is not None]
+    if blend_weights is not None:
+        key_columns.append(quantize(blend_weights, precision.weight_decimals))
+    return pack_rows(key_columns)
+
+
+def weld(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Deduplicates keys while keeping the order in which they are first seen.
+
+    Returns:
+        The index of the first occurrence of each unique key, in order of appearance, and the unique index of every
+        key (which is the vertex index when the keys are mesh corners).
+    """
+    _, first_occurrence, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first_occurrence, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first_occurrence[order], rank[inverse.ravel()]
+
+
+def _hash_rows(keys: np.ndarray) -> np.ndarray:
+    """A 64-bit hash of each key packed by `pack_rows`"""
+    data = np.ascontiguousarray(keys).view(np.uint8).reshape(len(keys), -1)
+    if padding := -data.shape[1] % 8:
+        data = np.pad(data, ((0, 0), (0, padding)))
+    words = data.view(np.uint64)
+    # FNV-1a over whole words, followed by the MurmurHash3 finalizer to mix the high bits into the low ones
+    hashes = np.full(len(keys), 0xcbf29ce484222325, dtype=np.uint64)
+    for column in words.T:
+        hashes ^= column
+        hashes *= np.uint64(0x100000001b3)
+    hashes ^= hashes >> np.uint64(33)
+    hashes *= np.uint64(0xff51afd7ed558ccd)
+    hashes ^= hashes >> np.uint64(33)
+    return hashes
+
+
+def weld_chunked(keys: np.ndarray, chunk_rows: int, empty: Callable = np.empty) -> tuple[np.ndarray, np.ndarray]:
+    """Same as `weld`, but only sorts about `chunk_rows` keys at a time, for keys that don't fit in memory at once.
+
+    The keys are distributed over buckets by their hash. Equal keys always end up in the same bucket, so each bucket
+    can be deduplicated on its own.
+
+    Args:
+        keys: Packed keys as returned by `pack_rows`, which can be memory mapped
+        chunk_rows: The number of keys to read at a time
+        empty: Allocates the per key working arrays and the returned vertex indices, like `numpy.empty`
+    """
+    num_rows = len(keys)
+    num_buckets = max(1, -(-num_rows // chunk_rows))
+    buckets = empty(num_rows, dtype=np.int32)
+    bucket_sizes = np.zeros(num_buckets, dtype=np.int64)
+    for start in range(0, num_rows, chunk_rows):
+        chunk_buckets = (_hash_rows(keys[start:start + chunk_rows]) % np.uint64(num_buckets)).astype(np.int32)
+        buckets[start:start + chunk_rows] = chunk_buckets
+        bucket_sizes += np.bincount(chunk_buckets, minlength=num_buckets)
+    bucket_bounds = np.concatenate([[0], np.cumsum(bucket_sizes)])
+
+    # Rows of each bucket in ascending order, so the keys of a bucket are read front to back. Sorted by counting a
+    # chunk at a time, instead of sorting all buckets at once in memory.
+    bucket_rows = empty(num_rows, dtype=np.int64)
+    bucket_ends = bucket_bounds[:-1].copy()
+    for start in range(0, num_rows, chunk_rows):
+        chunk_buckets = buckets[start:start + chunk_rows]
+        order = np.argsort(chunk_buckets, kind='stable')
+        sorted_buckets = chunk_buckets[order]
+        chunk_sizes = np.bincount(sorted_buckets, minlength=num_buckets)
+        # Each row goes after the rows of its bucket from earlier chunks and the ones before it in this chunk
+        offset_in_bucket = np.arange(len(order)) - (np.cumsum(chunk_sizes) - chunk_sizes)[sorted_buckets]
+        bucket_rows[bucket_ends[sorted_buckets] + offset_in_bucket] = order + start
+        bucket_ends += chunk_sizes
+    del buckets
+
+    unique_ids = empty(num_rows, dtype=np.int64)
+    first_occurrence = []
+    num_unique = 0
+    for bucket in range(num_buckets):
+        rows = bucket_rows[bucket_bounds[bucket]:bucket_bounds[bucket + 1]]
+        _, first, inverse = np.unique(keys[rows], return_index=True, return_inverse=True)
+        unique_ids[rows] = inverse.ravel() + num_unique
+        first_occurrence.append(rows[first])
+        num_unique += len(first)
+    del bucket_rows
+
+    first_occurrence = np.concatenate(first_occurrence)
+    order = np.argsort(first_occurrence, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    # The unique ids are replaced by the vertex indices in place, a chunk at a time
+    for start in range(0, num_rows, chunk_rows):
+        unique_ids[start:start + chunk_rows] = rank[unique_ids[start:start + chunk_rows]]
+    return first_occurrence[order], unique_ids
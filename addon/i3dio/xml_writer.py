@@ -0,0 +1,165 @@
+"""Serialization of the i3d file. The file is written the same way as ElementTree would write it after
+`add_indentations`, but the geometry of shapes is streamed straight to the file instead of being added to the tree as
+millions of elements."""
+from __future__ import annotations
+from typing import (Callable, Dict, Iterable, List, Tuple)
+
+import xml.etree.ElementTree as ET  # Technically not following pep8, but this is the naming suggestion from the module
+
+import numpy as np
+
+i3d_encoding = 'iso-8859-1'
+# Streamed child elements are written to the file in chunks of this many elements
+stream_chunk_size = 4096
+# Rows are formatted in chunks, so the values of all rows never have to exist as Python floats at the same time
+FORMAT_CHUNK_ROWS = 1 << 16
+
+
+def format_rows(values: np.ndarray, value_format: str) -> List[str]:
+    """Formats each row of an array as a space separated string, with the same format for every value"""
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    if not len(values):
+        return []
+    row_format = ' '.join([value_format] * values.shape[1])
+    chunk_format = '\n'.join([row_format] * FORMAT_CHUNK_ROWS)
+    rows = []
+    for start in range(0, len(values), FORMAT_CHUNK_ROWS):
+        chunk = values[start:start + FORMAT_CHUNK_ROWS]
+        if len(chunk) < FORMAT_CHUNK_ROWS:
+            chunk_format = '\n'.join([row_format] * len(chunk))
+        # A single formatting operation for many rows is a lot faster than formatting each row on its own
+        rows += (chunk_format % tuple(chunk.ravel().tolist())).split('\n')
+    return rows
+
+
+def element_lines(tag: str, attributes: Dict[str, Tuple[np.ndarray, str]]) -> List[str]:
+    """Serializes an element for each row of the attribute values, such as `<t vi="0 1 2" />`, the same way as
+    ElementTree does.
+
+    Args:
+        tag: The tag of the elements
+        attributes: The values of each attribute with one row per element, and the printf style format of a single
+            value. The values of a row are separated by spaces. They aren't escaped, so they must be numbers.
+    """
+    line_format = f'<{tag} ' + ' '.join(f'{name}="%s"' for name in attributes) + ' />'
+    columns = [format_rows(values, value_format) for values, value_format in attributes.values()]
+    return [line_format % row for row in zip(*columns)]
+
+
+def export_to_i3d_file(source: ET.Element, file_path: str,
+                       streamed_children: Dict[ET.Element, Callable[[], Iterable[str]]] = None) -> None:
+    """
+    Writes the i3d file byte for byte like ElementTree would after `add_indentations`, but streams the content of
+    the elements in `streamed_children` straight to the file instead.
+
+    The geometry of big shapes would otherwise be millions of elements, so shapes keep it as arrays and only format
+    it while it is written. The callable of a streamed element returns its serialized children, one per line without
+    any indentation, see `element_lines`. The streamed element itself must not have any other children.
+    """
+    streamed_children = streamed_children or {}
+    add_indentations(source)
+    # Same file mode as ElementTree uses, so characters outside the encoding and line endings are written the same
+    with open(file_path, 'w', encoding=i3d_encoding, errors='xmlcharrefreplace') as file:
+        file.write(f"<?xml version='1.0' encoding='{i3d_encoding}'?>\n")
+        _write_element(file.write, source, 0, streamed_children)
+
+
+def _write_element(write: Callable[[str], int], element: ET.Element, level: int,
+                   streamed_children: Dict[ET.Element, Callable[[], Iterable[str]]]) -> None:
+    """Serializes an element the same way as ElementTree does for the 'xml' method"""
+    write(f"<{element.tag}")
+    for name, value in element.items():
+        write(f" {name}=\"{ET._escape_attrib(value)}\"")
+
+    streamed = iter(streamed_children[element]()) if element in streamed_children else iter(())
+    first_streamed = next(streamed, None)
+    if element.text or len(element) or first_streamed is not None:
+        write(">")
+        if first_streamed is not None:
+            # Indent the streamed children like add_indentations would have
+            indents = '\n' + (level + 1) * '  '
+            chunk = [first_streamed]
+            for line in streamed:
+                chunk.append(line)
+                if len(chunk) == stream_chunk_size:
+                    write(indents + indents.join(chunk))
+                    chunk.clear()
+            if chunk:
+                write(indents + indents.join(chunk))
+            write('\n' + level * '  ')
+        else:
+            if element.text:
+                write(ET._escape_cdata(element.text))
+            for child in element:
+                _write_element(write, child, level + 1, streamed_children)
+        write(f"</{element.tag}>")
+    else:
+        write(" />")
+    if element.tail:
+        write(ET._escape_cdata(element.tail))
+
+
+def add_indentations(element: ET.Element, level: int = 0) -> None:
+    """
+    Used for pretty printing the xml since etree does not indent elements and keeps everything in one continues
+    string and since i3d files are supposed to be human readable, we need indentation. There is a patch for
+    pretty printing on its way in the standard library, but it is not available until python 3.9 comes around.
+
+    The module 'lxml' could also be used since it has pretty-printing, but that would introduce an external
+    library dependency for the addon.
+
+    The source code from this solution is taken from http://effbot.org/zone/element-lib.htm#prettyprint
+
+    It recursively checks every element and adds a newline + space indents to the element to make it pretty and
+    easily readable. This technically changes the xml, but the giants engine does not seem to mind the linebreaks
+    and spaces, when parsing the i3d file.
+    """
+    indents = '\n' + level * '  '
+    if len(element):
+        if not element.text or not element.text.strip():
+            element.text = indents + '  '
+        if not element.tail or not element.tail.strip():
+            element.tail = indents
+        for element in element:
+            add_indentations(element, level + 1)
+        if not element.tail or not element.tail.strip():
+            element.tail = indents
+    else:
+        if level and (not element.tail or not element.tail.strip()):
+            element.tail = indents
+
+
+def escape_attrib_element_tree(text):
+    # escape attribute value
+    try:
+        if "&" in text:
+            text = text.replace("&", "&amp;")
+        if "<" in text:
+            text = text.replace("<", "&lt;")
+        if ">" in text:
+            # Needed for the i3d format
+            pass
+            # text = text.replace(">", "&gt;")
+        if "\"" in text:
+            text = text.replace("\"", "&quot;")
+        # The following business with carriage returns is to satisfy
+        # Section 2.11 of the XML specification, stating that
+        # CR or CR LN should be replaced with just LN
+        # http://www.w3.org/TR/REC-xml/#sec-line-ends
+        if "\r\n" in text:
+            text = text.replace("\r\n", "\n")
+        if "\r" in text:
+            text = text.replace("\r", "\n")
+        # The following four lines are issue 17582
+        if "\n" in text:
+            text = text.replace("\n", "&#10;")
+        if "\t" in text:
+            text = text.replace("\t", "&#09;")
+        return text
+    except (TypeError, AttributeError):
+        ET._raise_serialization_error(text)
+
+
+# Assign the escape attribute function to replace the default implementation
+ET._escape_attrib = escape_attrib_element_tree
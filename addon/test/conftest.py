@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Importing the i3dio package registers the addon with Blender, so the modules that only need NumPy are imported on
+# their own, as top level modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'i3dio'))
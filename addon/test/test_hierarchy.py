@@ -0,0 +1,77 @@
+import re
+
+from hierarchy import (SceneHierarchy, natural_sort_key)
+
+
+class FakeObject:
+    def __init__(self, name: str, parent: 'FakeObject' = None):
+        self.name = name
+        self.parent = parent
+
+    def __repr__(self):
+        return self.name
+
+
+class FakeCollection:
+    def __init__(self, name: str, children: list):
+        self.name = name
+        self.children = children
+
+
+def old_outliner_key(name: str) -> list:
+    """The sort key that `sort_blender_objects_by_outliner_ordering` used before the pattern was precompiled"""
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r'(\d+)', name)]
+
+
+def test_natural_sort_key():
+    names = ['Wheel10', 'wheel2', 'Wheel1', 'axis', 'Axis_3.001', 'Axis_3.000', 'Body', 'b', '10', '9']
+    assert sorted(names, key=natural_sort_key) == ['9', '10', 'axis', 'Axis_3.000', 'Axis_3.001', 'b', 'Body',
+                                                   'Wheel1', 'wheel2', 'Wheel10']
+    assert all(natural_sort_key(name) == old_outliner_key(name) for name in names)
+
+
+def test_children_keep_blend_file_order():
+    root = FakeObject('root')
+    objects = [root, FakeObject('b', root), FakeObject('a10', root), FakeObject('a2', root), FakeObject('other')]
+    hierarchy = SceneHierarchy(objects, FakeCollection)
+    assert hierarchy.children(root) == objects[1:4]
+    assert hierarchy.children(objects[4]) == []
+
+
+def test_sorted_children_follow_the_outliner():
+    root = FakeObject('root')
+    objects = [root, FakeObject('Light', root), FakeObject('wheel10', root), FakeObject('Wheel9', root),
+               FakeObject('body', root)]
+    hierarchy = SceneHierarchy(objects, FakeCollection)
+    assert [child.name for child in hierarchy.sorted_children(root)] == ['body', 'Light', 'Wheel9', 'wheel10']
+    # Built once and reused
+    assert hierarchy.sorted_children(root) is hierarchy.sorted_children(root)
+    assert [obj.name for obj in hierarchy.sort(objects[1:])] == ['body', 'Light', 'Wheel9', 'wheel10']
+
+
+def test_collections_give_their_child_collections():
+    first, second = FakeCollection('Second', []), FakeCollection('First', [])
+    collection = FakeCollection('Collection', [first, second])
+    hierarchy = SceneHierarchy([], FakeCollection)
+    assert hierarchy.children(collection) == [first, second]
+    assert hierarchy.sorted_children(collection) == [second, first]
+
+
+def test_descendants_are_depth_first_in_blend_file_order():
+    root = FakeObject('root')
+    arm = FakeObject('arm', root)
+    hand = FakeObject('hand', arm)
+    leg = FakeObject('leg', root)
+    foot = FakeObject('foot', leg)
+    # Children are listed before their parents, which the index doesn't depend on
+    hierarchy = SceneHierarchy([foot, hand, leg, arm, root], FakeCollection)
+    assert list(hierarchy.descendants(root)) == [root, leg, foot, arm, hand]
+    assert list(hierarchy.descendants(hand)) == [hand]
+
+
+def test_descendants_of_deep_chains():
+    chain = [FakeObject('0')]
+    for idx in range(1, 5000):
+        chain.append(FakeObject(str(idx), chain[-1]))
+    hierarchy = SceneHierarchy(chain)
+    assert list(hierarchy.descendants(chain[0])) == chain
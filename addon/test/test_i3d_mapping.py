@@ -0,0 +1,65 @@
+from i3d_mapping import (i3d_mappings_patch, index_paths)
+
+MAPPINGS = [('body', '0>0'), ('wheel "front"', '0>0|2|1')]
+
+
+def patched(data: bytes, mappings=MAPPINGS) -> bytes:
+    start, end, block = i3d_mappings_patch(data, mappings)
+    return data[:start] + block + data[end:]
+
+
+def test_replaces_only_the_mapping_block():
+    data = (b'<?xml version="1.0"?>\n<vehicle>\n    <base><typeDesc>x</typeDesc></base>\n'
+            b'    <i3dMappings>\n        <i3dMapping id="old" node="0>1" />\n    </i3dMappings>\n'
+            b'    <wheels/>\n</vehicle>\n')
+    assert patched(data) == (b'<?xml version="1.0"?>\n<vehicle>\n    <base><typeDesc>x</typeDesc></base>\n'
+                             b'    <i3dMappings>\n'
+                             b'        <i3dMapping id="body" node="0>0" />\n'
+                             b'        <i3dMapping id="wheel &quot;front&quot;" node="0>0|2|1" />\n'
+                             b'    </i3dMappings>\n'
+                             b'    <wheels/>\n</vehicle>\n')
+
+
+def test_keeps_indentation_and_line_endings():
+    data = b'<vehicle>\r\n\t<i3dMappings/>\r\n</vehicle>\r\n'
+    assert patched(data, MAPPINGS[:1]) == (b'<vehicle>\r\n\t<i3dMappings>\r\n\t\t<i3dMapping id="body" node="0>0" />'
+                                           b'\r\n\t</i3dMappings>\r\n</vehicle>\r\n')
+
+
+def test_inserts_missing_block_before_closing_root():
+    data = b'<vehicle>\n    <wheels/>\n</vehicle>\n'
+    start, end, _ = i3d_mappings_patch(data, MAPPINGS[:1])
+    assert start == end
+    assert patched(data, MAPPINGS[:1]) == (b'<vehicle>\n    <wheels/>\n\n    <i3dMappings>\n'
+                                           b'        <i3dMapping id="body" node="0>0" />\n'
+                                           b'    </i3dMappings>\n</vehicle>\n')
+
+
+def test_unchanged_block_is_recognized():
+    data = patched(b'<vehicle>\n    <i3dMappings></i3dMappings>\n</vehicle>\n')
+    start, end, block = i3d_mappings_patch(data, MAPPINGS)
+    assert data[start:end] == block
+
+
+def test_without_root_element():
+    assert i3d_mappings_patch(b'<?xml version="1.0"?>\n', MAPPINGS) is None
+
+
+class FakeNode:
+    def __init__(self, *children):
+        self.children = list(children)
+
+
+def test_index_paths():
+    wheel = FakeNode()
+    axis = FakeNode(FakeNode(), wheel)
+    body = FakeNode(FakeNode(), FakeNode(), axis)
+    light = FakeNode()
+    paths = index_paths([body, light], {body, axis, wheel, light})
+    assert paths == {body: '0>', axis: '0>2', wheel: '0>2|1', light: '1>'}
+
+
+def test_index_paths_leaves_out_nodes_outside_the_scene_graph():
+    body = FakeNode(FakeNode())
+    detached = FakeNode()
+    assert index_paths([body], {body, detached}) == {body: '0>'}
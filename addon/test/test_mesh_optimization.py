@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+
+from mesh_optimization import (average_cache_miss_ratio, bounding_sphere, decimate, find_redundant_triangles,
+                               optimize_vertex_cache, simplify_polyline, split_triangles)
+
+
+def grid(size: int) -> tuple[np.ndarray, np.ndarray]:
+    """A flat grid of size by size quads, each split into two triangles"""
+    x, y = np.meshgrid(np.arange(size + 1, dtype=np.float32), np.arange(size + 1, dtype=np.float32))
+    positions = np.column_stack([x.ravel(), y.ravel(), np.zeros(x.size, dtype=np.float32)])
+    corner = (np.arange(size)[:, np.newaxis] * (size + 1) + np.arange(size)).ravel()
+    triangles = np.concatenate([np.column_stack([corner, corner + 1, corner + size + 2]),
+                                np.column_stack([corner, corner + size + 2, corner + size + 1])])
+    return positions, triangles
+
+
+def test_optimize_vertex_cache_lowers_acmr():
+    positions, triangles = grid(40)
+    triangles = triangles[np.random.default_rng(3).permutation(len(triangles))]
+    order = optimize_vertex_cache(triangles, len(positions))
+    assert sorted(order.tolist()) == list(range(len(triangles)))
+    assert average_cache_miss_ratio(triangles[order]) <= average_cache_miss_ratio(triangles)
+    assert average_cache_miss_ratio(triangles[order]) < 1.0
+
+
+def test_optimize_vertex_cache_without_triangles():
+    assert len(optimize_vertex_cache(np.empty((0, 3), dtype=np.int64), 0)) == 0
+
+
+def test_average_cache_miss_ratio_bounds():
+    assert average_cache_miss_ratio(np.arange(30).reshape(-1, 3)) == 3.0
+    assert average_cache_miss_ratio(np.array([[0, 1, 2]] * 4)) == 0.75
+
+
+def test_decimate_reaches_target_on_flat_grid():
+    positions, triangles = grid(16)
+    # Every corner is its own loop, like a mesh without shared corners
+    loop_vertices = triangles.ravel()
+    triangle_loops = np.arange(loop_vertices.size).reshape(-1, 3)
+    locked = np.zeros(len(positions), dtype=bool)
+    target = len(triangles) // 4
+    kept_loops, kept = decimate(positions, loop_vertices, triangle_loops, locked, target)
+    assert len(kept_loops) <= target
+    assert np.array_equal(kept, np.unique(kept))
+    assert np.isin(kept_loops, triangle_loops).all()
+    kept_vertices = loop_vertices[kept_loops]
+    assert (kept_vertices[:, 0] != kept_vertices[:, 1]).all() and (kept_vertices[:, 1] != kept_vertices[:, 2]).all()
+    # The border of the grid is locked, so its corners stay in place
+    grid_corners = np.flatnonzero(np.isin(positions[:, 0], [0, 16]) & np.isin(positions[:, 1], [0, 16]))
+    assert np.isin(grid_corners, kept_vertices).all()
+
+
+def test_decimate_keeps_everything_below_target():
+    positions, triangles = grid(2)
+    loop_vertices = triangles.ravel()
+    triangle_loops = np.arange(loop_vertices.size).reshape(-1, 3)
+    kept_loops, kept = decimate(positions, loop_vertices, triangle_loops, np.zeros(len(positions), dtype=bool),
+                                len(triangles))
+    assert np.array_equal(kept_loops, triangle_loops)
+    assert kept.tolist() == list(range(len(triangles)))
+
+
+def test_find_redundant_triangles_keeps_first_of_duplicates():
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [2, 0, 0], [1, 1, 0]], dtype=np.float32)
+    triangle_vertices = np.array([[0, 1, 2],
+                                  [1, 2, 0],  # Same as the first, rotated
+                                  [0, 2, 1],  # Back side of the first
+                                  [0, 1, 2],  # Same as the first, but with another material
+                                  [0, 1, 3],  # Degenerate, all on a line
+                                  [1, 4, 2],
+                                  [2, 1, 4],  # Same as the previous one, rotated
+                                  [0, 1, 3]])  # Duplicate of a degenerate one
+    triangle_materials = np.array([0, 0, 0, 1, 0, 0, 0, 0])
+    degenerate, duplicate = find_redundant_triangles(positions, triangle_vertices, triangle_materials)
+    assert np.flatnonzero(degenerate).tolist() == [4, 7]
+    assert np.flatnonzero(duplicate).tolist() == [1, 6]
+
+
+def test_split_triangles_covers_everything_within_limit():
+    positions, triangles = grid(200)
+    max_vertices = 65535
+    large_positions = np.concatenate([positions + [0, 0, z] for z in range(2)])
+    large_triangles = np.concatenate([triangles + offset * len(positions) for offset in range(2)])
+    parts = split_triangles(large_positions, large_triangles, max_vertices)
+    assert len(parts) > 1
+    assert all(len(np.unique(large_triangles[part])) <= max_vertices for part in parts)
+    assert all(np.array_equal(part, np.sort(part)) for part in parts)
+    assert np.array_equal(np.sort(np.concatenate(parts)), np.arange(len(large_triangles)))
+
+
+def test_split_triangles_leaves_small_shapes_whole():
+    positions, triangles = grid(4)
+    parts = split_triangles(positions, triangles, 65535)
+    assert len(parts) == 1 and np.array_equal(parts[0], np.arange(len(triangles)))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_bounding_sphere_contains_every_point(seed):
+    rng = np.random.default_rng(seed)
+    points = (rng.standard_normal((2000, 3)) * [5, 1, 0.2] + rng.uniform(-100, 100, 3)).astype(np.float32)
+    center, radius = bounding_sphere(points)
+    assert np.linalg.norm(points.astype(np.float64) - center, axis=1).max() <= radius * (1 + 1e-9)
+    # Never worse than the sphere around the center of the bounds
+    box_center = (points.min(axis=0).astype(np.float64) + points.max(axis=0)) / 2
+    assert radius <= np.linalg.norm(points.astype(np.float64) - box_center, axis=1).max() * (1 + 1e-9)
+
+
+def test_bounding_sphere_of_one_point():
+    center, radius = bounding_sphere(np.array([[1.0, 2.0, 3.0]]))
+    assert center.tolist() == [1.0, 2.0, 3.0] and radius == 0.0
+
+
+def test_simplify_polyline_keeps_endpoints_within_tolerance():
+    t = np.linspace(0, 4 * np.pi, 500)
+    points = np.column_stack([t, np.sin(t), np.zeros_like(t)])
+    tolerance = 0.01
+    keep = simplify_polyline(points, tolerance)
+    assert keep[0] == 0 and keep[-1] == len(points) - 1
+    assert np.array_equal(keep, np.unique(keep))
+    assert 2 < len(keep) < len(points) // 4
+    # Every left out point is within the tolerance of the segment between the kept points around it
+    for first, last in zip(keep[:-1], keep[1:]):
+        start, end = points[first], points[last]
+        direction = end - start
+        between = points[first + 1:last]
+        t_segment = np.clip((between - start) @ direction / (direction @ direction), 0.0, 1.0)
+        distances = np.linalg.norm(between - (start + t_segment[:, np.newaxis] * direction), axis=1)
+        assert (distances <= tolerance).all()
+
+
+def test_simplify_polyline_of_straight_line():
+    points = np.column_stack([np.arange(10.0), np.zeros(10), np.zeros(10)])
+    assert simplify_polyline(points, 1e-6).tolist() == [0, 9]
+
+
+def segment_distances_of_left_out_points(points: np.ndarray, keep: np.ndarray, cyclic: bool) -> np.ndarray:
+    """The distance of every left out point to the segment between the kept points around it"""
+    if cyclic:
+        points = np.concatenate([points, points[:1]])
+        keep = np.append(keep, len(points) - 1)
+    distances = [np.zeros(0)]
+    for first, last in zip(keep[:-1], keep[1:]):
+        start, end = points[first], points[last]
+        direction = end - start
+        between = points[first + 1:last]
+        t_segment = np.clip((between - start) @ direction / max(direction @ direction, 1e-12), 0.0, 1.0)
+        distances.append(np.linalg.norm(between - (start + t_segment[:, np.newaxis] * direction), axis=1))
+    return np.concatenate(distances)
+
+
+@pytest.mark.parametrize('tolerance', [0.001, 0.01, 0.1])
+def test_simplify_cyclic_polyline_checks_the_closing_segment(tolerance):
+    # A circle, which doesn't repeat its first point at the end
+    angles = np.linspace(0, 2 * np.pi, 200, endpoint=False)
+    points = np.column_stack([np.cos(angles), np.sin(angles), np.zeros_like(angles)])
+    keep = simplify_polyline(points, tolerance, cyclic=True)
+    assert keep[0] == 0 and np.array_equal(keep, np.unique(keep))
+    assert 3 <= len(keep) < len(points)
+    assert (segment_distances_of_left_out_points(points, keep, cyclic=True) <= tolerance).all()
+
+
+def test_simplify_cyclic_polyline_drops_points_on_the_closing_segment():
+    # A closed square, whose last two points lie on the edge back to the first one
+    points = np.array([[0, 0, 0], [1, 0, 0], [2, 0, 0], [2, 2, 0], [0, 2, 0], [0, 1.5, 0], [0, 0.5, 0]], dtype=float)
+    assert simplify_polyline(points, 1e-6, cyclic=True).tolist() == [0, 2, 3, 4]
+    assert simplify_polyline(points, 1e-6).tolist() == [0, 2, 3, 4, 6]
+
+
+def test_simplify_small_cyclic_polyline_keeps_two_points():
+    points = np.array([[0, 0, 0], [0.01, 0, 0], [0.01, 0.01, 0], [0, 0.01, 0]], dtype=float)
+    assert simplify_polyline(points, 1.0, cyclic=True).tolist() == [0, 2]
+
+
+def test_simplify_polyline_without_tolerance_keeps_corners():
+    points = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [2, 1, 0]], dtype=float)
+    assert simplify_polyline(points, 0.0).tolist() == [0, 1, 2, 3]
+    assert simplify_polyline(points, 0.0, cyclic=True).tolist() == [0, 1, 2, 3]
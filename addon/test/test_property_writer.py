@@ -0,0 +1,198 @@
+import itertools
+import math
+
+import pytest
+
+from property_writer import (compile_writer_plan, non_default_properties)
+
+
+class FakeColor(tuple):
+    """Stands in for the blender property arrays and colors, which are compared elementwise with their default"""
+
+
+class StubLightAttributes:
+    """Like the light attributes, with the kinds of entries the i3d maps use"""
+    i3d_map = {
+        'type_of_light': {'name': 'type', 'default': 'point',
+                          'tracking': {'member_path': 'type',
+                                       'mapping': {'POINT': 'point', 'SUN': 'directional', 'SPOT': 'spot'}}},
+        'emit_diffuse': {'name': 'emitDiffuse', 'default': True},
+        'scattering': {'name': 'scattering', 'default': False,
+                       'depends': [{'name': 'type_of_light', 'value': 'directional'}]},
+        'range': {'name': 'range', 'default': 1, 'tracking': {'member_path': 'cutoff_distance'}},
+        'color': {'name': 'color', 'default': (1.0, 1.0, 1.0), 'tracking': {'member_path': 'color'}},
+        'cone_angle': {'name': 'coneAngle', 'default': 1.047198, 'type': 'ANGLE',
+                       'depends': [{'name': 'type_of_light', 'value': 'spot'}],
+                       'tracking': {'member_path': 'spot_size'}},
+        'shadow_map_bias': {'name': 'depthMapBias', 'default': 0.005,
+                            'depends': [{'name': 'cast_shadow_map', 'value': True}]},
+        'cast_shadow_map': {'name': 'castShadowMap', 'default': False,
+                            'tracking': {'member_path': 'use_shadow', 'value': True}},
+        'collision_mask': {'name': 'collisionMask', 'default': 'ff', 'type': 'HEX', 'placement': 'IndexedTriangleSet'},
+        'fill_volume': {'name': 'shapeType', 'default': False, 'type': 'OVERRIDE', 'override': 'fillVolumeShape'},
+        'lod_mode': {'default': 'NONE'},
+    }
+    __annotations__ = {name: 'Property' for name in [
+        'type_of_light', 'type_of_light_tracking', 'emit_diffuse', 'scattering', 'range', 'range_tracking', 'color',
+        'color_tracking', 'cone_angle', 'cone_angle_tracking', 'not_exported', 'shadow_map_bias', 'cast_shadow_map',
+        'cast_shadow_map_tracking', 'collision_mask', 'fill_volume', 'lod_mode']}
+
+    def __init__(self, **values):
+        self.type_of_light = 'point'
+        self.type_of_light_tracking = False
+        self.emit_diffuse = True
+        self.scattering = False
+        self.range = 1
+        self.range_tracking = False
+        self.color = FakeColor((1.0, 1.0, 1.0))
+        self.color_tracking = False
+        self.cone_angle = 1.047198
+        self.cone_angle_tracking = False
+        self.not_exported = 'anything'
+        self.shadow_map_bias = 0.005
+        self.cast_shadow_map = False
+        self.cast_shadow_map_tracking = False
+        self.collision_mask = 'ff'
+        self.fill_volume = False
+        self.lod_mode = 'NONE'
+        self.__dict__.update(values)
+
+
+class StubLight:
+    def __init__(self, **values):
+        self.type = 'SPOT'
+        self.cutoff_distance = 40
+        self.color = FakeColor((1.0, 0.5, 0.0))
+        self.spot_size = math.radians(45)
+        self.use_shadow = True
+        self.__dict__.update(values)
+
+
+def old_write_i3d_properties(obj, property_group) -> list:
+    """The properties that `xml_i3d.write_i3d_properties` wrote before it used writer plans, as (placement, name,
+    value) in the order they were written"""
+    written = []
+    for prop_key in property_group.__annotations__.keys():
+        if prop_key not in property_group.i3d_map:
+            continue
+        value = getattr(property_group, prop_key)
+
+        dependants = property_group.i3d_map[prop_key].get('depends', [])
+        dependency_break = False
+        for dependant in dependants:
+            member_value = getattr(property_group, dependant['name'])
+            member_depends_tracking = property_group.i3d_map[dependant['name']].get('tracking', False)
+            if member_depends_tracking:
+                if getattr(property_group, dependant['name'] + '_tracking'):
+                    member_value = getattr(obj, member_depends_tracking['member_path'])
+                    if member_depends_tracking.get('mapping', False):
+                        member_value = member_depends_tracking['mapping'][member_value]
+            if member_value != dependant['value']:
+                dependency_break = True
+                break
+        if dependency_break:
+            continue
+
+        tracking = getattr(property_group, prop_key + '_tracking', None)
+        if tracking:
+            member_to_track = property_group.i3d_map[prop_key].get('tracking')
+            if 'value' in member_to_track:
+                if getattr(obj, member_to_track['member_path']) != member_to_track['value']:
+                    continue
+            if 'mapping' in member_to_track:
+                value = member_to_track['mapping'][getattr(obj, member_to_track['member_path'])]
+            else:
+                value = getattr(obj, member_to_track['member_path'])
+
+        value_to_write = value
+        default = property_group.i3d_map[prop_key].get('default')
+        i3d_name = property_group.i3d_map[prop_key].get('name')
+        field_type = property_group.i3d_map[prop_key].get('type')
+        i3d_placement = property_group.i3d_map[prop_key].get('placement', 'Node')
+
+        if isinstance(value, float):
+            if math.isclose(value, default, abs_tol=0.0000001):
+                continue
+        elif isinstance(value, FakeColor):
+            value = tuple(value)
+            if all(math.isclose(a, b, abs_tol=0.0000001) for a, b in zip(value, default)):
+                continue
+        elif value == default:
+            continue
+        elif i3d_name is None:
+            i3d_name = value
+            value_to_write = 1
+        if field_type is not None:
+            if field_type == 'HEX':
+                try:
+                    value_decimal = int(value, 16)
+                except ValueError:
+                    continue
+                else:
+                    if 0 <= value_decimal <= 2**32 - 1:
+                        value_to_write = value_decimal
+                    else:
+                        continue
+            elif field_type == 'OVERRIDE':
+                value_to_write = property_group.i3d_map[prop_key].get('override')
+            elif field_type == 'ANGLE':
+                value_to_write = math.degrees(value)
+                if math.isclose(value_to_write, default, abs_tol=0.0001):
+                    continue
+
+        written.append((i3d_placement, i3d_name, value_to_write))
+    return written
+
+
+def test_plan_follows_the_class_order():
+    plan = compile_writer_plan(StubLightAttributes)
+    assert [writer.key for writer in plan] == [key for key in StubLightAttributes.__annotations__
+                                               if key in StubLightAttributes.i3d_map]
+    writers = {writer.key: writer for writer in plan}
+    assert writers['color'].default == (1.0, 1.0, 1.0) and writers['color'].tracking_key == 'color_tracking'
+    assert writers['collision_mask'].placement == 'IndexedTriangleSet'
+    assert writers['lod_mode'].i3d_name is None
+    assert writers['emit_diffuse'].depends is None and writers['emit_diffuse'].tracking_key is None
+
+
+def test_defaults_write_nothing():
+    assert list(non_default_properties(StubLight(), StubLightAttributes(), (FakeColor,))) == []
+
+
+CHANGED_VALUES = {
+    'type_of_light': ['spot', 'directional'],
+    'type_of_light_tracking': [True],
+    'emit_diffuse': [False],
+    'scattering': [True],
+    'range': [25],
+    'range_tracking': [True],
+    'color': [FakeColor((1.0, 1.0, 0.9999999)), FakeColor((0.5, 0.5, 0.5))],
+    'color_tracking': [True],
+    'cone_angle': [math.radians(60), 1.047198 + 1e-5],
+    'cone_angle_tracking': [True],
+    'shadow_map_bias': [0.01],
+    'cast_shadow_map': [True],
+    'cast_shadow_map_tracking': [True],
+    'collision_mask': ['ff00', 'not hex', '1ffffffff'],
+    'fill_volume': [True],
+    'lod_mode': ['DISTANCE'],
+}
+
+
+@pytest.mark.parametrize('name,value', [(name, value) for name, values in CHANGED_VALUES.items() for value in values])
+def test_matches_the_old_writer_for_each_property(name, value):
+    obj, property_group = StubLight(), StubLightAttributes(**{name: value})
+    expected = old_write_i3d_properties(obj, property_group)
+    assert list(non_default_properties(obj, property_group, (FakeColor,))) == expected
+
+
+@pytest.mark.parametrize('light_type,use_shadow', list(itertools.product(['POINT', 'SUN', 'SPOT'], [False, True])))
+def test_matches_the_old_writer_for_combinations(light_type, use_shadow):
+    obj = StubLight(type=light_type, use_shadow=use_shadow)
+    for tracked in itertools.product([False, True], repeat=3):
+        property_group = StubLightAttributes(type_of_light_tracking=tracked[0], cast_shadow_map_tracking=tracked[1],
+                                             cone_angle_tracking=tracked[2], color_tracking=True, scattering=True,
+                                             shadow_map_bias=0.02, emit_diffuse=False, lod_mode='DISTANCE')
+        expected = old_write_i3d_properties(obj, property_group)
+        assert list(non_default_properties(obj, property_group, (FakeColor,))) == expected
+        assert expected
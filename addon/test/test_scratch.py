@@ -0,0 +1,69 @@
+import numpy as np
+
+from scratch import (SCRATCH_DIRECTORY_PREFIX, ScratchSpace)
+
+
+def test_small_arrays_stay_in_memory(tmp_path):
+    scratch = ScratchSpace(threshold=1024, directory=tmp_path)
+    array = scratch.empty(255, np.float32)
+    assert type(array) is np.ndarray and array.shape == (255,) and array.dtype == np.float32
+    assert scratch.empty((0, 3), np.int64).shape == (0, 3)
+    assert scratch.directory is None and scratch.mapped_arrays == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_large_arrays_are_memory_mapped(tmp_path):
+    scratch = ScratchSpace(threshold=1024, directory=tmp_path)
+    array = scratch.empty((128, 2), np.float32)
+    # Not a memmap subclass, so results of operations on it are plain arrays
+    assert type(array) is np.ndarray and array.shape == (128, 2)
+    assert not array.flags.owndata
+    array[:] = np.arange(256).reshape(128, 2)
+    assert array.sum() == sum(range(256))
+    assert scratch.directory.parent == tmp_path and scratch.directory.name.startswith(SCRATCH_DIRECTORY_PREFIX)
+    scratch.empty(1024, np.uint8)
+    assert scratch.mapped_arrays == 2 and scratch.mapped_bytes == 2048
+    scratch.close()
+
+
+def test_close_removes_the_scratch_directory(tmp_path):
+    scratch = ScratchSpace(threshold=16, directory=tmp_path)
+    scratch.empty(16, np.uint8)
+    directory = scratch.directory
+    assert directory.is_dir()
+    scratch.close()
+    assert not directory.exists() and scratch.directory is None
+    # Closed again by the exporter once the export is done, and usable for a new directory afterwards
+    scratch.close()
+    scratch.empty(16, np.uint8)
+    assert scratch.directory.is_dir() and scratch.directory != directory
+    scratch.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_close_without_mapped_arrays(tmp_path):
+    scratch = ScratchSpace(threshold=1024, directory=tmp_path)
+    scratch.empty(4, np.uint8)
+    scratch.close()
+    assert scratch.directory is None and list(tmp_path.iterdir()) == []
+
+
+def test_close_after_a_failed_export(tmp_path):
+    # Like the exporter, which closes the scratch space of an export that stopped halfway in its `finally`
+    scratch = ScratchSpace(threshold=16, directory=tmp_path)
+    arrays = []
+    try:
+        arrays.append(scratch.empty(64, np.float64))
+        raise RuntimeError("Export stopped")
+    except RuntimeError:
+        pass
+    finally:
+        scratch.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_falls_back_to_memory_without_a_scratch_directory(tmp_path):
+    scratch = ScratchSpace(threshold=16, directory=tmp_path / 'missing')
+    array = scratch.empty(64, np.float64)
+    assert array.flags.owndata and array.shape == (64,)
+    assert scratch.directory is None and scratch.mapped_arrays == 0
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pytest
+
+from shape_cache import (ENTRY_SUFFIX, GEOMETRY_SETTINGS, ShapeCache, ShapeKey)
+
+SETTINGS = {
+    'apply_unit_scale': True,
+    'alphabetic_uvs': False,
+    'optimize_vertex_cache': True,
+    'precision_profile': 'ENGINE',
+    'strip_vertex_attributes': False,
+    'remove_redundant_attributes': False,
+    'compute_bounding_spheres': True,
+    'split_large_shapes': True,
+    'max_shape_vertices': 65535,
+}
+
+
+def settings_digest(settings: dict, can_be_split: bool = True) -> str:
+    return ShapeKey().update_settings(settings, can_be_split).hexdigest()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ShapeCache(tmp_path / 'cache', max_size=1 << 20)
+
+
+def test_key_is_stable():
+    positions = np.arange(12, dtype=np.float32).reshape(4, 3)
+    first = ShapeKey().update(positions, 'body', 3, None, (1.0, 2.0)).hexdigest()
+    assert ShapeKey().update(positions.copy(), 'body', 3, None, (1.0, 2.0)).hexdigest() == first
+    # Non contiguous arrays are hashed by their values
+    assert ShapeKey().update(np.asfortranarray(positions), 'body', 3, None, (1.0, 2.0)).hexdigest() == first
+    assert len(first) == 40
+
+
+def test_key_depends_on_array_layout_and_value_boundaries():
+    values = np.arange(6, dtype=np.float32)
+    assert ShapeKey().update(values).hexdigest() != ShapeKey().update(values.reshape(2, 3)).hexdigest()
+    assert ShapeKey().update(values).hexdigest() != ShapeKey().update(values.astype(np.int32)).hexdigest()
+    assert ShapeKey().update('ab', 'c').hexdigest() != ShapeKey().update('a', 'bc').hexdigest()
+
+
+@pytest.mark.parametrize('name', GEOMETRY_SETTINGS)
+def test_each_geometry_setting_changes_the_key(name):
+    value = SETTINGS[name]
+    changed = {**SETTINGS, name: 'COMPACT' if name == 'precision_profile' else not value}
+    assert settings_digest(changed) != settings_digest(SETTINGS)
+
+
+def test_vertex_limit_only_changes_the_key_of_shapes_that_are_split():
+    fewer_vertices = {**SETTINGS, 'max_shape_vertices': 32767}
+    assert settings_digest(fewer_vertices) != settings_digest(SETTINGS)
+    assert settings_digest(fewer_vertices, can_be_split=False) == settings_digest(SETTINGS, can_be_split=False)
+    not_split = {**SETTINGS, 'split_large_shapes': False}
+    assert settings_digest(not_split) != settings_digest(SETTINGS)
+    assert settings_digest({**not_split, 'max_shape_vertices': 32767}) == settings_digest(not_split)
+
+
+def test_hit_and_miss(cache):
+    key = ShapeKey().update('body').hexdigest()
+    assert cache.get(key) is None
+    arrays = {'0_p': np.arange(9, dtype=np.float32).reshape(3, 3), '0_triangles': np.array([[0, 1, 2]])}
+    cache.put(key, {'parts': [{'count': 3}]}, arrays)
+    payload, cached_arrays = cache.get(key)
+    assert payload == {'parts': [{'count': 3}]}
+    assert cached_arrays.keys() == arrays.keys()
+    assert all(np.array_equal(cached_arrays[name], array) and cached_arrays[name].dtype == array.dtype
+               for name, array in arrays.items())
+    assert cache.get(ShapeKey().update('wheel').hexdigest()) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_payload_without_arrays(cache):
+    cache.put('key', {'name': 'body'})
+    assert cache.get('key') == ({'name': 'body'}, {})
+
+
+@pytest.mark.parametrize('content', [b'', b'not an entry', b'PK\x03\x04broken'])
+def test_corrupt_entry_is_discarded(cache, content):
+    path = cache.directory / f"key{ENTRY_SUFFIX}"
+    path.write_bytes(content)
+    assert cache.get('key') is None
+    assert not path.exists()
+    assert (cache.hits, cache.misses) == (0, 1)
+    # Written again on the next export
+    cache.put('key', {'name': 'body'})
+    assert cache.get('key') == ({'name': 'body'}, {})
+
+
+def test_entry_without_payload_is_discarded(cache):
+    path = cache.directory / f"key{ENTRY_SUFFIX}"
+    with open(path, 'wb') as file:
+        np.savez_compressed(file, positions=np.zeros(3))
+    assert cache.get('key') is None
+    assert not path.exists()
+
+
+def test_evicts_least_recently_used_entries_by_size(cache):
+    for idx, key in enumerate(['a', 'b', 'c', 'd']):
+        cache.put(key, {}, {'data': np.random.default_rng(idx).integers(0, 255, 4096, dtype=np.uint8)})
+        path = cache.directory / f"{key}{ENTRY_SUFFIX}"
+        os.utime(path, (1000 + idx, 1000 + idx))
+    entry_size = (cache.directory / f"a{ENTRY_SUFFIX}").stat().st_size
+    # Using an entry makes it the most recently used one
+    assert cache.get('a') is not None
+    cache.max_size = 2 * entry_size + entry_size // 2
+    cache.evict()
+    remaining = sorted(path.stem for path in cache.directory.iterdir())
+    assert remaining == ['a', 'd']
+    assert cache.evicted == 2
+
+
+def test_evict_keeps_everything_within_the_maximum_size(cache):
+    cache.put('a', {}, {'data': np.zeros(100)})
+    cache.put('b', {}, {'data': np.ones(100)})
+    cache.evict()
+    assert cache.evicted == 0 and len(list(cache.directory.iterdir())) == 2
+
+
+def test_disabled_without_a_directory(tmp_path):
+    blocking_file = tmp_path / 'file'
+    blocking_file.write_bytes(b'')
+    cache = ShapeCache(blocking_file / 'cache', max_size=1024)
+    assert not cache.enabled
+    cache.put('key', {'name': 'body'})
+    assert cache.get('key') is None
+    cache.close()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from skinning import (MAX_BLEND_WEIGHTS, select_skin_weights)
+
+
+def test_selects_four_strongest_in_vertex_group_order():
+    groups = np.array([[0, 1, 2, 3, 4, 5]], dtype=np.int32)
+    weights = np.array([[0.1, 0.5, 0.05, 0.3, 0.2, 0.4]], dtype=np.float32)
+    blend_groups, blend_weights, num_influences = select_skin_weights(groups, weights, np.ones(6, dtype=bool))
+    assert blend_groups.tolist() == [[1, 3, 4, 5]]
+    np.testing.assert_allclose(blend_weights, [[0.5, 0.3, 0.2, 0.4]])
+    assert num_influences.tolist() == [6]
+
+
+def test_ignores_other_groups_and_pads_unused_slots():
+    # Group 1 isn't a bone, the -1 entries are padding and group 4 has a weight below the written precision
+    groups = np.array([[0, 1, 2, -1, -1],
+                       [1, 4, -1, -1, -1],
+                       [3, 2, 0, 4, -1]], dtype=np.int32)
+    weights = np.array([[0.6, 0.9, 0.4, 0.0, 0.0],
+                        [1.0, 1e-7, 0.0, 0.0, 0.0],
+                        [0.1, 0.2, 0.3, 0.4, 0.0]], dtype=np.float32)
+    bone_groups = np.array([True, False, True, True, True])
+    blend_groups, blend_weights, num_influences = select_skin_weights(groups, weights, bone_groups)
+    assert blend_groups.shape == blend_weights.shape == (3, MAX_BLEND_WEIGHTS)
+    assert blend_groups.tolist() == [[0, 2, -1, -1], [-1, -1, -1, -1], [3, 2, 0, 4]]
+    np.testing.assert_allclose(blend_weights, [[0.6, 0.4, 0, 0], [0, 0, 0, 0], [0.1, 0.2, 0.3, 0.4]])
+    assert num_influences.tolist() == [2, 0, 4]
+
+
+def test_normalizes_selected_weights():
+    groups = np.array([[0, 1, 2, 3, 4], [0, -1, -1, -1, -1], [-1, -1, -1, -1, -1]], dtype=np.int32)
+    weights = np.array([[0.2, 0.2, 0.2, 0.2, 0.1], [0.5, 0, 0, 0, 0], [0, 0, 0, 0, 0]], dtype=np.float32)
+    blend_groups, blend_weights, _ = select_skin_weights(groups, weights, np.ones(5, dtype=bool), normalize=True)
+    assert blend_groups.tolist() == [[0, 1, 2, 3], [0, -1, -1, -1], [-1, -1, -1, -1]]
+    assert blend_weights.sum(axis=1).tolist() == pytest.approx([1.0, 1.0, 0.0])
+
+
+def test_matches_sorting_every_vertex():
+    rng = np.random.default_rng(5)
+    num_vertices, width, num_groups = 300, 7, 12
+    groups = np.stack([rng.permutation(num_groups)[:width] for _ in range(num_vertices)]).astype(np.int32)
+    weights = rng.random((num_vertices, width)).astype(np.float32)
+    bone_groups = rng.random(num_groups) < 0.75
+    blend_groups, blend_weights, _ = select_skin_weights(groups, weights, bone_groups)
+    for row_groups, row_weights, selected_groups, selected_weights in zip(groups, weights, blend_groups,
+                                                                          blend_weights):
+        influences = [(weight, group) for group, weight in zip(row_groups.tolist(), row_weights.tolist())
+                      if bone_groups[group]]
+        strongest = sorted(influences, reverse=True)[:MAX_BLEND_WEIGHTS]
+        # The selection keeps the order the groups had on the vertex
+        expected = [(group, weight) for weight, group in influences if (weight, group) in strongest]
+        expected += [(-1, 0.0)] * (MAX_BLEND_WEIGHTS - len(expected))
+        assert list(zip(selected_groups.tolist(), selected_weights.tolist())) == expected
@@ -0,0 +1,63 @@
+import xml.etree.ElementTree as ET
+
+from user_attributes import UserAttributes
+
+
+def write_value(element: ET.Element, attribute: str, value) -> None:
+    element.set(attribute, str(value).lower() if isinstance(value, bool) else str(value))
+
+
+def old_user_attributes(added: list) -> ET.Element:
+    """How `I3D.add_user_attributes` wrote the attributes right away, looking up the element of a node every time"""
+    element = ET.Element('UserAttributes')
+    for node_id, attributes in added:
+        node_attribute_element = element.find(f"UserAttribute[@nodeId='{node_id:d}']")
+        if node_attribute_element is None:
+            node_attribute_element = ET.SubElement(element, 'UserAttribute', attrib={'nodeId': str(node_id)})
+        for name, type_, value in attributes:
+            attribute_element = ET.SubElement(node_attribute_element, 'Attribute', attrib={'name': name, 'type': type_})
+            write_value(attribute_element, 'value', value)
+    return element
+
+
+def written(user_attributes: UserAttributes) -> ET.Element:
+    element = ET.Element('UserAttributes')
+    user_attributes.write(element, write_value)
+    return element
+
+
+def test_matches_the_old_output_for_nodes_in_id_order():
+    added = [(2, [('onCreate', 'scriptCallback', 'Trigger.onCreate'), ('isActive', 'boolean', True)]),
+             (5, [('mass', 'float', 1.5)]),
+             (12, [('count', 'integer', 3), ('name', 'string', 'gate')])]
+    user_attributes = UserAttributes()
+    for node_id, attributes in added:
+        user_attributes.add(node_id, attributes)
+    assert ET.tostring(written(user_attributes)) == ET.tostring(old_user_attributes(added))
+
+
+def test_nodes_are_written_in_id_order_with_their_attributes_in_added_order():
+    user_attributes = UserAttributes()
+    user_attributes.add(10, [('a', 'string', 'first')])
+    user_attributes.add(9, [('b', 'integer', 1)])
+    user_attributes.add(10, iter([('c', 'float', 0.5), ('d', 'boolean', False)]))
+    user_attributes.add(100, [('e', 'string', 'last')])
+    element = written(user_attributes)
+    assert [node.get('nodeId') for node in element] == ['9', '10', '100']
+    assert [(attribute.get('name'), attribute.get('type'), attribute.get('value')) for attribute in element[1]] == [
+        ('a', 'string', 'first'), ('c', 'float', '0.5'), ('d', 'boolean', 'false')]
+
+
+def test_nodes_without_attributes():
+    user_attributes = UserAttributes()
+    assert len(written(user_attributes)) == 0
+    # A node whose attribute list is empty still gets its element, like it did before
+    user_attributes.add(3, [])
+    assert ET.tostring(written(user_attributes)) == ET.tostring(old_user_attributes([(3, [])]))
+
+
+def test_write_forgets_the_attributes():
+    user_attributes = UserAttributes()
+    user_attributes.add(1, [('a', 'integer', 1)])
+    written(user_attributes)
+    assert len(written(user_attributes)) == 0
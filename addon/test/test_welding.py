@@ -0,0 +1,181 @@
+import numpy as np
+import pytest
+
+from welding import (PRECISION_PROFILES, WELD_DECIMALS, pack_rows, quantize, weld, weld_chunked, weld_keys)
+
+
+def corner_keys(positions: np.ndarray, normals: np.ndarray, uvs: np.ndarray, decimals: int = WELD_DECIMALS):
+    return pack_rows([np.zeros(len(positions), dtype=np.int32), quantize(positions, decimals, dtype=np.float64),
+                      quantize(normals, decimals), quantize(uvs, decimals)])
+
+
+def string_weld(rows: list) -> tuple[list, list]:
+    """Welds like the old exporter, which used the vectors printed with four decimals as key"""
+    vertices = {}
+    first_occurrence = []
+    corner_to_vertex = []
+    for idx, row in enumerate(rows):
+        key = ''.join(f"({', '.join(f'{value:.4f}' for value in vector)})" for vector in row)
+        if key not in vertices:
+            vertices[key] = len(first_occurrence)
+            first_occurrence.append(idx)
+        corner_to_vertex.append(vertices[key])
+    return first_occurrence, corner_to_vertex
+
+
+@pytest.fixture
+def corners():
+    """Corners of a grid where every vertex is shared by several corners, some of them with a slightly different
+    normal, in shuffled order"""
+    rng = np.random.default_rng(7)
+    grid = rng.uniform(-10, 10, (500, 3)).astype(np.float32)
+    vertex_indices = rng.integers(0, len(grid), 6000)
+    positions = grid[vertex_indices]
+    normals = np.tile(np.array([[0.0, 0.0, 1.0]], dtype=np.float32), (len(positions), 1))
+    normals[rng.random(len(positions)) < 0.2] = [0.0, 1.0, 0.0]
+    uvs = (positions[:, :2] / 20).astype(np.float32)
+    return positions, normals, uvs
+
+
+def test_weld_keeps_first_seen_order():
+    keys = pack_rows([np.array([5, 3, 5, 1, 3, 7], dtype=np.int32)])
+    first_occurrence, corner_to_vertex = weld(keys)
+    assert first_occurrence.tolist() == [0, 1, 3, 5]
+    assert corner_to_vertex.tolist() == [0, 1, 0, 2, 1, 3]
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 1000, 6000, 10_000])
+def test_weld_chunked_matches_weld(corners, chunk_rows):
+    keys = corner_keys(*corners)
+    first_occurrence, corner_to_vertex = weld(keys)
+    chunked_first_occurrence, chunked_corner_to_vertex = weld_chunked(keys, chunk_rows)
+    assert np.array_equal(chunked_first_occurrence, first_occurrence)
+    assert np.array_equal(chunked_corner_to_vertex, corner_to_vertex)
+    assert len(first_occurrence) < len(keys)
+
+
+def test_weld_chunked_splits_equal_keys_across_chunks():
+    # Every chunk of three rows holds keys that reappear in other chunks, so buckets span chunk boundaries
+    values = np.array([0, 1, 2, 2, 0, 3, 1, 3, 0, 4, 4, 2, 1], dtype=np.int32)
+    keys = pack_rows([values])
+    first_occurrence, corner_to_vertex = weld_chunked(keys, 3)
+    assert first_occurrence.tolist() == [0, 1, 2, 5, 9]
+    assert corner_to_vertex.tolist() == [0, 1, 2, 2, 0, 3, 1, 3, 0, 4, 4, 2, 1]
+    assert np.array_equal(values[first_occurrence][corner_to_vertex], values)
+
+
+def test_weld_chunked_with_scratch_allocator(corners):
+    allocated = []
+
+    def empty(shape, dtype):
+        allocated.append(np.empty(shape, dtype=dtype))
+        return allocated[-1]
+
+    keys = corner_keys(*corners)
+    first_occurrence, corner_to_vertex = weld_chunked(keys, 100, empty)
+    plain_first_occurrence, plain_corner_to_vertex = weld(keys)
+    assert np.array_equal(first_occurrence, plain_first_occurrence)
+    assert np.array_equal(corner_to_vertex, plain_corner_to_vertex)
+    # Every array with a row per key comes from the allocator, including the returned vertex index of each key
+    assert [len(array) for array in allocated] == [len(keys)] * 3
+    assert any(array is corner_to_vertex for array in allocated)
+
+
+def test_engine_profile_matches_string_keys(corners):
+    positions, normals, uvs = corners
+    rng = np.random.default_rng(11)
+    # Values that are within and just outside the four decimal grid of each other, and around zero
+    jitter = rng.choice([0.0, 1e-6, -1e-6, 3e-5, -3e-5, 2e-4], size=positions.shape).astype(np.float32)
+    positions = np.concatenate([positions, positions + jitter, np.float32(1e-5) * rng.standard_normal(positions.shape,
+                                                                                                       np.float32)])
+    normals = np.concatenate([normals] * 3)
+    uvs = np.concatenate([uvs] * 3)
+
+    profile = PRECISION_PROFILES['ENGINE']
+    assert profile.position_decimals == profile.normal_decimals == profile.uv_decimals == WELD_DECIMALS
+    first_occurrence, corner_to_vertex = weld(corner_keys(positions, normals, uvs, profile.position_decimals))
+    rows = list(zip(positions.astype(np.float64).tolist(), normals.astype(np.float64).tolist(),
+                    uvs.astype(np.float64).tolist()))
+    expected_first_occurrence, expected_corner_to_vertex = string_weld(rows)
+    assert first_occurrence.tolist() == expected_first_occurrence
+    assert corner_to_vertex.tolist() == expected_corner_to_vertex
+
+
+def test_quantize_rounds_on_the_decimal_grid():
+    values = np.array([0.12344, 0.12346, -0.00004, 1.99996], dtype=np.float32)
+    assert quantize(values).tolist() == pytest.approx([0.1234, 0.1235, 0.0, 2.0])
+    assert quantize(values, 2, dtype=np.float64).tolist() == [0.12, 0.12, -0.0, 2.0]
+
+
+def old_vertex_key(subset: int, position, normal, color, generic, uvs) -> str:
+    """The key of the old `Vertex` class, which printed the vectors with four decimals. Blend ids and weights weren't
+    part of it."""
+    def vector(values):
+        return f"({', '.join(f'{value:.4f}' for value in values)})"
+    key = f"{subset}{vector(position)}{vector(normal)}{vector(color)}"
+    if generic is not None:
+        key += f"{generic}"
+    return key + ''.join(vector(uv) for uv in uvs)
+
+
+@pytest.fixture
+def channels():
+    """Two of every corner, which only differ in one of their channels at a time"""
+    rng = np.random.default_rng(5)
+    num_corners = 64
+    positions = np.repeat(rng.uniform(-10, 10, (num_corners // 2, 3)), 2, axis=0).astype(np.float32)
+    return {
+        'subsets': np.repeat(rng.integers(0, 2, num_corners // 2), 2).astype(np.int32),
+        'positions': positions,
+        'normals': np.tile(np.array([[0.0, 0.0, 1.0]], dtype=np.float32), (num_corners, 1)),
+        'uvs': [(positions[:, :2] / 20).astype(np.float32)],
+        'colors': np.ones((num_corners, 4), dtype=np.float32),
+        'generic': np.repeat(rng.integers(0, 3, num_corners // 2), 2).astype(np.float64),
+        'blend_ids': np.repeat(rng.integers(0, 4, (num_corners // 2, 4)), 2, axis=0).astype(np.int32),
+        'blend_weights': np.repeat(rng.dirichlet(np.ones(4), num_corners // 2), 2, axis=0).astype(np.float32),
+    }
+
+
+def test_weld_keys_match_the_old_vertex_key(channels):
+    """Without blend ids and weights, corners are welded exactly like the old string keys did"""
+    channels['colors'][::3] = [1.0, 0.5, 0.25, 1.0]
+    channels['generic'][::5] += 0.5
+    first_occurrence, corner_to_vertex = weld(weld_keys(
+        PRECISION_PROFILES['ENGINE'], channels['subsets'], channels['positions'], channels['normals'],
+        channels['uvs'], channels['colors'], channels['generic']))
+    rows = zip(channels['subsets'].tolist(), channels['positions'].tolist(), channels['normals'].tolist(),
+               channels['colors'].tolist(), channels['generic'].tolist(), channels['uvs'][0].tolist())
+    vertices = {}
+    expected_corner_to_vertex = [vertices.setdefault(old_vertex_key(subset, position, normal, color, generic, [uv]),
+                                                     len(vertices))
+                                 for subset, position, normal, color, generic, uv in rows]
+    assert corner_to_vertex.tolist() == expected_corner_to_vertex
+    assert len(first_occurrence) < len(channels['positions'])
+
+
+@pytest.mark.parametrize('channel', ['subsets', 'positions', 'normals', 'uvs', 'colors', 'generic', 'blend_ids',
+                                     'blend_weights'])
+def test_weld_keys_keep_corners_apart_on_every_channel(channels, channel):
+    profile = PRECISION_PROFILES['ENGINE']
+    assert len(weld(weld_keys(profile, **channels))[0]) == len(channels['positions']) // 2
+    # The second corner of the first pair differs in one channel, by more than the grid it is welded on
+    if channel == 'uvs':
+        channels['uvs'][0][1] += 0.01
+    else:
+        channels[channel][1] += 1 if channel in ('subsets', 'blend_ids') else 0.01
+    first_occurrence, corner_to_vertex = weld(weld_keys(profile, **channels))
+    assert len(first_occurrence) == len(channels['positions']) // 2 + 1
+    assert corner_to_vertex[0] != corner_to_vertex[1]
+
+
+def test_weld_keys_no_longer_weld_corners_with_different_blend_ids(channels):
+    """The old key left out blend ids and weights, so a merge group child or skinned corner at the same place as
+    another one got its ids and weights. Those corners are separate vertices now."""
+    channels['blend_ids'][1::2] += 1
+    old_keys = [old_vertex_key(subset, position, normal, color, generic, [uv]) for subset, position, normal, color,
+                generic, uv in zip(channels['subsets'].tolist(), channels['positions'].tolist(),
+                                   channels['normals'].tolist(), channels['colors'].tolist(),
+                                   channels['generic'].tolist(), channels['uvs'][0].tolist())]
+    assert len(set(old_keys)) == len(old_keys) // 2
+    first_occurrence, _ = weld(weld_keys(PRECISION_PROFILES['ENGINE'], **channels))
+    assert len(first_occurrence) == len(old_keys)
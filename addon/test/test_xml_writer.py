@@ -0,0 +1,81 @@
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+import xml_writer
+from xml_writer import (add_indentations, element_lines, export_to_i3d_file, format_rows)
+
+
+@pytest.fixture
+def geometry():
+    rng = np.random.default_rng(3)
+    positions = rng.uniform(-100, 100, (10, 3)).astype(np.float32)
+    normals = rng.normal(size=(10, 3)).astype(np.float32)
+    uvs = rng.uniform(0, 1, (10, 2)).astype(np.float32)
+    triangles = rng.integers(0, 10, (7, 3))
+    return positions, normals, uvs, triangles
+
+
+def i3d_tree(geometry, with_geometry: bool):
+    """A small i3d file, with the vertices and triangles of its shape as elements if `with_geometry` is set"""
+    positions, normals, uvs, triangles = geometry
+    root = ET.Element('i3D', {'name': 'Tractør "€"', 'version': '1.6'})
+    ET.SubElement(root, 'Asset')
+    shapes = ET.SubElement(root, 'Shapes')
+    shape = ET.SubElement(shapes, 'IndexedTriangleSet', {'name': 'body & <cab>', 'shapeId': '1'})
+    vertices = ET.SubElement(shape, 'Vertices', {'count': str(len(positions)), 'normal': 'true', 'uv0': 'true'})
+    triangle_elements = ET.SubElement(shape, 'Triangles', {'count': str(len(triangles))})
+    subsets = ET.SubElement(shape, 'Subsets', {'count': '1'})
+    ET.SubElement(subsets, 'Subset', {'firstIndex': '0', 'firstVertex': '0', 'numIndices': '21', 'numVertices': '10'})
+    if with_geometry:
+        # The way the geometry was written before it was streamed
+        for position, normal, uv in zip(positions.tolist(), normals.tolist(), uvs.tolist()):
+            ET.SubElement(vertices, 'v', {'p': "{0:.6f} {1:.6f} {2:.6f}".format(*position),
+                                          'n': "{0:.6f} {1:.6f} {2:.6f}".format(*normal),
+                                          't0': "{0:.6f} {1:.6f}".format(*uv)})
+        for triangle in triangles.tolist():
+            ET.SubElement(triangle_elements, 't', {'vi': ' '.join(map(str, triangle))})
+    scene = ET.SubElement(root, 'Scene')
+    node = ET.SubElement(scene, 'TransformGroup', {'name': 'line\nbreak', 'nodeId': '1'})
+    ET.SubElement(node, 'Shape', {'name': 'body', 'shapeId': '1', 'nodeId': '2'})
+    ET.SubElement(root, 'UserAttributes')
+    return root, vertices, triangle_elements
+
+
+def test_streamed_file_matches_element_tree(tmp_path, monkeypatch, geometry):
+    # Small chunks, so the rows are formatted and written over several chunks
+    monkeypatch.setattr(xml_writer, 'FORMAT_CHUNK_ROWS', 4)
+    monkeypatch.setattr(xml_writer, 'stream_chunk_size', 3)
+    positions, normals, uvs, triangles = geometry
+
+    root, _, _ = i3d_tree(geometry, with_geometry=True)
+    add_indentations(root)
+    ET.ElementTree(root).write(tmp_path / 'tree.i3d', xml_declaration=True, encoding='iso-8859-1', method='xml')
+
+    root, vertices, triangle_elements = i3d_tree(geometry, with_geometry=False)
+    streamed_children = {
+        vertices: lambda: element_lines('v', {'p': (positions, '%.6f'), 'n': (normals, '%.6f'), 't0': (uvs, '%.6f')}),
+        triangle_elements: lambda: element_lines('t', {'vi': (triangles, '%d')}),
+    }
+    export_to_i3d_file(root, tmp_path / 'streamed.i3d', streamed_children)
+
+    assert (tmp_path / 'streamed.i3d').read_bytes() == (tmp_path / 'tree.i3d').read_bytes()
+
+
+def test_streamed_element_without_lines_is_empty(tmp_path, geometry):
+    root, vertices, triangle_elements = i3d_tree(geometry, with_geometry=False)
+    expected_path = tmp_path / 'tree.i3d'
+    add_indentations(root)
+    ET.ElementTree(root).write(expected_path, xml_declaration=True, encoding='iso-8859-1', method='xml')
+
+    root, vertices, triangle_elements = i3d_tree(geometry, with_geometry=False)
+    export_to_i3d_file(root, tmp_path / 'streamed.i3d', {vertices: lambda: [], triangle_elements: lambda: iter(())})
+    assert (tmp_path / 'streamed.i3d').read_bytes() == expected_path.read_bytes()
+
+
+def test_format_rows(monkeypatch):
+    monkeypatch.setattr(xml_writer, 'FORMAT_CHUNK_ROWS', 2)
+    assert format_rows(np.array([[0, 1, 2], [3, 4, 5], [6, 7, 8]]), '%d') == ['0 1 2', '3 4 5', '6 7 8']
+    assert format_rows(np.array([0.5, 0.25]), '%r') == ['0.5', '0.25']
+    assert format_rows(np.empty((0, 3)), '%d') == []